@@ -1,7 +1,6 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import constants, utils
+import storage, utils
+from trajectory import Trajectory
 
 
 class MonteCarlo:
@@ -10,22 +9,49 @@ class MonteCarlo:
   NUM_SPEEDS = 5
   ACTION_TO_ACCELERATION = np.array([[1, 1], [0, 1], [1, 0], [0, 0], [-1, 0], [0, -1], [1, -1], [-1, 1], [-1, -1]])
 
-  def __init__(self, env, epsilon, init=-100):
+  def __init__(self, env, epsilon, init=-100, tables=None, storage_type="dense", seed=None, recorder=None,
+               jit=False, gamma=1.0, alpha=None):
     """
     Initialize a Monte Carlo agent for the Racetrack environment.
-    Each state is visited only once in a single episode, so the first-visit / every-visit distinction does not apply.
-    :param env:         An instance of the racetrack environment.
-    :param epsilon:     Constant for an epsilon-greedy policy.
-    :param init:        Initial action values.
+    Each state is visited only once in a single episode, so the first-visit / every-visit distinction does not apply:
+    velocities are never negative and never both zero, so every step moves the car up or right (also when it is put
+    back after leaving the track).
+    :param env:             An instance of the racetrack environment.
+    :param epsilon:         Constant for an epsilon-greedy policy.
+    :param init:            Initial action values.
+    :param tables:          Optional object with action_values, action_counts and policy arrays to use in place of
+                            private tables (e.g. shared.SharedTables or checkpoint.Checkpoint).
+    :param storage_type:    Layout of the action values and counts: "dense", "masked" (only cells that are not
+                            grass) or "hash" (only visited states). The policy is always dense.
+    :param seed:            Seed of the random number generator used for exploration (an integer or
+                            a numpy.random.SeedSequence), random if None. The environment has its own generator.
+    :param recorder:        Optional replay.Recorder that logs every played episode.
+    :param jit:             Play episodes with the compiled rollout kernel (kernels.py), which gives the same
+                            episodes as the Python loop.
+    :param gamma:           Discount factor of the returns.
+    :param alpha:           Constant step size of the action value updates, which weights recent returns more than
+                            old ones (returns of older policies fade); sample averages if None.
     """
 
+    assert 0.0 <= gamma <= 1.0
+    assert alpha is None or 0.0 < alpha <= 1.0
+
     self.env = env
+    self.recorder = recorder
+    self.jit = jit
+    self.gamma = gamma
+    self.alpha = alpha
     self.epsilon = epsilon
+    self.random = utils.RandomStream(seed)
     self.init = init
+    self.tables = tables
+    self.storage_type = storage_type
+    self.shape = env.racetrack.shape + (self.NUM_SPEEDS, self.NUM_SPEEDS, self.NUM_ACTIONS)
 
-    self.action_values = None
-    self.action_counts = None
+    self.storage = None
     self.policy = None
+    self.trajectory = Trajectory()
+    self.dirty_states = None
     self.reset()
 
   def play_episode(self, explore=True, learn=True):
@@ -33,67 +59,189 @@ class MonteCarlo:
     Play an episode.
     :param explore:     Use exploration policy.
     :param learn:       Update action counts and values.
-    :return:            Total return of the episode.
+    :return:            Total return of the episode and the trajectory.
+    """
+
+    trajectory = self.rollout(explore=explore)
+    returns = utils.compute_returns(trajectory.get_rewards(), gamma=self.gamma)
+
+    if learn:
+      self.learn(trajectory, returns)
+
+    return returns[0], trajectory.copy()
+
+  def rollout(self, explore=True):
+    """
+    Play an episode into the trajectory buffer of the agent (and the recorder), without learning from it.
+    :param explore:     Use exploration policy.
+    :return:            The trajectory buffer, overwritten by the next episode.
     """
 
-    sequence = []
+    trajectory = self.trajectory
+    trajectory.clear()
+
+    if self.jit:
+      # kernels compiles the rollout kernel with numba (if installed) before the first rollout
+      import kernels
+      kernels.rollout(self, explore=explore, trajectory=trajectory)
 
     while not self.env.done:
 
       state = self.env.get_state()
+      greedy_action = self.policy[state]
 
       if explore:
-        action = self.explore(self.policy[state])
+        action = self.explore(greedy_action)
+        probability = self.epsilon / self.NUM_ACTIONS + (1.0 - self.epsilon) * (action == greedy_action)
       else:
-        action = self.policy[state]
+        action = greedy_action
+        probability = 1.0
 
       reward = self.env.act(*self.action_to_acceleration(action))
 
-      sequence.append((state, action, reward))
+      trajectory.append(state, action, reward, probability)
 
-    returns = np.zeros(len(sequence))
+    if self.recorder is not None:
+      self.recorder.record(trajectory, self.epsilon if explore else 0.0)
 
-    for i in reversed(range(len(sequence))):
-      for j in range(i + 1):
-        returns[j] += sequence[i][2]
+    return trajectory
 
-    if learn:
-      for i in range(len(sequence)):
+  def learn(self, trajectory, returns):
+    """
+    Update action counts and values with the returns of an episode.
+    :param trajectory:    Trajectory of the episode.
+    :param returns:       Return for each step of the trajectory.
+    :return:              None.
+    """
 
-        state = sequence[i][0]
-        action = sequence[i][1]
-        state_action = state + (action,)
-        ret = returns[i]
+    self.update(self.get_state_action_indices(trajectory), returns)
 
-        self.action_values[state_action] += utils.update_mean(ret, self.action_values[state_action],
-                                                              self.action_counts[state_action])
-        self.action_counts[state_action] += 1
+  def update(self, indices, returns):
+    """
+    Update action counts and values of state-actions visited in an episode.
+    All state-actions are updated in one scatter operation, which gives the same result as updating them one by one
+    because each state is visited only once in a single episode.
+    :param indices:       Flat indices of the visited state-actions.
+    :param returns:       Return for each visited state-action.
+    :return:              None.
+    """
+
+    locations = self.storage.locate(indices, insert=True)
+    action_values = self.storage.tables[storage.VALUES]
+    action_counts = self.storage.tables[storage.COUNTS]
+
+    if self.alpha is None:
+      action_values[locations] += utils.update_mean(np.asarray(returns, dtype=np.float64), action_values[locations],
+                                                    action_counts[locations])
+    else:
+      action_values[locations] += self.alpha * (np.asarray(returns, dtype=np.float64) - action_values[locations])
+
+    np.add.at(action_counts, locations, 1)
+
+    # remember which states need their greedy action recomputed
+    self.dirty_states.append(indices // self.NUM_ACTIONS)
+
+  def update_batch(self, indices, returns):
+    """
+    Update action counts and values with the returns of many episodes at once.
+    The returns of a state-action are summed first, so the action values end up being the same means as when the
+    episodes are learned one by one (up to rounding).
+    :param indices:       Flat indices of the visited state-actions, with repeats.
+    :param returns:       Return for each visited state-action.
+    :return:              None.
+    """
+
+    # constant step size updates depend on the order of the episodes, they are learned one by one
+    assert self.alpha is None
+
+    indices, inverse = np.unique(indices, return_inverse=True)
+    sums = np.bincount(inverse, weights=returns)
+    counts = np.bincount(inverse)
+
+    locations = self.storage.locate(indices, insert=True)
+    action_values = self.storage.tables[storage.VALUES]
+    action_counts = self.storage.tables[storage.COUNTS]
+
+    new_counts = action_counts[locations] + counts
+    action_values[locations] += (sums - counts * action_values[locations]) / new_counts
+    action_counts[locations] = new_counts
+
+    self.dirty_states.append(indices // self.NUM_ACTIONS)
+
+  def get_state_action_indices(self, trajectory):
+    """
+    Get flat indices of state-actions visited in a trajectory.
+    :param trajectory:    Trajectory of an episode.
+    :return:              Indices into the flattened action values.
+    """
+
+    states = trajectory.get_states()
+
+    return np.ravel_multi_index(tuple(states.T) + (trajectory.get_actions(),), self.shape)
+
+  def seed(self, seed=None):
+    """
+    Reseed the random number generator used for exploration.
+    :param seed:    Seed (an integer or a numpy.random.SeedSequence), random if None.
+    :return:        None.
+    """
 
-    return returns[0], sequence
+    self.random = utils.RandomStream(seed)
 
   def reset(self):
     """
-    Reset agent.
+    Reset agent. Tables passed to the constructor are not cleared.
     :return:    None.
     """
 
-    self.action_values = \
-      np.zeros((self.env.racetrack.shape[0], self.env.racetrack.shape[1], self.NUM_SPEEDS, self.NUM_SPEEDS,
-                self.NUM_ACTIONS), dtype=np.float32) - self.init
-    self.action_counts = \
-      np.zeros((self.env.racetrack.shape[0], self.env.racetrack.shape[1], self.NUM_SPEEDS, self.NUM_SPEEDS,
-                self.NUM_ACTIONS), dtype=np.int32)
-    self.policy = np.zeros((self.env.racetrack.shape[0], self.env.racetrack.shape[1], self.NUM_SPEEDS, self.NUM_SPEEDS),
-                           dtype=np.int32)
+    self.dirty_states = []
+
+    if self.tables is not None:
+      self.storage = storage.DenseStorage(self.env.racetrack, init=self.init,
+                                          tables={storage.VALUES: self.tables.action_values,
+                                                  storage.COUNTS: self.tables.action_counts})
+      self.policy = self.tables.policy
+    else:
+      self.storage = storage.STORAGES[self.storage_type](self.env.racetrack, init=self.init)
+      self.policy = np.zeros(self.shape[:-1], dtype=np.int32)
+
+  @property
+  def action_values(self):
+    """
+    Action values as an array of shape (rows, cols, 5, 5, 9). Only the dense storage returns a view of the table,
+    the other storages return a copy.
+    :return:    Action values.
+    """
+
+    return self.storage.get_dense(storage.VALUES)
+
+  @property
+  def action_counts(self):
+    """
+    Action counts as an array of shape (rows, cols, 5, 5, 9). Only the dense storage returns a view of the table,
+    the other storages return a copy.
+    :return:    Action counts.
+    """
+
+    return self.storage.get_dense(storage.COUNTS)
 
-  def update_policy(self):
+  def update_policy(self, full=False):
     """
     Update epsilon-greedy policy using current action values.
-    :return:    None.
+    By default, only states whose action values were updated since the last call are recomputed.
+    :param full:    Recompute the policy for all states (e.g. after the action values were changed directly).
+    :return:        None.
     """
 
     # play action with maximum action value
-    self.policy = np.argmax(self.action_values, axis=-1)
+    if full:
+      self.policy[...] = self.storage.get_greedy_policy().reshape(self.policy.shape)
+    elif len(self.dirty_states) > 0:
+      states = np.unique(np.concatenate(self.dirty_states))
+      policy = self.policy.reshape(-1)
+      policy[states] = self.storage.get_greedy_actions(states)
+
+    self.dirty_states = []
 
   def action_to_acceleration(self, action):
     """
@@ -111,8 +259,8 @@ class MonteCarlo:
     :return:          Exploration action.
     """
 
-    if np.random.uniform(0, 1) < self.epsilon:
-      return np.random.randint(0, self.NUM_ACTIONS)
+    if self.random.uniform() < self.epsilon:
+      return self.random.integer(self.NUM_ACTIONS)
     else:
       return action
 
@@ -122,12 +270,10 @@ class MonteCarlo:
     :return:
     """
 
-    for i in range(self.NUM_SPEEDS):
-      for j in range(self.NUM_SPEEDS):
-        plt.title("policies for velocity {:d} {:d}".format(i, j))
-        plt.imshow(self.policy[:, :, i, j])
-        plt.colorbar()
-        plt.show()
+    # matplotlib is only imported when a plot is shown
+    import visualization
+
+    visualization.show_policy(self.policy)
 
   def show_fraction_explored(self):
     """
@@ -135,12 +281,9 @@ class MonteCarlo:
     :return:      None.
     """
 
-    mask = self.action_counts != 0
-    fracts = np.mean(mask, axis=(2, 3, 4))
+    import visualization
 
-    plt.imshow(fracts)
-    plt.colorbar()
-    plt.show()
+    visualization.show_image(np.mean(self.action_counts != 0, axis=(2, 3, 4)))
 
   def show_max_action_values(self):
     """
@@ -148,45 +291,106 @@ class MonteCarlo:
     :return:
     """
 
-    img = np.max(self.action_values, axis=(2, 3, 4))
+    import visualization
 
-    plt.imshow(img)
-    plt.colorbar()
-    plt.show()
+    visualization.show_image(np.max(self.action_values, axis=(2, 3, 4)))
 
   def show_sequence(self, sequence, save_path=None, show_legend=True):
     """
     Show positions visited in a sequence.
-    :param sequence:        Sequence of tuples: (state, action, reward).
+    :param sequence:        Trajectory or a sequence of tuples: (state, action, reward).
     :param save_path:       Where to save the plot.
     :param show_legend:     Show legend.
     :return:                None.
     """
 
-    track = self.env.racetrack.copy()
+    import visualization
+
+    visualization.show_sequence(self.env.racetrack, sequence, save_path=save_path, show_legend=show_legend)
+
+class OffPolicyMonteCarlo(MonteCarlo):
+
+  WEIGHTS = "weights"
+
+  def __init__(self, env, epsilon, init=-100, tables=None, storage_type="dense", seed=None, recorder=None,
+               jit=False, gamma=1.0):
+    """
+    Initialize an off-policy Monte Carlo control agent (Sutton and Barto's Reinforcement Learning: Introduction
+    section 5.7). The target policy is greedy, the behavior policy is epsilon-greedy with respect to it. Action values
+    are weighted importance sampling estimates with cumulative weights C(s, a) stored next to them.
+    Trajectories played by any other policy can be learned from as long as they record the probabilities of their
+    actions.
+    :param env:             An instance of the racetrack environment.
+    :param epsilon:         Constant for the epsilon-greedy behavior policy.
+    :param init:            Initial action values.
+    :param tables:          Optional object with action_values, action_counts and policy arrays (see MonteCarlo),
+                            and weights if it is a checkpoint.Checkpoint of this agent.
+    :param storage_type:    Layout of the action values, counts and weights.
+    :param seed:            Seed of the random number generator used for exploration.
+    :param recorder:        Optional replay.Recorder that logs every played episode.
+    :param jit:             Play episodes with the compiled rollout kernel.
+    :param gamma:           Discount factor of the returns.
+    """
+
+    MonteCarlo.__init__(self, env, epsilon, init=init, tables=tables, storage_type=storage_type, seed=seed,
+                        recorder=recorder, jit=jit, gamma=gamma)
+
+  def reset(self):
+    """
+    Reset agent. Tables passed to the constructor are not cleared.
+    :return:    None.
+    """
+
+    MonteCarlo.reset(self)
+
+    if self.tables is not None and hasattr(self.tables, self.WEIGHTS):
+      self.storage.fill_values[self.WEIGHTS] = 0.0
+      self.storage.tables[self.WEIGHTS] = getattr(self.tables, self.WEIGHTS).reshape(-1)
+    else:
+      self.storage.add_table(self.WEIGHTS, np.float64, 0.0)
+
+  def learn(self, trajectory, returns):
+    """
+    Update action values with the weighted importance sampling estimate, going backwards from the end of an episode
+    until the first action that the updated target policy would not play.
+    The updates of all steps are computed at once and only those after the cut are written, which is the same as
+    the step-by-step backward pass because each state is visited only once in a single episode.
+    :param trajectory:    Trajectory of the episode, with probabilities of the actions under the behavior policy.
+    :param returns:       Return for each step of the trajectory.
+    :return:              None.
+    """
+
+    if len(trajectory) == 0:
+      return
+
+    indices = self.get_state_action_indices(trajectory)
+    actions = trajectory.get_actions()
+
+    locations = self.storage.locate(indices, insert=True)
+    action_values = self.storage.tables[storage.VALUES]
+    cumulative_weights = self.storage.tables[self.WEIGHTS]
 
-    for item in sequence:
-      state = item[0]
-      track[state[0], state[1]] = 4
+    # the importance sampling ratio of a step is the product of the ratios of the steps after it,
+    # the target policy plays each greedy action with probability 1
+    ratios = 1.0 / trajectory.get_probabilities()
+    weights = np.ones(len(indices), dtype=np.float64)
+    weights[:-1] = np.cumprod(ratios[:0:-1])[::-1]
 
-    im = plt.imshow(track)
+    new_cumulative_weights = cumulative_weights[locations] + weights
+    new_values = action_values[locations] + weights / new_cumulative_weights * \
+                 (np.asarray(returns, dtype=np.float64) - action_values[locations])
 
-    plt.axis("off")
+    # greedy actions after the update, the actions of a state are stored next to each other
+    rows = action_values[(locations - actions)[:, np.newaxis] + np.arange(self.NUM_ACTIONS)]
+    rows[np.arange(len(actions)), actions] = new_values
+    not_greedy = np.flatnonzero(np.argmax(rows, axis=-1) != actions)
 
-    if show_legend:
-      values = np.unique(track.ravel())
-      labels = {
-        constants.START_VALUE: "start",
-        constants.END_VALUE: "end",
-        constants.TRACK_VALUE: "track",
-        constants.GRASS_VALUE: "grass",
-        constants.AGENT_VALUE: "agent"
-      }
-      colors = [im.cmap(im.norm(value)) for value in values]
-      patches = [mpatches.Patch(color=colors[i], label=labels[values[i]]) for i in range(len(values))]
-      plt.legend(handles=patches, loc=4)
+    # the step with the last non-greedy action is updated, the steps before it are not
+    start = not_greedy[-1] if len(not_greedy) > 0 else 0
+    updated = locations[start:]
 
-    if save_path is not None:
-      plt.savefig(save_path, bbox_inches="tight")
+    cumulative_weights[updated] = new_cumulative_weights[start:]
+    action_values[updated] = new_values[start:]
+    self.storage.tables[storage.COUNTS][updated] += 1
 
-    plt.show()
\ No newline at end of file
+    self.dirty_states.append(indices[start:] // self.NUM_ACTIONS)
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import storage
+
+
+LATEST = "latest"
+STATE = "state.json"
+TABLES = ["action_values", "action_counts", "policy"]
+TMP_PREFIX = ".tmp_"
+
+
+def save(mc, episode_idx, checkpoint_dir, keep=2):
+  """
+  Save the tables of an agent (including extra tables of its storage, such as the cumulative weights of
+  OffPolicyMonteCarlo), the states of the random number generators of the agent and its environment and the episode
+  index.
+  Tables are saved as uncompressed .npy files so that they can be memory-mapped. Each checkpoint is written into a
+  temporary directory that is renamed when complete, then the "latest" file is replaced to point to it, so an
+  interrupted save never corrupts the previous checkpoint. Temporary files left by interrupted saves are removed.
+  :param mc:                Monte Carlo agent.
+  :param episode_idx:       Number of finished training episodes.
+  :param checkpoint_dir:    Directory with checkpoints.
+  :param keep:              Number of most recent checkpoints to keep.
+  :return:                  Path to the checkpoint.
+  """
+
+  os.makedirs(checkpoint_dir, exist_ok=True)
+  remove_temporary(checkpoint_dir)
+
+  name = "checkpoint_{:d}".format(episode_idx)
+  path = os.path.join(checkpoint_dir, name)
+  tmp_path = tempfile.mkdtemp(dir=checkpoint_dir, prefix=TMP_PREFIX)
+
+  tables = {table: getattr(mc, table) for table in TABLES}
+
+  for table in mc.storage.tables:
+    if table not in [storage.VALUES, storage.COUNTS]:
+      tables[table] = mc.storage.get_dense(table)
+
+  for table, array in tables.items():
+    np.save(os.path.join(tmp_path, table + ".npy"), array)
+
+  state = {
+    "tables": list(tables.keys()),
+    "episode_idx": episode_idx,
+    "epsilon": mc.epsilon,
+    "init": mc.init,
+    "gamma": mc.gamma,
+    "alpha": mc.alpha,
+    "agent_random_state": mc.random.get_state(),
+    "env_random_state": mc.env.random.get_state()
+  }
+
+  with open(os.path.join(tmp_path, STATE), "w") as file:
+    json.dump(state, file)
+
+  if os.path.isdir(path):
+    shutil.rmtree(path)
+
+  os.rename(tmp_path, path)
+
+  with tempfile.NamedTemporaryFile("w", dir=checkpoint_dir, prefix=TMP_PREFIX, delete=False) as file:
+    file.write(name)
+
+  os.replace(file.name, os.path.join(checkpoint_dir, LATEST))
+
+  # remove old checkpoints
+  names = [n for n in os.listdir(checkpoint_dir) if n.startswith("checkpoint_")]
+  names.sort(key=lambda n: int(n.split("_")[1]))
+
+  for old_name in names[:-keep]:
+    shutil.rmtree(os.path.join(checkpoint_dir, old_name))
+
+  return path
+
+
+def remove_temporary(checkpoint_dir):
+  """
+  Remove temporary files and directories left in a checkpoint directory by interrupted saves.
+  :param checkpoint_dir:    Directory with checkpoints.
+  :return:                  None.
+  """
+
+  for name in os.listdir(checkpoint_dir):
+    if name.startswith(TMP_PREFIX):
+      path = os.path.join(checkpoint_dir, name)
+
+      if os.path.isdir(path):
+        shutil.rmtree(path)
+      else:
+        os.remove(path)
+
+
+def exists(checkpoint_dir):
+  """
+  Check if a directory contains a checkpoint.
+  :param checkpoint_dir:    Directory with checkpoints.
+  :return:                  True if there is a checkpoint, otherwise False.
+  """
+
+  return os.path.isfile(os.path.join(checkpoint_dir, LATEST))
+
+
+class Checkpoint:
+
+  def __init__(self, checkpoint_dir, mmap_mode=None):
+    """
+    Load the latest checkpoint. Pass the checkpoint as tables to MonteCarlo (or OffPolicyMonteCarlo if it has
+    weights) to use the loaded tables directly. Each table is an attribute of the checkpoint.
+    :param checkpoint_dir:    Directory with checkpoints.
+    :param mmap_mode:         Memory-map the tables instead of reading them: "r" for evaluation, "c" (copy-on-write)
+                              to continue training without changing the files.
+    """
+
+    with open(os.path.join(checkpoint_dir, LATEST)) as file:
+      self.path = os.path.join(checkpoint_dir, file.read().strip())
+
+    with open(os.path.join(self.path, STATE)) as file:
+      self.state = json.load(file)
+
+    self.tables = self.state.get("tables", TABLES)
+
+    for table in self.tables:
+      setattr(self, table, np.load(os.path.join(self.path, table + ".npy"), mmap_mode=mmap_mode))
+
+    self.episode_idx = self.state["episode_idx"]
+
+  def restore_random_state(self, mc):
+    """
+    Restore the random number generators of an agent and of its environment.
+    The environment should be reset afterwards to draw the same start position as the interrupted run.
+    :param mc:    Monte Carlo agent.
+    :return:      None.
+    """
+
+    mc.random.set_state(self.state["agent_random_state"])
+    mc.env.random.set_state(self.state["env_random_state"])
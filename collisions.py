@@ -0,0 +1,70 @@
+import numpy as np
+import constants
+
+
+CLEAR = 0
+FINISH = 1
+CRASH = 2
+
+MAX_SPEED = 4
+# the segment is sampled at odd multiples of 1 / (2 * NUM_SAMPLES), which never fall on a cell border
+NUM_SAMPLES = 64
+
+
+def get_path_offsets(x_velocity, y_velocity):
+  """
+  Get the cells a car passes through when it moves with a given velocity, in the order it enters them.
+  The car moves along a segment between the centers of the start and the end cell. A cell is passed only if the
+  segment enters its interior, so a diagonal move does not touch the two cells that only share the corner it crosses.
+  :param x_velocity:    X velocity (up).
+  :param y_velocity:    Y velocity (right).
+  :return:              List of (x, y) offsets from the start cell, the start cell is excluded.
+  """
+
+  samples = (np.arange(NUM_SAMPLES) + 0.5) / NUM_SAMPLES
+
+  x_offsets = np.round(-x_velocity * samples).astype(np.int64)
+  y_offsets = np.round(y_velocity * samples).astype(np.int64)
+
+  offsets = []
+
+  for offset in zip(x_offsets.tolist(), y_offsets.tolist()):
+    if offset != (0, 0) and (len(offsets) == 0 or offsets[-1] != offset):
+      offsets.append(offset)
+
+  return offsets
+
+
+def build_path_events(racetrack):
+  """
+  Find the first event along the path of every cell and velocity.
+  Paths that leave the map to the right in a row that ends with a finish cell reach the finish, like in
+  Racetrack.check_finish. Paths that leave the map anywhere else crash.
+  :param racetrack:     Racetrack map.
+  :return:              Array of shape (rows, cols, 5, 5) with CLEAR, FINISH or CRASH.
+  """
+
+  rows, cols = racetrack.shape
+
+  # pad the map so that every path stays inside of it
+  padded = np.full((rows + 2 * MAX_SPEED, cols + 2 * MAX_SPEED), CRASH, dtype=np.uint8)
+  padded[MAX_SPEED:-MAX_SPEED, MAX_SPEED:-MAX_SPEED] = np.where(racetrack == constants.GRASS_VALUE, CRASH, CLEAR)
+  padded[MAX_SPEED:-MAX_SPEED, MAX_SPEED:-MAX_SPEED][racetrack == constants.END_VALUE] = FINISH
+  padded[MAX_SPEED:-MAX_SPEED, -MAX_SPEED:] = np.where(racetrack[:, -1:] == constants.END_VALUE, FINISH, CRASH)
+
+  events = np.zeros((rows, cols, MAX_SPEED + 1, MAX_SPEED + 1), dtype=np.uint8)
+
+  for x_velocity in range(MAX_SPEED + 1):
+    for y_velocity in range(MAX_SPEED + 1):
+
+      first_events = events[:, :, x_velocity, y_velocity]
+
+      for x_offset, y_offset in get_path_offsets(x_velocity, y_velocity):
+
+        cells = padded[MAX_SPEED + x_offset: MAX_SPEED + x_offset + rows,
+                       MAX_SPEED + y_offset: MAX_SPEED + y_offset + cols]
+
+        undecided = first_events == CLEAR
+        first_events[undecided] = cells[undecided]
+
+  return events
@@ -0,0 +1,134 @@
+import collections
+import numpy as np
+import constants, environment
+
+
+UNREACHABLE = -1
+
+
+def compute_distances(racetrack):
+  """
+  Compute the distance of every cell to the closest finish cell, counted in moves to a neighboring cell (up, down,
+  left or right) that does not cross grass.
+  :param racetrack:     Racetrack map.
+  :return:              Array of the same shape as racetrack, UNREACHABLE for grass and cells cut off from the finish.
+  """
+
+  rows, cols = racetrack.shape
+  distances = np.full(racetrack.shape, UNREACHABLE, dtype=np.int64)
+  valid = racetrack != constants.GRASS_VALUE
+
+  queue = collections.deque()
+
+  for x, y in np.argwhere(racetrack == constants.END_VALUE).tolist():
+    distances[x, y] = 0
+    queue.append((x, y))
+
+  # breadth-first search from all finish cells at once
+  while len(queue) > 0:
+
+    x, y = queue.popleft()
+
+    for next_x, next_y in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]:
+      if 0 <= next_x < rows and 0 <= next_y < cols and valid[next_x, next_y] and \
+          distances[next_x, next_y] == UNREACHABLE:
+        distances[next_x, next_y] = distances[x, y] + 1
+        queue.append((next_x, next_y))
+
+  return distances
+
+
+class Curriculum:
+
+  def __init__(self, env, num_levels=10, target_finish_rate=0.8, window=100):
+    """
+    Start training episodes close to the finish and move the start region back towards the start line as the agent
+    learns to finish from it (reverse curriculum).
+    Level i of num_levels starts episodes from the cells that are at most (i + 1) / num_levels of the distance
+    between the finish and the farthest start cell away from the finish (and at least one cell away); the last level
+    starts them from the start line only, which is the original task. The start cells are set through
+    env.start_coordinates, so env.reset draws from them.
+    An episode counts as finished if the car never left the track, so that Racetrack episodes, which always reach
+    the finish, can fail as well.
+    :param env:                     Racetrack or RacetrackStrict environment.
+    :param num_levels:              Number of levels, at least 2.
+    :param target_finish_rate:      Move to the next level when this fraction of the recent episodes finished.
+    :param window:                  Number of recent episodes.
+    """
+
+    assert num_levels >= 2
+
+    self.env = env
+    self.num_levels = num_levels
+    self.target_finish_rate = target_finish_rate
+    self.window = window
+
+    self.start_coordinates = list(env.start_coordinates)
+    self.distances = compute_distances(env.racetrack)
+
+    start_distances = [self.distances[x, y] for x, y in self.start_coordinates]
+    assert min(start_distances) != UNREACHABLE, "the finish cannot be reached from the start line"
+
+    # cells a car can start from: track and start cells, not finish cells
+    candidates = np.argwhere((self.distances > 0) & (env.racetrack != constants.GRASS_VALUE))
+    self.candidate_distances = self.distances[candidates[:, 0], candidates[:, 1]]
+    self.candidates = [tuple(candidate) for candidate in candidates.tolist()]
+    self.max_distance = max(start_distances)
+
+    self.level = None
+    self.finished = collections.deque(maxlen=window)
+    self.set_level(0)
+
+  def get_level_coordinates(self, level):
+    """
+    Get the start cells of a level.
+    :param level:     Level.
+    :return:          List of (x, y) coordinates.
+    """
+
+    if level == self.num_levels - 1:
+      return self.start_coordinates
+
+    threshold = max(self.max_distance * (level + 1) / self.num_levels, 1)
+
+    return [candidate for candidate, distance in zip(self.candidates, self.candidate_distances.tolist())
+            if distance <= threshold]
+
+  def set_level(self, level):
+    """
+    Start the following episodes from the cells of a level.
+    :param level:     Level.
+    :return:          None.
+    """
+
+    self.level = level
+    self.env.start_coordinates = self.get_level_coordinates(level)
+    self.finished.clear()
+
+  def is_done(self):
+    """
+    Check if the curriculum reached the original task.
+    :return:    True if the episodes start from the start line, otherwise False.
+    """
+
+    return self.level == self.num_levels - 1
+
+  def add_episode(self, trajectory):
+    """
+    Record whether an episode finished without leaving the track and move to the next level if enough of the recent
+    ones did.
+    Call before env.reset, so that the next episode starts from the new start region.
+    :param trajectory:    Trajectory of the episode.
+    :return:              True if the level changed, otherwise False.
+    """
+
+    rewards = trajectory.get_rewards()
+    self.finished.append(not np.any(rewards == environment.Racetrack.OUT_OF_BOUNDS_REWARD))
+
+    if self.is_done() or len(self.finished) < self.window or \
+        np.mean(self.finished) < self.target_finish_rate:
+      return False
+
+    self.set_level(self.level + 1)
+
+    return True
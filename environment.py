@@ -1,8 +1,6 @@
-import random
+import bisect
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import constants
+import collisions, constants, utils
 
 
 class Racetrack:
@@ -10,24 +8,61 @@ class Racetrack:
   STEP_REWARD = -1
   OUT_OF_BOUNDS_REWARD = -50
 
-  def __init__(self, racetrack, random_displacement_probability=0.5):
+  def __init__(self, racetrack, random_displacement_probability=0.5, compiled=False, cache_dir=None,
+               swept_path=False, seed=None, start_coordinates=None):
     """
     Initialize racetrack environment.
     The environment is described in Sutton and Barto's Reinforcement Learning: Introduction chapter 5.
     :param racetrack:                           Racetrack map.
     :param random_displacement_probability:     Probability of a random displacement by one square up or right.
+    :param compiled:                            Look up the results of actions in a precomputed transition table.
+    :param cache_dir:                           Where to cache the transition table.
+    :param swept_path:                          Check every cell the car passes through, not only the one it lands
+                                                on, so that fast cars cannot jump over grass.
+    :param seed:                                Seed of the random number generator of the environment (an integer
+                                                or a numpy.random.SeedSequence), random if None.
+    :param start_coordinates:                   Start positions of shape (num_starts, 2) (e.g. trackfile.Track),
+                                                found by scanning the map if None.
     """
 
     self.racetrack = racetrack
     self.random_displacement_probability = random_displacement_probability
+    self.random = utils.RandomStream(seed)
     self.start_coordinates = None
-    self.get_start_positions()
+
+    if start_coordinates is None:
+      self.get_start_positions()
+    else:
+      self.start_coordinates = [tuple(coordinates) for coordinates in np.asarray(start_coordinates).tolist()]
+
+    self.path_events = None
+
+    if swept_path:
+      self.path_events = collisions.build_path_events(racetrack)
+
+    self.transitions = None
+    self.cumulative_probabilities = None
+    self.next_states = None
+    self.rewards = None
+    self.done_table = None
+
+    if compiled:
+      self.compile(cache_dir=cache_dir)
 
     self.position = None
     self.velocity = None
     self.done = None
     self.reset()
 
+  def seed(self, seed=None):
+    """
+    Reseed the random number generator of the environment.
+    :param seed:    Seed (an integer or a numpy.random.SeedSequence), random if None.
+    :return:        None.
+    """
+
+    self.random = utils.RandomStream(seed)
+
   def get_start_positions(self):
     """
     Select start position by random (from a list of start positions).
@@ -49,6 +84,9 @@ class Racetrack:
     :return:            None.
     """
 
+    if self.transitions is not None:
+      return self.act_compiled(x_change, y_change)
+
     assert not self.done
 
     # validation actions
@@ -61,18 +99,19 @@ class Racetrack:
 
     # move car
     last_position = self.position
+    path_event = self.check_path()
     self.update_position(self.velocity)
     self.random_displacement()
 
     # check if finished
-    if self.check_finish():
+    if path_event == collisions.FINISH or (path_event == collisions.CLEAR and self.check_finish()):
       self.done = True
       return self.STEP_REWARD
 
     # check for invalid position
     invalid_position = False
 
-    if self.check_position_out_of_bounds() or self.check_position_grass():
+    if path_event == collisions.CRASH or self.check_position_out_of_bounds() or self.check_position_grass():
       invalid_position = True
       self.correct_invalid_position(last_position)
       self.correct_same_position()
@@ -91,6 +130,68 @@ class Racetrack:
     else:
       return self.STEP_REWARD
 
+  def compile(self, cache_dir=None):
+    """
+    Precompute the next state and reward for every state, action and random outcome.
+    The table is cached on disk, so it is built only once for each track.
+    :param cache_dir:     Cache directory, transitions.DEFAULT_CACHE_DIR if None.
+    :return:              None.
+    """
+
+    # transitions builds its tables from BatchRacetrack
+    import transitions
+
+    if cache_dir is None:
+      cache_dir = transitions.DEFAULT_CACHE_DIR
+
+    self.transitions = transitions.from_env(self, cache_dir=cache_dir)
+    self.cumulative_probabilities = np.cumsum(self.transitions.probabilities).tolist()
+
+    # flat views make single element lookups cheap
+    self.next_states = np.asarray(self.transitions.next_states).reshape(-1)
+    self.rewards = np.asarray(self.transitions.rewards).reshape(-1)
+    self.done_table = np.asarray(self.transitions.done).reshape(-1)
+
+  def act_compiled(self, x_change, y_change):
+    """
+    Act in the environment using the precomputed transition table.
+    All random draws of a step are replaced by a single uniform draw that selects the outcome.
+    :param x_change:    X acceleration.
+    :param y_change:    Y acceleration.
+    :return:            Reward.
+    """
+
+    assert not self.done
+
+    # validation actions
+    assert -1 <= x_change <= 1
+    assert -1 <= y_change <= 1
+
+    model = self.transitions
+    outcome = bisect.bisect_right(self.cumulative_probabilities, self.random.uniform())
+    index = (model.get_state_index(self.get_state()) * model.NUM_ACTIONS +
+             model.ACCELERATION_TO_ACTION[x_change + 1][y_change + 1]) * len(self.cumulative_probabilities) + \
+            min(outcome, len(self.cumulative_probabilities) - 1)
+
+    x, y, x_velocity, y_velocity = model.get_state(self.next_states.item(index))
+
+    self.position = (x, y)
+    self.velocity = (x_velocity, y_velocity)
+    self.done = self.done_table.item(index)
+
+    return self.rewards.item(index)
+
+  def check_path(self):
+    """
+    Check the cells the car passes through with its current velocity, if the environment uses swept paths.
+    :return:      First event along the path (collisions.CLEAR, FINISH or CRASH), always CLEAR otherwise.
+    """
+
+    if self.path_events is None:
+      return collisions.CLEAR
+
+    return self.path_events[self.position[0], self.position[1], self.velocity[0], self.velocity[1]]
+
   def update_position(self, velocity):
     """
     Update position based on the velocity.
@@ -140,7 +241,7 @@ class Racetrack:
 
     # make sure the velocity is not 0
     if self.velocity == (0, 0):
-      if random.choice([True, False]):
+      if self.random.uniform() < 0.5:
         self.velocity = (1, 0)
       else:
         self.velocity = (0, 1)
@@ -189,8 +290,8 @@ class Racetrack:
     :return:    None.
     """
 
-    if np.random.uniform(0, 1) < self.random_displacement_probability:
-      if np.random.choice([True, False]):
+    if self.random.uniform() < self.random_displacement_probability:
+      if self.random.uniform() < 0.5:
         self.update_position((1, 0))
       else:
         self.update_position((0, 1))
@@ -201,39 +302,22 @@ class Racetrack:
     :return:      None.
     """
 
-    self.position = random.choice(self.start_coordinates)
+    self.position = self.random.choice(self.start_coordinates)
     self.velocity = (0, 0)
     self.done = False
 
   def show_racetrack(self, save_path=None, show_legend=True):
     """
     Show the racetrack with labels.
-    https://stackoverflow.com/questions/25482876/how-to-add-legend-to-imshow-in-matplotlib
     :param save_path:     Where to save the figure.
     :param show_legend:   Show legend.
     :return:              None.
     """
 
-    im =  plt.imshow(self.racetrack)
-
-    plt.axis("off")
-
-    if show_legend:
-      values = np.unique(self.racetrack.ravel())
-      labels = {
-        constants.START_VALUE: "start",
-        constants.END_VALUE: "end",
-        constants.TRACK_VALUE: "track",
-        constants.GRASS_VALUE: "grass"
-      }
-      colors = [im.cmap(im.norm(value)) for value in values]
-      patches = [mpatches.Patch(color=colors[i], label=labels[values[i]]) for i in range(len(values))]
-      plt.legend(handles=patches, loc=4)
-
-    if save_path is not None:
-      plt.savefig(save_path, bbox_inches="tight")
+    # matplotlib is only imported when a plot is shown
+    import visualization
 
-    plt.show()
+    visualization.show_racetrack(self.racetrack, save_path=save_path, show_legend=show_legend)
 
   def get_state(self):
     """
@@ -248,16 +332,22 @@ class RacetrackStrict(Racetrack):
   STEP_REWARD = -1
   OUT_OF_BOUNDS_REWARD = -50
 
-  def __init__(self, racetrack):
+  def __init__(self, racetrack, compiled=False, cache_dir=None, swept_path=False, seed=None, start_coordinates=None):
     """
     Initialize racetrack environment.
     The environment is described in Sutton and Barto's Reinforcement Learning: Introduction chapter 5.
     This version of the environment terminates when the car attempts to leave the track.
     However, there are not random displacements.
-    :param racetrack:     Racetrack map.
+    :param racetrack:           Racetrack map.
+    :param compiled:            Look up the results of actions in a precomputed transition table.
+    :param cache_dir:           Where to cache the transition table.
+    :param swept_path:          Check every cell the car passes through, not only the one it lands on.
+    :param seed:                Seed of the random number generator of the environment.
+    :param start_coordinates:   Start positions of shape (num_starts, 2), found by scanning the map if None.
     """
 
-    Racetrack.__init__(self, racetrack)
+    Racetrack.__init__(self, racetrack, compiled=compiled, cache_dir=cache_dir, swept_path=swept_path, seed=seed,
+                       start_coordinates=start_coordinates)
 
 
   def act(self, x_change, y_change):
@@ -268,6 +358,9 @@ class RacetrackStrict(Racetrack):
     :return:            None.
     """
 
+    if self.transitions is not None:
+      return self.act_compiled(x_change, y_change)
+
     assert not self.done
 
     # validation actions
@@ -279,16 +372,376 @@ class RacetrackStrict(Racetrack):
     self.correct_velocity()
 
     # move car
+    path_event = self.check_path()
     self.update_position(self.velocity)
 
     # check if finished
-    if self.check_finish():
+    if path_event == collisions.FINISH or (path_event == collisions.CLEAR and self.check_finish()):
       self.done = True
       return self.STEP_REWARD
 
     # check for invalid position
-    if self.check_position_out_of_bounds() or self.check_position_grass():
+    if path_event == collisions.CRASH or self.check_position_out_of_bounds() or self.check_position_grass():
       self.done = True
       return self.OUT_OF_BOUNDS_REWARD
 
-    return self.STEP_REWARD
\ No newline at end of file
+    return self.STEP_REWARD
+
+class BatchRacetrack:
+
+  STEP_REWARD = -1
+  OUT_OF_BOUNDS_REWARD = -50
+
+  def __init__(self, racetrack, num_cars, random_displacement_probability=0.5, auto_reset=True, swept_path=False,
+               seed=None, start_coordinates=None):
+    """
+    Initialize a batch of racetrack environments that share a single map.
+    The cars are stored as NumPy arrays and stepped together. Each car follows the rules of Racetrack and the random
+    numbers are drawn in the same order, so a batch with a single car reproduces Racetrack under the same seed.
+    :param racetrack:                           Racetrack map.
+    :param num_cars:                            Number of cars.
+    :param random_displacement_probability:     Probability of a random displacement by one square up or right.
+    :param auto_reset:                          Reset cars that finished at the end of each step. Otherwise, finished
+                                                cars are frozen until reset is called.
+    :param swept_path:                          Check every cell the cars pass through, like in Racetrack.
+    :param seed:                                Seed of the random number generator shared by all cars.
+    :param start_coordinates:                   Start positions of shape (num_starts, 2), found by scanning the map
+                                                if None.
+    """
+
+    self.racetrack = racetrack
+    self.num_cars = num_cars
+    self.random_displacement_probability = random_displacement_probability
+    self.random = utils.RandomStream(seed)
+    self.auto_reset = auto_reset
+    self.start_coordinates = None
+
+    if start_coordinates is None:
+      self.get_start_positions()
+    else:
+      self.start_coordinates = [tuple(coordinates) for coordinates in np.asarray(start_coordinates).tolist()]
+
+    self.path_events = None
+
+    if swept_path:
+      self.path_events = collisions.build_path_events(racetrack)
+
+    self.positions = None
+    self.velocities = None
+    self.done = None
+    self.reset()
+
+  def seed(self, seed=None):
+    """
+    Reseed the random number generator of the environments.
+    :param seed:    Seed (an integer or a numpy.random.SeedSequence), random if None.
+    :return:        None.
+    """
+
+    self.random = utils.RandomStream(seed)
+
+  def get_start_positions(self):
+    """
+    Get a list of start positions.
+    :return:      None.
+    """
+
+    self.start_coordinates = []
+    x_coordinates, y_coordinates = np.where(self.racetrack == constants.START_VALUE)
+
+    for x, y in zip(x_coordinates, y_coordinates):
+
+      self.start_coordinates.append((x, y))
+
+  def act(self, actions):
+    """
+    Act in all environments that are not done.
+    :param actions:     Accelerations of shape (num_cars, 2).
+    :return:            Rewards and a mask of cars that finished their episode in this step.
+    """
+
+    actions = np.asarray(actions)
+
+    # validation actions
+    assert actions.shape == (self.num_cars, 2)
+    assert np.all((actions >= -1) & (actions <= 1))
+
+    indices = np.flatnonzero(~self.done)
+
+    # update velocity, the random choice for zero velocities is drawn in the same way as in Racetrack
+    velocities = np.clip(self.velocities[indices] + actions[indices], 0, 4)
+    zero_velocity = np.all(velocities == 0, axis=1)
+    zero_velocity_x = np.zeros(len(indices), dtype=np.bool_)
+    zero_velocity_x[zero_velocity] = self.random.uniforms(np.sum(zero_velocity)) < 0.5
+
+    displaced, displacement_x = self.draw_displacement(len(indices))
+
+    positions, velocities, step_rewards, step_done = \
+      self.transition(self.positions[indices], velocities, zero_velocity_x, displaced, displacement_x)
+
+    self.positions[indices] = positions
+    self.velocities[indices] = velocities
+    self.done[indices] = step_done
+
+    rewards = np.zeros(self.num_cars, dtype=np.int32)
+    rewards[indices] = step_rewards
+    finished = np.zeros(self.num_cars, dtype=np.bool_)
+    finished[indices] = step_done
+
+    if self.auto_reset and np.any(finished):
+      self.reset(finished)
+
+    return rewards, finished
+
+  def draw_displacement(self, num_cars):
+    """
+    Draw random displacements.
+    :param num_cars:    Number of cars to draw for.
+    :return:            Mask of displaced cars and a mask of displacements in the x axis (the rest is in the y axis).
+    """
+
+    displaced = self.random.uniforms(num_cars) < self.random_displacement_probability
+    displacement_x = np.zeros(num_cars, dtype=np.bool_)
+    displacement_x[displaced] = self.random.uniforms(np.sum(displaced)) < 0.5
+
+    return displaced, displacement_x
+
+  def transition(self, positions, velocities, zero_velocity_x, displaced, displacement_x):
+    """
+    Deterministic part of the dynamics given the outcomes of all random draws.
+    :param positions:         Positions of shape (N, 2).
+    :param velocities:        Velocities after acceleration of shape (N, 2).
+    :param zero_velocity_x:   Replace zero velocities with (1, 0) where True and with (0, 1) otherwise.
+    :param displaced:         Mask of randomly displaced cars.
+    :param displacement_x:    Displace in the x axis where True and in the y axis otherwise.
+    :return:                  New positions, new velocities, rewards and done masks.
+    """
+
+    velocities = self.correct_velocity(velocities, zero_velocity_x)
+
+    # move car
+    last_positions = positions
+    path_events = self.check_path(positions, velocities)
+    positions = self.update_position(positions, velocities)
+    positions = self.random_displacement(positions, displaced, displacement_x)
+
+    # check if finished
+    done = (path_events == collisions.FINISH) | ((path_events == collisions.CLEAR) & self.check_finish(positions))
+
+    # check for invalid position
+    invalid = ~done & ((path_events == collisions.CRASH) | self.check_position_out_of_bounds(positions) |
+                       self.check_position_grass(positions))
+
+    positions[invalid] = self.correct_same_position(last_positions[invalid])
+    velocities[invalid] = 0
+
+    # check if finished again
+    done[invalid] = self.check_finish(positions[invalid])
+
+    rewards = np.where(invalid, self.OUT_OF_BOUNDS_REWARD, self.STEP_REWARD).astype(np.int32)
+
+    return positions, velocities, rewards, done
+
+  def check_path(self, positions, velocities):
+    """
+    Check the cells the cars pass through, if the environment uses swept paths.
+    :param positions:     Positions of shape (N, 2).
+    :param velocities:    Velocities of shape (N, 2).
+    :return:              First events along the paths (collisions.CLEAR, FINISH or CRASH), always CLEAR otherwise.
+    """
+
+    if self.path_events is None:
+      return np.full(len(positions), collisions.CLEAR, dtype=np.uint8)
+
+    return self.path_events[positions[:, 0], positions[:, 1], velocities[:, 0], velocities[:, 1]]
+
+  def update_position(self, positions, velocities):
+    """
+    Update positions based on the velocities.
+    :param positions:     Positions of shape (N, 2).
+    :param velocities:    Velocities of shape (N, 2) or a single velocity.
+    :return:              New positions.
+    """
+
+    return positions + np.asarray(velocities) * np.array([-1, 1])
+
+  def check_finish(self, positions):
+    """
+    Check if the race cars reached finish.
+    :param positions:     Positions of shape (N, 2).
+    :return:              Mask of cars that reached finish.
+    """
+
+    finished = np.zeros(len(positions), dtype=np.bool_)
+    valid = (positions[:, 0] >= 0) & (positions[:, 0] < self.racetrack.shape[0])
+
+    y_coordinates = np.clip(positions[valid, 1], 0, self.racetrack.shape[1] - 1)
+    finished[valid] = self.racetrack[positions[valid, 0], y_coordinates] == constants.END_VALUE
+
+    return finished
+
+  def correct_velocity(self, velocities, zero_velocity_x):
+    """
+    Correct race car velocities. They cannot be (0, 0) and must be between 0 and 4 for both axes.
+    :param velocities:        Velocities of shape (N, 2).
+    :param zero_velocity_x:   Replace zero velocities with (1, 0) where True and with (0, 1) otherwise.
+    :return:                  Corrected velocities.
+    """
+
+    velocities = np.clip(velocities, 0, 4)
+
+    zero_velocity = np.all(velocities == 0, axis=1)
+    velocities[zero_velocity & zero_velocity_x, 0] = 1
+    velocities[zero_velocity & ~zero_velocity_x, 1] = 1
+
+    return velocities
+
+  def check_position_out_of_bounds(self, positions):
+    """
+    Check if the race cars are out of bounds.
+    :param positions:     Positions of shape (N, 2).
+    :return:              Mask of cars that are out of bounds.
+    """
+
+    return (positions[:, 0] < 0) | (positions[:, 0] >= self.racetrack.shape[0]) | (positions[:, 1] < 0) | \
+           (positions[:, 1] >= self.racetrack.shape[1])
+
+  def check_position_grass(self, positions):
+    """
+    Check if the race cars are on grass.
+    :param positions:     Positions of shape (N, 2).
+    :return:              Mask of cars that are on grass (False for cars that are out of bounds).
+    """
+
+    grass = np.zeros(len(positions), dtype=np.bool_)
+    valid = ~self.check_position_out_of_bounds(positions)
+    grass[valid] = self.racetrack[positions[valid, 0], positions[valid, 1]] == constants.GRASS_VALUE
+
+    return grass
+
+  def correct_same_position(self, positions):
+    """
+    Move the cars by at least one square to their target (so that each episode eventually finishes).
+    :param positions:     Positions of shape (N, 2).
+    :return:              Corrected positions.
+    """
+
+    positions = self.update_position(positions, (1, 0))
+
+    invalid = self.check_position_out_of_bounds(positions) | self.check_position_grass(positions)
+    positions[invalid] = self.update_position(positions[invalid], (-1, 1))
+
+    return positions
+
+  def random_displacement(self, positions, displaced, displacement_x):
+    """
+    Displace some cars by one square up or right.
+    :param positions:         Positions of shape (N, 2).
+    :param displaced:         Mask of displaced cars.
+    :param displacement_x:    Displace in the x axis where True and in the y axis otherwise.
+    :return:                  New positions.
+    """
+
+    positions = positions.copy()
+    positions[displaced & displacement_x, 0] -= 1
+    positions[displaced & ~displacement_x, 1] += 1
+
+    return positions
+
+  def reset(self, mask=None, positions=None, velocities=None):
+    """
+    Reset environments.
+    :param mask:          Mask of cars to reset, all cars are reset if None.
+    :param positions:     Positions of the reset cars, random start positions if None.
+    :param velocities:    Velocities of the reset cars, zero if None.
+    :return:              None.
+    """
+
+    if mask is None:
+      self.positions = np.zeros((self.num_cars, 2), dtype=np.int64)
+      self.velocities = np.zeros((self.num_cars, 2), dtype=np.int64)
+      self.done = np.zeros(self.num_cars, dtype=np.bool_)
+      mask = np.ones(self.num_cars, dtype=np.bool_)
+
+    indices = np.flatnonzero(mask)
+
+    if len(indices) > 0:
+
+      if positions is None:
+        choices = (self.random.uniforms(len(indices)) * len(self.start_coordinates)).astype(np.int64)
+        positions = np.array(self.start_coordinates)[choices]
+
+      if velocities is None:
+        velocities = 0
+
+      self.positions[indices] = positions
+      self.velocities[indices] = velocities
+      self.done[indices] = False
+
+  def get_states(self):
+    """
+    Get current states (positions and velocities).
+    :return:    States of shape (num_cars, 4).
+    """
+
+    return np.concatenate([self.positions, self.velocities], axis=1)
+
+
+class BatchRacetrackStrict(BatchRacetrack):
+
+  STEP_REWARD = -1
+  OUT_OF_BOUNDS_REWARD = -50
+
+  def __init__(self, racetrack, num_cars, auto_reset=True, swept_path=False, seed=None, start_coordinates=None):
+    """
+    Initialize a batch of strict racetrack environments that share a single map.
+    Each car follows the rules of RacetrackStrict: the episode terminates when the car attempts to leave the track and
+    there are no random displacements.
+    :param racetrack:           Racetrack map.
+    :param num_cars:            Number of cars.
+    :param auto_reset:          Reset cars that finished at the end of each step.
+    :param swept_path:          Check every cell the cars pass through, like in RacetrackStrict.
+    :param seed:                Seed of the random number generator shared by all cars.
+    :param start_coordinates:   Start positions of shape (num_starts, 2), found by scanning the map if None.
+    """
+
+    BatchRacetrack.__init__(self, racetrack, num_cars, auto_reset=auto_reset, swept_path=swept_path, seed=seed,
+                            start_coordinates=start_coordinates)
+
+  def draw_displacement(self, num_cars):
+    """
+    There are no random displacements in the strict version.
+    :param num_cars:    Number of cars to draw for.
+    :return:            Masks of displaced cars and of displacements in the x axis (all False).
+    """
+
+    return np.zeros(num_cars, dtype=np.bool_), np.zeros(num_cars, dtype=np.bool_)
+
+  def transition(self, positions, velocities, zero_velocity_x, displaced, displacement_x):
+    """
+    Deterministic part of the dynamics given the outcomes of all random draws.
+    :param positions:         Positions of shape (N, 2).
+    :param velocities:        Velocities after acceleration of shape (N, 2).
+    :param zero_velocity_x:   Replace zero velocities with (1, 0) where True and with (0, 1) otherwise.
+    :param displaced:         Ignored, there are no random displacements.
+    :param displacement_x:    Ignored, there are no random displacements.
+    :return:                  New positions, new velocities, rewards and done masks.
+    """
+
+    velocities = self.correct_velocity(velocities, zero_velocity_x)
+
+    # move car
+    path_events = self.check_path(positions, velocities)
+    positions = self.update_position(positions, velocities)
+
+    # check if finished
+    done = (path_events == collisions.FINISH) | ((path_events == collisions.CLEAR) & self.check_finish(positions))
+
+    # check for invalid position
+    crashed = ~done & ((path_events == collisions.CRASH) | self.check_position_out_of_bounds(positions) |
+                       self.check_position_grass(positions))
+    done |= crashed
+
+    rewards = np.where(crashed, self.OUT_OF_BOUNDS_REWARD, self.STEP_REWARD).astype(np.int32)
+
+    return positions, velocities, rewards, done
@@ -0,0 +1,218 @@
+import concurrent.futures
+import math
+import numpy as np
+import agent, constants, environment
+
+
+PERCENTILES = [5, 50, 95]
+
+
+def make_batch_env(racetrack, num_cars, strict=False, random_displacement_probability=0.5, swept_path=False,
+                   seed=None, start_coordinates=None):
+  """
+  Create a batch environment that does not reset finished cars.
+  :param racetrack:                           Racetrack map.
+  :param num_cars:                            Number of cars.
+  :param strict:                              Create BatchRacetrackStrict instead of BatchRacetrack.
+  :param random_displacement_probability:     Probability of a random displacement in BatchRacetrack.
+  :param swept_path:                          Check every cell the cars pass through.
+  :param seed:                                Seed of the random number generator of the environment.
+  :param start_coordinates:                   Start positions of shape (num_starts, 2), found by scanning the map
+                                              if None.
+  :return:                                    Batch environment.
+  """
+
+  if strict:
+    return environment.BatchRacetrackStrict(racetrack, num_cars, auto_reset=False, swept_path=swept_path, seed=seed,
+                                            start_coordinates=start_coordinates)
+  else:
+    return environment.BatchRacetrack(racetrack, num_cars,
+                                      random_displacement_probability=random_displacement_probability,
+                                      auto_reset=False, swept_path=swept_path, seed=seed,
+                                      start_coordinates=start_coordinates)
+
+
+def evaluate(policy, racetrack, num_rollouts=10, strict=False, random_displacement_probability=0.5,
+             max_steps=1000, swept_path=False, seed=None, start_coordinates=None):
+  """
+  Run greedy rollouts of a policy from every start position in a batch environment.
+  :param policy:                              Policy of shape (rows, cols, 5, 5).
+  :param racetrack:                           Racetrack map.
+  :param num_rollouts:                        Number of rollouts from each start position.
+  :param strict:                              Evaluate in the strict version of the environment.
+  :param random_displacement_probability:     Probability of a random displacement in the original environment.
+  :param max_steps:                           Stop unfinished rollouts after this many steps.
+  :param swept_path:                          Check every cell the cars pass through.
+  :param seed:                                Seed of the random number generator of the environment.
+  :param start_coordinates:                   Start positions of shape (num_starts, 2) (e.g. trackfile.Track),
+                                              found by scanning the map if None.
+  :return:                                    Dictionary of statistics.
+  """
+
+  if start_coordinates is None:
+    start_coordinates = np.argwhere(racetrack == constants.START_VALUE)
+
+  positions = get_start_coordinates(racetrack, num_rollouts, start_coordinates=start_coordinates)
+
+  env = make_batch_env(racetrack, len(positions), strict=strict,
+                       random_displacement_probability=random_displacement_probability, swept_path=swept_path,
+                       seed=seed, start_coordinates=start_coordinates)
+  env.reset(positions=positions)
+
+  returns = np.zeros(env.num_cars, dtype=np.int64)
+  lengths = np.zeros(env.num_cars, dtype=np.int64)
+  finished = np.zeros(env.num_cars, dtype=np.bool_)
+  off_track_steps = 0
+
+  for _ in range(max_steps):
+
+    active = ~env.done
+
+    if not np.any(active):
+      break
+
+    # cars that are done do not move, their actions are ignored
+    x_coordinates = np.clip(env.positions[:, 0], 0, racetrack.shape[0] - 1)
+    y_coordinates = np.clip(env.positions[:, 1], 0, racetrack.shape[1] - 1)
+    actions = policy[x_coordinates, y_coordinates, env.velocities[:, 0], env.velocities[:, 1]]
+
+    rewards, done = env.act(agent.MonteCarlo.ACTION_TO_ACCELERATION[actions])
+
+    # record finishes when they happen, a car with a swept path can pass through the finish without stopping on it;
+    # the strict environment also ends the episodes of cars that leave the track
+    if strict:
+      done &= rewards != env.OUT_OF_BOUNDS_REWARD
+
+    finished |= done
+    returns += rewards
+    lengths += active
+    off_track_steps += np.sum(rewards == env.OUT_OF_BOUNDS_REWARD)
+
+  results = {
+    "num_rollouts": int(env.num_cars),
+    "mean_return": float(np.mean(returns)),
+    "mean_length": float(np.mean(lengths)),
+    "off_track_rate": float(off_track_steps / max(np.sum(lengths), 1)),
+    "finish_rate": float(np.mean(finished))
+  }
+
+  for percentile in PERCENTILES:
+    results["return_p{:d}".format(percentile)] = float(np.percentile(returns, percentile))
+    results["length_p{:d}".format(percentile)] = float(np.percentile(lengths, percentile))
+
+  return results
+
+
+def get_start_coordinates(racetrack, num_rollouts, start_coordinates=None):
+  """
+  Repeat every start position of a racetrack.
+  :param racetrack:             Racetrack map.
+  :param num_rollouts:          Number of rollouts from each start position.
+  :param start_coordinates:     Start positions of shape (num_starts, 2), found by scanning the map if None.
+  :return:                      Positions of shape (num_starts * num_rollouts, 2).
+  """
+
+  if start_coordinates is None:
+    start_coordinates = np.argwhere(racetrack == constants.START_VALUE)
+
+  return np.repeat(np.asarray(start_coordinates, dtype=np.int64).reshape(-1, 2), num_rollouts, axis=0)
+
+
+def get_num_rollouts(racetrack, num_episodes, start_coordinates=None):
+  """
+  Get the number of rollouts from each start position so that there are at least num_episodes rollouts in total.
+  :param racetrack:             Racetrack map.
+  :param num_episodes:          Number of episodes.
+  :param start_coordinates:     Start positions of shape (num_starts, 2), found by scanning the map if None.
+  :return:                      Number of rollouts per start position.
+  """
+
+  if start_coordinates is None:
+    num_starts = np.sum(racetrack == constants.START_VALUE)
+  else:
+    num_starts = len(start_coordinates)
+
+  return int(math.ceil(num_episodes / num_starts))
+
+
+def format_results(results):
+  """
+  Format evaluation statistics for printing.
+  :param results:     Dictionary of statistics.
+  :return:            String.
+  """
+
+  return "mean return {:.2f} (p5 {:.0f}, p95 {:.0f}), mean length {:.1f}, off track {:.1%}, finished {:.1%}".format(
+    results["mean_return"], results["return_p5"], results["return_p95"], results["mean_length"],
+    results["off_track_rate"], results["finish_rate"])
+
+
+class AsyncEvaluator:
+
+  def __init__(self, racetrack, num_rollouts=10, strict=False, random_displacement_probability=0.5, max_workers=1,
+               swept_path=False, seed=None, start_coordinates=None):
+    """
+    Evaluate snapshots of a policy in worker processes while training continues.
+    :param racetrack:                           Racetrack map.
+    :param num_rollouts:                        Number of rollouts from each start position.
+    :param strict:                              Evaluate in the strict version of the environment.
+    :param random_displacement_probability:     Probability of a random displacement in the original environment.
+    :param max_workers:                         Number of worker processes.
+    :param swept_path:                          Check every cell the cars pass through.
+    :param seed:                                Seed of the evaluations (an integer or a
+                                                numpy.random.SeedSequence), each one gets its own stream.
+    :param start_coordinates:                   Start positions of shape (num_starts, 2), found by scanning the map
+                                                if None.
+    """
+
+    self.racetrack = racetrack
+    self.start_coordinates = start_coordinates
+    self.num_rollouts = num_rollouts
+    self.strict = strict
+    self.random_displacement_probability = random_displacement_probability
+    self.swept_path = swept_path
+    self.seed_sequence = seed
+
+    if not isinstance(seed, np.random.SeedSequence):
+      self.seed_sequence = np.random.SeedSequence(seed)
+
+    self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    self.pending = []
+
+  def submit(self, policy, episode_idx):
+    """
+    Start evaluating a copy of a policy.
+    :param policy:          Policy of shape (rows, cols, 5, 5).
+    :param episode_idx:     Training episode of the snapshot.
+    :return:                None.
+    """
+
+    future = self.executor.submit(evaluate, np.array(policy), self.racetrack, num_rollouts=self.num_rollouts,
+                                  strict=self.strict,
+                                  random_displacement_probability=self.random_displacement_probability,
+                                  swept_path=self.swept_path, seed=self.seed_sequence.spawn(1)[0],
+                                  start_coordinates=self.start_coordinates)
+    self.pending.append((episode_idx, future))
+
+  def get_results(self, wait=False):
+    """
+    Collect results of finished evaluations in the order they were submitted.
+    :param wait:    Wait for all pending evaluations.
+    :return:        List of (episode index, statistics).
+    """
+
+    results = []
+
+    while len(self.pending) > 0 and (wait or self.pending[0][1].done()):
+      episode_idx, future = self.pending.pop(0)
+      results.append((episode_idx, future.result()))
+
+    return results
+
+  def close(self):
+    """
+    Wait for pending evaluations and stop the worker processes.
+    :return:      None.
+    """
+
+    self.executor.shutdown(wait=True)
@@ -0,0 +1,302 @@
+import importlib.util
+import numpy as np
+import collisions, constants, environment
+from trajectory import Trajectory
+
+
+# numba is slow to import, it is only imported when the kernels are compiled before the first rollout
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+NUM_ACTIONS = 9
+ACTION_TO_ACCELERATION = np.array([[1, 1], [0, 1], [1, 0], [0, 0], [-1, 0], [0, -1], [1, -1], [-1, 1], [-1, -1]],
+                                  dtype=np.int64)
+
+STEP_REWARD = -1
+OUT_OF_BOUNDS_REWARD = -50
+
+# a step draws at most two numbers for the agent and three for the environment (plus one for a reset)
+AGENT_NUMBERS_PER_STEP = 2
+ENV_NUMBERS_PER_STEP = 3
+
+# compiled functions read globals as constants
+GRASS_VALUE = constants.GRASS_VALUE
+END_VALUE = constants.END_VALUE
+CLEAR = collisions.CLEAR
+FINISH = collisions.FINISH
+CRASH = collisions.CRASH
+
+NO_PATH_EVENTS = np.zeros((1, 1, 1, 1), dtype=np.uint8)
+
+# positions of the counters shared between rollout and rollout_kernel
+ENV_USED = 0
+AGENT_USED = 1
+NUM_STEPS = 2
+NUM_FINISHED = 3
+EPISODE_START = 4
+
+compiled = False
+
+
+def compile_kernels():
+  """
+  Replace the kernels with versions compiled by numba in nopython mode, or keep them as they are if numba is not
+  installed. Compiled kernels call the other kernels through the module globals, so all of them are replaced.
+  :return:    None.
+  """
+
+  global compiled, check_finish, check_invalid, rollout_kernel
+
+  if compiled:
+    return
+
+  compiled = True
+
+  if not NUMBA_AVAILABLE:
+    return
+
+  import numba
+
+  check_finish = numba.njit(cache=True)(check_finish)
+  check_invalid = numba.njit(cache=True)(check_invalid)
+  rollout_kernel = numba.njit(cache=True)(rollout_kernel)
+
+
+def check_finish(racetrack, x, y):
+  """
+  Check if a position reached the finish, like Racetrack.check_finish.
+  :param racetrack:     Racetrack map.
+  :param x:             X coordinate.
+  :param y:             Y coordinate.
+  :return:              True if finished, otherwise False.
+  """
+
+  if x < 0 or x >= racetrack.shape[0]:
+    return False
+
+  y = min(max(y, 0), racetrack.shape[1] - 1)
+
+  return racetrack[x, y] == END_VALUE
+
+
+def check_invalid(racetrack, x, y):
+  """
+  Check if a position is out of bounds or on grass.
+  :param racetrack:     Racetrack map.
+  :param x:             X coordinate.
+  :param y:             Y coordinate.
+  :return:              True if invalid, otherwise False.
+  """
+
+  if x < 0 or x >= racetrack.shape[0] or y < 0 or y >= racetrack.shape[1]:
+    return True
+
+  return racetrack[x, y] == GRASS_VALUE
+
+
+def rollout_kernel(racetrack, policy, path_events, swept_path, strict, random_displacement_probability, epsilon,
+                   explore, start_coordinates, num_episodes, car, env_numbers, agent_numbers, states, actions,
+                   rewards, probabilities, lengths, counters):
+  """
+  Play episodes of Racetrack or RacetrackStrict with an (epsilon-)greedy policy.
+  The random numbers are taken in the same order as by the environment and the agent. The kernel returns early when
+  it runs out of random numbers or of space for the steps, and continues from car and counters when called again.
+  :param racetrack:                           Racetrack map.
+  :param policy:                              Greedy action of every state.
+  :param path_events:                         First event along the path of every cell and velocity.
+  :param swept_path:                          Use path_events.
+  :param strict:                              Play RacetrackStrict.
+  :param random_displacement_probability:     Probability of a random displacement (only if not strict).
+  :param epsilon:                             Exploration constant.
+  :param explore:                             Play the epsilon-greedy policy instead of the greedy one.
+  :param start_coordinates:                   Array of shape (num_starts, 2).
+  :param num_episodes:                        Number of episodes.
+  :param car:                                 Array with the position, the velocity and the done flag.
+  :param env_numbers:                         Uniform random numbers of the environment.
+  :param agent_numbers:                       Uniform random numbers of the agent.
+  :param states:                              Output array of visited states.
+  :param actions:                             Output array of played actions.
+  :param rewards:                             Output array of received rewards.
+  :param probabilities:                       Output array of the probabilities of the played actions.
+  :param lengths:                             Output array of episode lengths.
+  :param counters:                            Used environment and agent numbers, number of steps, number of
+                                              finished episodes and the first step of the current episode.
+  :return:                                    None.
+  """
+
+  env_used = counters[ENV_USED]
+  agent_used = counters[AGENT_USED]
+  num_steps = counters[NUM_STEPS]
+  num_finished = counters[NUM_FINISHED]
+  episode_start = counters[EPISODE_START]
+
+  x, y, x_velocity, y_velocity, done = car[0], car[1], car[2], car[3], car[4]
+
+  while num_finished < num_episodes:
+
+    if done:
+
+      # reset before the next episode
+      if env_used == len(env_numbers):
+        break
+
+      start = int(env_numbers[env_used] * len(start_coordinates))
+      env_used += 1
+
+      x, y = start_coordinates[start, 0], start_coordinates[start, 1]
+      x_velocity, y_velocity, done = 0, 0, 0
+
+    if env_used + ENV_NUMBERS_PER_STEP > len(env_numbers) or \
+        agent_used + AGENT_NUMBERS_PER_STEP > len(agent_numbers) or num_steps == len(actions):
+      break
+
+    # select action
+    greedy_action = policy[x, y, x_velocity, y_velocity]
+    action = greedy_action
+    probability = 1.0
+
+    if explore:
+
+      if agent_numbers[agent_used] < epsilon:
+        action = int(agent_numbers[agent_used + 1] * NUM_ACTIONS)
+        agent_used += 2
+      else:
+        agent_used += 1
+
+      probability = epsilon / NUM_ACTIONS + (1.0 - epsilon) * (action == greedy_action)
+
+    states[num_steps, 0] = x
+    states[num_steps, 1] = y
+    states[num_steps, 2] = x_velocity
+    states[num_steps, 3] = y_velocity
+    actions[num_steps] = action
+    probabilities[num_steps] = probability
+
+    # update velocity
+    x_velocity = min(max(x_velocity + ACTION_TO_ACCELERATION[action, 0], 0), 4)
+    y_velocity = min(max(y_velocity + ACTION_TO_ACCELERATION[action, 1], 0), 4)
+
+    if x_velocity == 0 and y_velocity == 0:
+      if env_numbers[env_used] < 0.5:
+        x_velocity = 1
+      else:
+        y_velocity = 1
+      env_used += 1
+
+    # move car
+    path_event = CLEAR
+
+    if swept_path:
+      path_event = path_events[x, y, x_velocity, y_velocity]
+
+    last_x, last_y = x, y
+    x -= x_velocity
+    y += y_velocity
+
+    if not strict:
+      if env_numbers[env_used] < random_displacement_probability:
+        if env_numbers[env_used + 1] < 0.5:
+          x -= 1
+        else:
+          y += 1
+        env_used += 2
+      else:
+        env_used += 1
+
+    if path_event == FINISH or (path_event == CLEAR and check_finish(racetrack, x, y)):
+      done = 1
+      reward = STEP_REWARD
+    else:
+
+      invalid_position = path_event == CRASH or check_invalid(racetrack, x, y)
+      reward = OUT_OF_BOUNDS_REWARD if invalid_position else STEP_REWARD
+
+      if strict:
+        done = 1 if invalid_position else 0
+      else:
+
+        if invalid_position:
+          # go back and move by at least one square, like Racetrack.correct_same_position
+          x, y = last_x - 1, last_y
+          x_velocity, y_velocity = 0, 0
+
+          if check_invalid(racetrack, x, y):
+            x, y = x + 1, y + 1
+
+        done = 1 if check_finish(racetrack, x, y) else 0
+
+    rewards[num_steps] = reward
+    num_steps += 1
+
+    if done:
+      lengths[num_finished] = num_steps - episode_start
+      num_finished += 1
+      episode_start = num_steps
+
+  car[0], car[1], car[2], car[3], car[4] = x, y, x_velocity, y_velocity, done
+
+  counters[ENV_USED] = env_used
+  counters[AGENT_USED] = agent_used
+  counters[NUM_STEPS] = num_steps
+  counters[NUM_FINISHED] = num_finished
+  counters[EPISODE_START] = episode_start
+
+
+def rollout(mc, num_episodes=1, explore=True, trajectory=None):
+  """
+  Play episodes in the environment of an agent with a compiled kernel (pure Python if numba is not installed).
+  The environment and the agent draw the same random numbers as when the episodes are played by
+  MonteCarlo.play_episode with env.reset() between them, so both give the same episodes under the same seeds.
+  The policy is not updated between the episodes. The environment is left in the last state of the last episode.
+  :param mc:              Monte Carlo agent, its environment is a Racetrack or a RacetrackStrict that is not
+                          compiled and not done.
+  :param num_episodes:    Number of episodes.
+  :param explore:         Play the epsilon-greedy policy instead of the greedy one.
+  :param trajectory:      Trajectory to write the steps into, a new one if None.
+  :return:                Trajectory with the steps of all episodes back to back and the episode lengths.
+  """
+
+  env = mc.env
+
+  assert env.transitions is None, "compiled environments draw different random numbers"
+  assert not env.done
+
+  compile_kernels()
+
+  if trajectory is None:
+    trajectory = Trajectory()
+
+  trajectory.clear()
+
+  strict = isinstance(env, environment.RacetrackStrict)
+  path_events = env.path_events if env.path_events is not None else NO_PATH_EVENTS
+  start_coordinates = np.array(env.start_coordinates, dtype=np.int64).reshape(-1, 2)
+
+  car = np.array(env.get_state() + (0,), dtype=np.int64)
+  lengths = np.zeros(num_episodes, dtype=np.int64)
+  counters = np.zeros(5, dtype=np.int64)
+
+  while counters[NUM_FINISHED] < num_episodes:
+
+    if counters[NUM_STEPS] == len(trajectory.actions):
+      trajectory.grow()
+
+    counters[ENV_USED] = 0
+    counters[AGENT_USED] = 0
+
+    rollout_kernel(env.racetrack, mc.policy, path_events, env.path_events is not None, strict,
+                   env.random_displacement_probability, mc.epsilon, explore, start_coordinates, num_episodes, car,
+                   env.random.reserve(ENV_NUMBERS_PER_STEP + 1), mc.random.reserve(AGENT_NUMBERS_PER_STEP),
+                   trajectory.states, trajectory.actions, trajectory.rewards, trajectory.probabilities, lengths,
+                   counters)
+
+    env.random.skip(int(counters[ENV_USED]))
+    mc.random.skip(int(counters[AGENT_USED]))
+    trajectory.length = int(counters[NUM_STEPS])
+
+  x, y, x_velocity, y_velocity, done = car.tolist()
+
+  env.position = (x, y)
+  env.velocity = (x_velocity, y_velocity)
+  env.done = bool(done)
+
+  return trajectory, lengths
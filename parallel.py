@@ -0,0 +1,587 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import time
+import numpy as np
+import agent, environment, shared, utils
+
+
+# agent of a worker process, created by init_worker
+worker_agent = None
+
+
+def make_env(racetrack, strict=False, random_displacement_probability=0.5, compiled=False, swept_path=False,
+             seed=None, start_coordinates=None):
+  """
+  Create an environment.
+  :param racetrack:                           Racetrack map.
+  :param strict:                              Create RacetrackStrict instead of Racetrack.
+  :param random_displacement_probability:     Probability of a random displacement in Racetrack.
+  :param compiled:                            Use a precomputed transition table.
+  :param swept_path:                          Check every cell the car passes through.
+  :param seed:                                Seed of the random number generator of the environment.
+  :param start_coordinates:                   Start positions of shape (num_starts, 2), found by scanning the map
+                                              if None.
+  :return:                                    Environment.
+  """
+
+  if strict:
+    return environment.RacetrackStrict(racetrack, compiled=compiled, swept_path=swept_path, seed=seed,
+                                       start_coordinates=start_coordinates)
+  else:
+    return environment.Racetrack(racetrack, random_displacement_probability=random_displacement_probability,
+                                 compiled=compiled, swept_path=swept_path, seed=seed,
+                                 start_coordinates=start_coordinates)
+
+
+def init_worker(racetrack, strict, random_displacement_probability, compiled, epsilon, swept_path=False, gamma=1.0,
+                start_coordinates=None):
+  """
+  Create the environment and the agent of a worker process.
+  :param racetrack:                           Racetrack map.
+  :param strict:                              Create RacetrackStrict instead of Racetrack.
+  :param random_displacement_probability:     Probability of a random displacement in Racetrack.
+  :param compiled:                            Use a precomputed transition table.
+  :param epsilon:                             Constant for an epsilon-greedy policy.
+  :param swept_path:                          Check every cell the car passes through.
+  :param gamma:                               Discount factor of the returns.
+  :param start_coordinates:                   Start positions of the parent's environment, so that the worker does
+                                              not scan the map.
+  :return:                                    None.
+  """
+
+  global worker_agent
+
+  env = make_env(racetrack, strict=strict, random_displacement_probability=random_displacement_probability,
+                 compiled=compiled, swept_path=swept_path, start_coordinates=start_coordinates)
+  # the worker only plays episodes, so its action values are never filled
+  worker_agent = agent.MonteCarlo(env, epsilon, storage_type="hash", gamma=gamma)
+
+
+def seed_agent(mc, seed_sequence):
+  """
+  Seed the random number generators of an agent and of its environment.
+  :param mc:                Monte Carlo agent.
+  :param seed_sequence:     NumPy seed sequence.
+  :return:                  None.
+  """
+
+  env_seed, agent_seed = seed_sequence.spawn(2)
+
+  mc.env.seed(env_seed)
+  mc.seed(agent_seed)
+
+
+def play_episodes(task):
+  """
+  Play episodes in a worker process without learning.
+  :param task:      Policy snapshot, number of episodes and a seed sequence.
+  :return:          Flat state-action indices and returns of each episode.
+  """
+
+  policy, num_episodes, seed_sequence = task
+
+  seed_agent(worker_agent, seed_sequence)
+  worker_agent.policy = policy
+
+  episodes = []
+
+  for _ in range(num_episodes):
+
+    worker_agent.env.reset()
+    _, trajectory = worker_agent.play_episode(learn=False)
+
+    indices = worker_agent.get_state_action_indices(trajectory).astype(np.int32)
+    returns = utils.compute_returns(trajectory.get_rewards(), gamma=worker_agent.gamma)
+
+    # undiscounted returns are integers
+    if worker_agent.gamma == 1.0:
+      returns = returns.astype(np.int32)
+
+    episodes.append((indices, returns))
+
+  return episodes
+
+
+class ParallelMonteCarlo:
+
+  def __init__(self, mc, num_workers, episodes_per_round=100, seed=None):
+    """
+    Train a Monte Carlo agent with episodes played in worker processes.
+    In each round, every worker plays episodes_per_round episodes with a snapshot of the current policy and sends
+    back the visited state-actions and their returns. The episodes are applied to the action values in a fixed
+    order with the same update as in MonteCarlo.play_episode, so the result depends only on the seed.
+    :param mc:                    Monte Carlo agent that holds the action values and the policy.
+    :param num_workers:           Number of worker processes.
+    :param episodes_per_round:    Number of episodes played by each worker between policy updates.
+    :param seed:                  Seed for the random number generators of the workers.
+    """
+
+    self.mc = mc
+    self.num_workers = num_workers
+    self.episodes_per_round = episodes_per_round
+    self.seed_sequences = np.random.SeedSequence(seed).spawn(num_workers)
+
+    env = mc.env
+    self.pool = multiprocessing.Pool(
+      num_workers, initializer=init_worker,
+      initargs=(env.racetrack, isinstance(env, environment.RacetrackStrict), env.random_displacement_probability,
+                env.transitions is not None, mc.epsilon, env.path_events is not None, mc.gamma, env.start_coordinates)
+    )
+
+    self.num_episodes = 0
+    self.num_steps = 0
+    self.train_time = 0.0
+
+  def train(self, num_episodes):
+    """
+    Play and learn from episodes.
+    :param num_episodes:    Number of episodes, rounded up to a multiple of num_workers * episodes_per_round.
+    :return:                Returns of the played episodes.
+    """
+
+    returns = []
+    start = time.time()
+
+    while len(returns) < num_episodes:
+
+      tasks = [(self.mc.policy, self.episodes_per_round, seed_sequence.spawn(1)[0])
+               for seed_sequence in self.seed_sequences]
+
+      for episodes in self.pool.map(play_episodes, tasks):
+        for indices, episode_returns in episodes:
+
+          self.mc.update(indices, episode_returns)
+          returns.append(episode_returns[0])
+          self.num_steps += len(indices)
+
+      self.mc.update_policy()
+
+    self.num_episodes += len(returns)
+    self.train_time += time.time() - start
+
+    return returns
+
+  def get_throughput(self):
+    """
+    Get the number of episodes and steps per second of training.
+    :return:      Episodes per second and steps per second.
+    """
+
+    if self.train_time == 0.0:
+      return 0.0, 0.0
+
+    return self.num_episodes / self.train_time, self.num_steps / self.train_time
+
+  def close(self):
+    """
+    Stop the worker processes.
+    :return:      None.
+    """
+
+    self.pool.close()
+    self.pool.join()
+
+
+def hogwild_worker(name, racetrack, strict, random_displacement_probability, compiled, epsilon, num_episodes,
+                   seed_sequence, swept_path=False, gamma=1.0, alpha=None, start_coordinates=None):
+  """
+  Play and learn from episodes in a worker process, updating shared tables in place.
+  :param name:                                Name of the shared tables.
+  :param racetrack:                           Racetrack map.
+  :param strict:                              Create RacetrackStrict instead of Racetrack.
+  :param random_displacement_probability:     Probability of a random displacement in Racetrack.
+  :param compiled:                            Use a precomputed transition table.
+  :param epsilon:                             Constant for an epsilon-greedy policy.
+  :param num_episodes:                        Number of episodes.
+  :param seed_sequence:                       NumPy seed sequence.
+  :param swept_path:                          Check every cell the car passes through.
+  :param gamma:                               Discount factor of the returns.
+  :param alpha:                               Constant step size, sample averages if None.
+  :param start_coordinates:                   Start positions of the parent's environment.
+  :return:                                    None.
+  """
+
+  env_seed, agent_seed = seed_sequence.spawn(2)
+
+  env = make_env(racetrack, strict=strict, random_displacement_probability=random_displacement_probability,
+                 compiled=compiled, swept_path=swept_path, seed=env_seed, start_coordinates=start_coordinates)
+  tables = shared.SharedTables(racetrack.shape, name=name)
+
+  try:
+    mc = agent.MonteCarlo(env, epsilon, tables=tables, seed=agent_seed, gamma=gamma, alpha=alpha)
+
+    for _ in range(num_episodes):
+      env.reset()
+      mc.play_episode()
+      mc.update_policy()
+  finally:
+    tables.close()
+
+
+class HogwildMonteCarlo:
+
+  def __init__(self, mc, num_workers, seed=None):
+    """
+    Train a Monte Carlo agent with worker processes that update shared tables without locks.
+    The agent's tables are copied into shared memory (see shared.SharedTables for the consistency model) and the
+    agent keeps using the shared tables afterwards.
+    :param mc:              Monte Carlo agent with the dense storage, the layout of the shared tables.
+    :param num_workers:     Number of worker processes.
+    :param seed:            Seed for the random number generators of the workers.
+    """
+
+    # the agent goes back to private dense tables when the trainer is closed
+    assert mc.storage_type == "dense", "the shared tables are dense"
+
+    self.mc = mc
+    self.num_workers = num_workers
+    self.seed_sequences = np.random.SeedSequence(seed).spawn(num_workers)
+
+    self.tables = shared.SharedTables(mc.env.racetrack.shape, init=mc.init)
+    self.tables.action_values[...] = mc.action_values
+    self.tables.action_counts[...] = mc.action_counts
+    self.tables.policy[...] = mc.policy
+
+    mc.tables = self.tables
+    mc.reset()
+
+    self.failed_workers = 0
+    self.num_episodes = 0
+    self.num_steps = 0
+    self.train_time = 0.0
+
+  def train(self, num_episodes):
+    """
+    Play and learn from episodes in the worker processes.
+    :param num_episodes:    Number of episodes, split evenly between the workers.
+    :return:                Number of workers that failed (their updates until the failure are kept).
+    """
+
+    env = self.mc.env
+    processes = []
+
+    start = time.time()
+    num_steps = np.sum(self.mc.action_counts, dtype=np.int64)
+
+    for worker_idx, seed_sequence in enumerate(self.seed_sequences):
+
+      worker_episodes = num_episodes // self.num_workers + int(worker_idx < num_episodes % self.num_workers)
+
+      process = multiprocessing.Process(
+        target=hogwild_worker,
+        args=(self.tables.name, env.racetrack, isinstance(env, environment.RacetrackStrict),
+              env.random_displacement_probability, env.transitions is not None, self.mc.epsilon, worker_episodes,
+              seed_sequence.spawn(1)[0], env.path_events is not None, self.mc.gamma, self.mc.alpha,
+              env.start_coordinates)
+      )
+      process.start()
+      processes.append(process)
+
+    failed_workers = 0
+
+    for process in processes:
+      process.join()
+      failed_workers += int(process.exitcode != 0)
+
+    self.failed_workers += failed_workers
+
+    # repair policy entries that raced with action value updates
+    self.mc.update_policy(full=True)
+
+    self.num_episodes += num_episodes
+    self.num_steps += int(np.sum(self.mc.action_counts, dtype=np.int64) - num_steps)
+    self.train_time += time.time() - start
+
+    return failed_workers
+
+  def get_throughput(self):
+    """
+    Get the number of episodes and steps per second of training.
+    Steps are counted from the action counts, so updates lost to races are not included.
+    :return:      Episodes per second and steps per second.
+    """
+
+    if self.train_time == 0.0:
+      return 0.0, 0.0
+
+    return self.num_episodes / self.train_time, self.num_steps / self.train_time
+
+  def close(self):
+    """
+    Copy the tables back into private memory of the agent and free the shared memory.
+    :return:      None.
+    """
+
+    action_values = self.mc.action_values.copy()
+    action_counts = self.mc.action_counts.copy()
+    policy = self.mc.policy.copy()
+
+    self.mc.tables = None
+    self.mc.reset()
+
+    self.mc.action_values[...] = action_values
+    self.mc.action_counts[...] = action_counts
+    self.mc.policy[...] = policy
+
+    self.tables.close()
+    self.tables.unlink()
+
+
+def actor_worker(policy_name, version, episode_queue, queue_depth, stop, racetrack, strict,
+                 random_displacement_probability, compiled, epsilon, episodes_per_batch, seed_sequence,
+                 swept_path=False, gamma=1.0, start_coordinates=None):
+  """
+  Play episodes in an actor process with the latest published policy and send them to the learner in batches.
+  The queue is bounded, so an actor waits while the learner is behind.
+  :param policy_name:                         Name of the shared memory block with the published policy.
+  :param version:                             Shared version of the published policy, its lock guards the policy.
+  :param episode_queue:                       Bounded queue of batches.
+  :param queue_depth:                         Shared number of batches in the queue (Queue.qsize does not work on
+                                              macOS).
+  :param stop:                                Event that stops the actor.
+  :param racetrack:                           Racetrack map.
+  :param strict:                              Create RacetrackStrict instead of Racetrack.
+  :param random_displacement_probability:     Probability of a random displacement in Racetrack.
+  :param compiled:                            Use a precomputed transition table.
+  :param epsilon:                             Constant for an epsilon-greedy policy.
+  :param episodes_per_batch:                  Number of episodes in a batch.
+  :param seed_sequence:                       NumPy seed sequence.
+  :param swept_path:                          Check every cell the car passes through.
+  :param gamma:                               Discount factor of the returns.
+  :param start_coordinates:                   Start positions of the parent's environment.
+  :return:                                    None.
+  """
+
+  env_seed, agent_seed = seed_sequence.spawn(2)
+
+  env = make_env(racetrack, strict=strict, random_displacement_probability=random_displacement_probability,
+                 compiled=compiled, swept_path=swept_path, seed=env_seed, start_coordinates=start_coordinates)
+  # the actor only plays episodes, so its action values are never filled
+  mc = agent.MonteCarlo(env, epsilon, storage_type="hash", seed=agent_seed, gamma=gamma)
+
+  memory = shared.attach_shared_memory(policy_name)
+  published = np.ndarray(mc.policy.shape, dtype=mc.policy.dtype, buffer=memory.buf)
+  policy_version = -1
+
+  try:
+    while not stop.is_set():
+
+      # copy the policy only when a new one was published
+      with version.get_lock():
+        if version.value != policy_version:
+          mc.policy[...] = published
+          policy_version = version.value
+
+      indices = []
+      returns = []
+
+      for _ in range(episodes_per_batch):
+        env.reset()
+        _, trajectory = mc.play_episode(learn=False)
+
+        indices.append(mc.get_state_action_indices(trajectory).astype(np.int32))
+        returns.append(utils.compute_returns(trajectory.get_rewards(), gamma=gamma))
+
+      batch = (policy_version, np.concatenate(indices), np.concatenate(returns),
+               np.array([len(episode) for episode in indices], dtype=np.int32))
+
+      # wait for space in the queue, but notice when the learner stops
+      while not stop.is_set():
+        try:
+          episode_queue.put(batch, timeout=0.1)
+
+          with queue_depth.get_lock():
+            queue_depth.value += 1
+
+          break
+        except queue.Full:
+          pass
+  finally:
+    # batches still buffered when the learner stops are dropped instead of blocking the exit of the actor
+    episode_queue.cancel_join_thread()
+    published = None
+    memory.close()
+
+
+class AsyncMonteCarlo:
+
+  def __init__(self, mc, num_workers, episodes_per_batch=10, max_queue_size=None, publish_frequency=1, seed=None):
+    """
+    Train a Monte Carlo agent with actor processes that play episodes while the learner updates the action values.
+    Actors play batches of episodes with a snapshot of the policy and put them into a bounded queue; an actor waits
+    when the queue is full, so the actors never run ahead of the learner by more than max_queue_size batches. The
+    learner (this process) takes batches from the queue, learns from a whole batch at once and publishes its greedy
+    policy to the actors every publish_frequency batches. Actors and learner run at the same time, so the results
+    depend on scheduling, unlike ParallelMonteCarlo.
+    The staleness of a batch is the number of policies the learner published after the one the batch was played with.
+    :param mc:                    Monte Carlo agent that holds the action values and the policy.
+    :param num_workers:           Number of actor processes.
+    :param episodes_per_batch:    Number of episodes an actor puts into the queue at once.
+    :param max_queue_size:        Maximum number of batches in the queue, 2 * num_workers if None.
+    :param publish_frequency:     Publish the policy after this many learned batches.
+    :param seed:                  Seed for the random number generators of the actors.
+    """
+
+    if max_queue_size is None:
+      max_queue_size = 2 * num_workers
+
+    self.mc = mc
+    self.num_workers = num_workers
+    self.episodes_per_batch = episodes_per_batch
+    self.max_queue_size = max_queue_size
+    self.publish_frequency = publish_frequency
+
+    self.memory = shared_memory.SharedMemory(create=True, size=mc.policy.nbytes)
+    self.published = np.ndarray(mc.policy.shape, dtype=mc.policy.dtype, buffer=self.memory.buf)
+    self.version = multiprocessing.Value("q", 0)
+    self.publish()
+
+    self.queue = multiprocessing.Queue(maxsize=max_queue_size)
+    self.queue_depth = multiprocessing.Value("i", 0)
+    self.stop = multiprocessing.Event()
+
+    env = mc.env
+    self.processes = []
+
+    for seed_sequence in np.random.SeedSequence(seed).spawn(num_workers):
+      process = multiprocessing.Process(
+        target=actor_worker,
+        args=(self.memory.name, self.version, self.queue, self.queue_depth, self.stop, env.racetrack,
+              isinstance(env, environment.RacetrackStrict), env.random_displacement_probability,
+              env.transitions is not None, mc.epsilon, episodes_per_batch, seed_sequence,
+              env.path_events is not None, mc.gamma, env.start_coordinates)
+      )
+      process.start()
+      self.processes.append(process)
+
+    self.num_episodes = 0
+    self.num_steps = 0
+    self.num_batches = 0
+    self.train_time = 0.0
+    self.wait_time = 0.0
+    self.staleness_sum = 0
+    self.max_staleness = 0
+    self.queue_depth_sum = 0
+
+  def publish(self):
+    """
+    Make the greedy policy of the agent the policy of the actors.
+    :return:      None.
+    """
+
+    with self.version.get_lock():
+      self.published[...] = self.mc.policy
+      self.version.value += 1
+
+  def get_batch(self, timeout=0.1):
+    """
+    Take a batch from the queue, waiting until an actor puts one.
+    :param timeout:     How often to check that the actors are still running, in seconds.
+    :return:            Policy version, flat state-action indices, returns and episode lengths.
+    """
+
+    while True:
+      try:
+        return self.queue.get(timeout=timeout)
+      except queue.Empty:
+        # actors only exit when stopped, an actor that exited during training failed
+        for process in self.processes:
+          if not process.is_alive():
+            raise RuntimeError("actor process {:d} exited with code {}".format(process.pid, process.exitcode))
+
+  def train(self, num_episodes):
+    """
+    Learn from episodes played by the actors.
+    :param num_episodes:    Number of episodes, rounded up to a multiple of episodes_per_batch.
+    :return:                Returns of the learned episodes.
+    """
+
+    returns = []
+    start = time.time()
+
+    while len(returns) < num_episodes:
+
+      wait_start = time.time()
+      policy_version, indices, episode_returns, lengths = self.get_batch()
+      self.wait_time += time.time() - wait_start
+
+      # queue depth after taking the batch: close to max_queue_size if the learner is the bottleneck, close to zero
+      # if the actors are. An actor counts its batch right after putting it, so the count can briefly be one short.
+      with self.queue_depth.get_lock():
+        self.queue_depth.value -= 1
+        self.queue_depth_sum += max(self.queue_depth.value, 0)
+
+      staleness = self.version.value - policy_version
+      self.staleness_sum += staleness
+      self.max_staleness = max(self.max_staleness, staleness)
+
+      if self.mc.alpha is None:
+        self.mc.update_batch(indices, episode_returns)
+      else:
+        # constant step size updates depend on the order of the episodes
+        for episode_indices, returns_of_episode in zip(np.split(indices, np.cumsum(lengths)[:-1]),
+                                                       np.split(episode_returns, np.cumsum(lengths)[:-1])):
+          self.mc.update(episode_indices, returns_of_episode)
+
+      self.mc.update_policy()
+
+      returns.extend(episode_returns[np.cumsum(lengths) - lengths].tolist())
+      self.num_steps += len(indices)
+      self.num_batches += 1
+
+      if self.num_batches % self.publish_frequency == 0:
+        self.publish()
+
+    self.num_episodes += len(returns)
+    self.train_time += time.time() - start
+
+    return returns
+
+  def get_throughput(self):
+    """
+    Get the number of episodes and steps per second of training.
+    :return:      Episodes per second and steps per second.
+    """
+
+    if self.train_time == 0.0:
+      return 0.0, 0.0
+
+    return self.num_episodes / self.train_time, self.num_steps / self.train_time
+
+  def get_metrics(self):
+    """
+    Get statistics of the pipeline.
+    :return:      Dictionary with the mean and maximum staleness of the learned batches, the mean queue depth and the
+                  fraction of the training time the learner waited for batches.
+    """
+
+    num_batches = max(self.num_batches, 1)
+
+    return {
+      "batches": self.num_batches,
+      "mean_staleness": self.staleness_sum / num_batches,
+      "max_staleness": self.max_staleness,
+      "mean_queue_depth": self.queue_depth_sum / num_batches,
+      "max_queue_size": self.max_queue_size,
+      "learner_wait_fraction": self.wait_time / self.train_time if self.train_time > 0 else 0.0
+    }
+
+  def close(self):
+    """
+    Stop the actors and free the shared memory. Batches left in the queue are dropped.
+    :return:      None.
+    """
+
+    self.stop.set()
+
+    # actors waiting for space in the queue notice the stop event within their put timeout
+    for process in self.processes:
+      process.join()
+
+    self.queue.close()
+    self.queue.join_thread()
+
+    self.published = None
+    self.memory.close()
+    self.memory.unlink()
@@ -83,4 +83,83 @@ TRACKS = {
     [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1, 1, 1]
   ], dtype=np.int32)
 
-}
\ No newline at end of file
+}
+
+def generate(size, width=None, seed=None):
+  """
+  Generate a square racetrack similar to the ones above: a band of track that goes up from the start line
+  at the bottom and turns right into the finish line at the top of the rightmost column.
+  Both edges of the band only shift right going up, by at most one square per row, so the finish can be reached
+  from every track square by moving one square up, up-right or right.
+  :param size:      Number of rows and columns.
+  :param width:     Minimal width of the band, size // 8 (at least 3) if None.
+  :param seed:      Random seed.
+  :return:          Racetrack map.
+  """
+
+  if width is None:
+    width = max(size // 8, 3)
+
+  assert 3 <= width and 2 * width < size
+
+  random_state = np.random.RandomState(seed)
+
+  # the turn to the finish line takes the top width rows, the band takes the rest
+  num_band_rows = size - width
+
+  # edges of the band from the bottom row up, the right edge is exclusive and drifts to the right side of the map
+  left_start = random_state.randint(0, size // 4)
+  right_start = left_start + random_state.randint(width, 2 * width)
+
+  left_probability = random_state.uniform(0, 1) * max(size - 2 * width - left_start, 0) / num_band_rows
+  right_probability = max(size - 1 - right_start, 0) / num_band_rows
+
+  left = left_start + np.cumsum(random_state.uniform(0, 1, size=num_band_rows) < left_probability)
+  right = right_start + np.cumsum(random_state.uniform(0, 1, size=num_band_rows) < right_probability)
+
+  right = np.minimum(np.maximum(right, left + width), size - 1)
+  left = np.minimum(left, right - width)
+
+  columns = np.arange(size)
+
+  track = np.full((size, size), constants.GRASS_VALUE, dtype=np.int32)
+  track[width:] = np.where((columns >= left[::-1, np.newaxis]) & (columns < right[::-1, np.newaxis]),
+                           constants.TRACK_VALUE, constants.GRASS_VALUE)
+  track[:width, left[-1]:] = constants.TRACK_VALUE
+
+  track[-1][track[-1] == constants.TRACK_VALUE] = constants.START_VALUE
+  track[:width, -1] = constants.END_VALUE
+
+  assert is_reachable(track)
+
+  return track
+
+
+def is_reachable(racetrack):
+  """
+  Check if the finish can be reached from every start cell by moving one square up, up-right or right.
+  A car can always follow such a path by keeping its velocity between (1, 0) and (1, 1) or at (0, 1).
+  :param racetrack:     Racetrack map.
+  :return:              True if reachable, otherwise False.
+  """
+
+  valid = racetrack != constants.GRASS_VALUE
+  columns = np.arange(racetrack.shape[1])
+
+  # squares that reach the finish, found backwards from the finish row by row starting at the top
+  reaching = np.zeros(racetrack.shape, dtype=np.bool_)
+  above = np.zeros(racetrack.shape[1], dtype=np.bool_)
+
+  for row in range(racetrack.shape[0]):
+
+    # leave the row up or up-right
+    seed = valid[row] & (above | np.concatenate([above[1:], [False]]) | (racetrack[row] == constants.END_VALUE))
+
+    # spread left within each run of valid squares
+    run_ids = np.cumsum(~valid[row])
+    next_seed = np.minimum.accumulate(np.where(seed, columns, len(columns))[::-1])[::-1]
+    above = valid[row] & (next_seed < len(columns)) & \
+        (run_ids[np.minimum(next_seed, len(columns) - 1)] == run_ids)
+    reaching[row] = above
+
+  return bool(np.all(reaching[racetrack == constants.START_VALUE]))
@@ -0,0 +1,226 @@
+import os
+import numpy as np
+import agent, utils
+from trajectory import Trajectory
+
+
+VERSION = 1
+MAGIC = b"RACELOG"
+
+NUM_ACTIONS = 9
+
+# every row of a log has 9 bytes, the last byte tells headers and steps apart
+ROW_SIZE = 9
+HEADER_FLAG = 255
+
+# flag 1 marks the greedy actions of epsilon-greedy behavior policies
+STEP_DTYPE = np.dtype([("x", "<i2"), ("y", "<i2"), ("x_velocity", "i1"), ("y_velocity", "i1"), ("action", "i1"),
+                       ("reward", "i1"), ("flag", "u1")])
+# an episode starts with two header rows
+LENGTH_DTYPE = np.dtype([("length", "<u4"), ("return", "<i4"), ("flag", "u1")])
+EPSILON_DTYPE = np.dtype([("epsilon", "<f8"), ("flag", "u1")])
+FILE_HEADER_DTYPE = np.dtype([("magic", "S7"), ("version", "u1"), ("flag", "u1")])
+
+HEADER_ROWS = 2
+
+
+class Recorder:
+
+  def __init__(self, path):
+    """
+    Append played episodes to a replay log.
+    A log is a sequence of 9-byte rows: a file header, then for each episode two header rows (length, return and
+    the epsilon of the behavior policy) followed by one row per step (x, y, x velocity, y velocity, action, reward and
+    whether the action was greedy). The same layout is read by ReplayLog through a memory map.
+    :param path:    Path to the log, new episodes are appended if it exists.
+    """
+
+    self.path = path
+
+    exists = os.path.isfile(path) and os.path.getsize(path) > 0
+
+    if exists:
+      # cut off a partially written last episode, so that it does not run into the new ones
+      log = ReplayLog(path)
+      end = ROW_SIZE * (1 + (log.starts[-1] + log.lengths[-1] if len(log) > 0 else 0))
+      del log
+      os.truncate(path, end)
+
+    self.file = open(path, "ab")
+
+    if not exists:
+      header = np.zeros(1, dtype=FILE_HEADER_DTYPE)
+      header["magic"] = MAGIC
+      header["version"] = VERSION
+      header["flag"] = HEADER_FLAG
+      self.file.write(header.tobytes())
+
+  def record(self, trajectory, epsilon):
+    """
+    Append an episode.
+    :param trajectory:    Trajectory of the episode, played by an epsilon-greedy policy.
+    :param epsilon:       Epsilon of the policy, 0 for a greedy policy.
+    :return:              None.
+    """
+
+    length = len(trajectory)
+    rewards = trajectory.get_rewards()
+
+    header = np.zeros(1, dtype=LENGTH_DTYPE)
+    header["length"] = length
+    header["return"] = np.sum(rewards)
+    header["flag"] = HEADER_FLAG
+
+    epsilon_header = np.zeros(1, dtype=EPSILON_DTYPE)
+    epsilon_header["epsilon"] = epsilon
+    epsilon_header["flag"] = HEADER_FLAG
+
+    steps = np.zeros(length, dtype=STEP_DTYPE)
+    states = trajectory.get_states()
+
+    for i, name in enumerate(["x", "y", "x_velocity", "y_velocity"]):
+      steps[name] = states[:, i]
+
+    steps["action"] = trajectory.get_actions()
+    steps["reward"] = rewards
+    # greedy actions have probability 1 - epsilon + epsilon / NUM_ACTIONS, the others epsilon / NUM_ACTIONS
+    greedy_probability = 1.0 - epsilon + epsilon / NUM_ACTIONS
+    steps["flag"] = np.isclose(trajectory.get_probabilities(), greedy_probability)
+
+    self.file.write(header.tobytes() + epsilon_header.tobytes() + steps.tobytes())
+
+  def flush(self):
+    """
+    Write buffered episodes to the file.
+    :return:    None.
+    """
+
+    self.file.flush()
+
+  def close(self):
+    """
+    Close the log.
+    :return:    None.
+    """
+
+    self.file.close()
+
+
+class ReplayLog:
+
+  def __init__(self, path):
+    """
+    Read a replay log written by Recorder through a memory map. An episode that was only partially written (e.g. when
+    the recording process was killed) is ignored.
+    :param path:    Path to the log.
+    """
+
+    self.path = path
+
+    header = np.fromfile(path, dtype=FILE_HEADER_DTYPE, count=1)
+    assert len(header) == 1 and header["magic"][0] == MAGIC and header["flag"][0] == HEADER_FLAG, \
+      "{:s} is not a replay log".format(path)
+    assert header["version"][0] == VERSION, "unsupported replay log version {:d}".format(header["version"][0])
+
+    num_rows = os.path.getsize(path) // ROW_SIZE - 1
+
+    if num_rows > 0:
+      self.rows = np.memmap(path, dtype=STEP_DTYPE, mode="r", offset=ROW_SIZE, shape=(num_rows,))
+    else:
+      self.rows = np.zeros(0, dtype=STEP_DTYPE)
+
+    # steps never have the header flag, so the first of each pair of flagged rows starts an episode
+    header_rows = np.flatnonzero(self.rows["flag"] == HEADER_FLAG)[::2]
+
+    headers = self.rows.view(np.uint8).reshape(-1, ROW_SIZE)
+    lengths = headers[header_rows].copy().view(LENGTH_DTYPE)["length"].reshape(-1).astype(np.int64)
+    starts = header_rows + HEADER_ROWS
+
+    # drop a partially written last episode
+    complete = starts + lengths <= num_rows
+
+    self.starts = starts[complete]
+    self.lengths = lengths[complete]
+    self.epsilons = headers[header_rows[complete] + 1].copy().view(EPSILON_DTYPE)["epsilon"].reshape(-1)
+
+  def __len__(self):
+
+    return len(self.starts)
+
+  def get_steps(self, start=0, stop=None):
+    """
+    Get the steps of a range of episodes.
+    :param start:     First episode.
+    :param stop:      Episode after the last one, all remaining episodes if None.
+    :return:          Structured array of steps and the episode lengths.
+    """
+
+    if stop is None or stop > len(self):
+      stop = len(self)
+
+    if start >= stop:
+      return np.zeros(0, dtype=STEP_DTYPE), np.zeros(0, dtype=np.int64)
+
+    rows = self.rows[self.starts[start]: self.starts[stop - 1] + self.lengths[stop - 1]]
+
+    return np.asarray(rows[rows["flag"] != HEADER_FLAG]), self.lengths[start: stop]
+
+  def get_trajectory(self, index):
+    """
+    Get an episode as a trajectory, with the probabilities of its actions under the behavior policy.
+    :param index:   Episode index.
+    :return:        Trajectory.
+    """
+
+    steps = np.asarray(self.rows[self.starts[index]: self.starts[index] + self.lengths[index]])
+    epsilon = float(self.epsilons[index])
+
+    trajectory = Trajectory(capacity=len(steps))
+    trajectory.states[:] = np.stack([steps["x"], steps["y"], steps["x_velocity"], steps["y_velocity"]], axis=1)
+    trajectory.actions[:] = steps["action"]
+    trajectory.rewards[:] = steps["reward"]
+    trajectory.probabilities[:] = epsilon / NUM_ACTIONS + (1.0 - epsilon) * (steps["flag"] == 1)
+    trajectory.length = len(steps)
+
+    return trajectory
+
+  def get_episode_returns(self):
+    """
+    Get the return of every episode, without reading the steps.
+    :return:    Array of shape (num_episodes,).
+    """
+
+    headers = self.rows.view(np.uint8).reshape(-1, ROW_SIZE)[self.starts - HEADER_ROWS]
+
+    return headers.copy().view(LENGTH_DTYPE)["return"].reshape(-1)
+
+
+def replay(log, mc, episodes_per_batch=10000):
+  """
+  Learn from all episodes in a replay log without simulating the environment.
+  On-policy agents with sample averages learn from whole batches of episodes at once, which gives the same action
+  values as learning from the episodes one by one (up to rounding). Off-policy agents and agents with a constant
+  step size learn from the episodes one by one. Returns are discounted by the agent's gamma.
+  :param log:                   Replay log.
+  :param mc:                    Monte Carlo agent.
+  :param episodes_per_batch:    Number of episodes read from the log at once.
+  :return:                      None.
+  """
+
+  if isinstance(mc, agent.OffPolicyMonteCarlo) or mc.alpha is not None:
+
+    for index in range(len(log)):
+      trajectory = log.get_trajectory(index)
+      mc.learn(trajectory, utils.compute_returns(trajectory.get_rewards(), gamma=mc.gamma))
+
+  else:
+
+    for start in range(0, len(log), episodes_per_batch):
+
+      steps, lengths = log.get_steps(start, start + episodes_per_batch)
+
+      indices = np.ravel_multi_index((steps["x"], steps["y"], steps["x_velocity"], steps["y_velocity"],
+                                      steps["action"]), mc.shape)
+      mc.update_batch(indices, utils.compute_episode_returns(steps["reward"], lengths, gamma=mc.gamma))
+
+  mc.update_policy()
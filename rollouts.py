@@ -0,0 +1,206 @@
+import numpy as np
+import agent, constants, evaluation, utils
+
+
+NUM_ACTIONS = agent.MonteCarlo.NUM_ACTIONS
+NUM_SPEEDS = agent.MonteCarlo.NUM_SPEEDS
+
+
+def run_rollouts(env, policy, epsilon=0.0, first_actions=None, max_steps=1000, random=None, visited=None):
+  """
+  Play all cars of a batch environment until they are done, following an (epsilon-)greedy policy.
+  :param env:             Batch environment without auto reset, all cars already reset.
+  :param policy:          Policy of shape (rows, cols, 5, 5).
+  :param epsilon:         Probability of a random action.
+  :param first_actions:   Actions of the first step, the policy selects them if None.
+  :param max_steps:       Stop unfinished rollouts after this many steps.
+  :param random:          utils.RandomStream for exploration, needed if epsilon > 0.
+  :param visited:         Optional list to append flat indices of the states visited in each step to.
+  :return:                Undiscounted return of each car.
+  """
+
+  rows, cols = env.racetrack.shape
+  returns = np.zeros(env.num_cars, dtype=np.int64)
+
+  for step in range(max_steps):
+
+    active = ~env.done
+
+    if not np.any(active):
+      break
+
+    # cars that are done do not move, their actions are ignored
+    states = env.get_states()
+    x_coordinates = np.clip(states[:, 0], 0, rows - 1)
+    y_coordinates = np.clip(states[:, 1], 0, cols - 1)
+
+    if step == 0 and first_actions is not None:
+      actions = first_actions
+    else:
+      actions = policy[x_coordinates, y_coordinates, states[:, 2], states[:, 3]]
+
+      if epsilon > 0:
+        explore = random.uniforms(env.num_cars) < epsilon
+        actions = np.where(explore, (random.uniforms(env.num_cars) * NUM_ACTIONS).astype(np.int64), actions)
+
+    if visited is not None:
+      visited.append(np.ravel_multi_index(tuple(states[active].T), (rows, cols, NUM_SPEEDS, NUM_SPEEDS)))
+
+    rewards, _ = env.act(agent.MonteCarlo.ACTION_TO_ACCELERATION[actions])
+    returns += rewards
+
+  return returns
+
+
+def get_visited_states(policy, racetrack, num_rollouts=10, epsilon=0.1, strict=False,
+                       random_displacement_probability=0.5, max_steps=1000, swept_path=False, seed=None,
+                       start_coordinates=None):
+  """
+  Find the states visited by epsilon-greedy rollouts of a policy from every start position.
+  :param policy:                              Policy of shape (rows, cols, 5, 5).
+  :param racetrack:                           Racetrack map.
+  :param num_rollouts:                        Number of rollouts from each start position.
+  :param epsilon:                             Probability of a random action.
+  :param strict:                              Use the strict version of the environment.
+  :param random_displacement_probability:     Probability of a random displacement in the original environment.
+  :param max_steps:                           Stop unfinished rollouts after this many steps.
+  :param swept_path:                          Check every cell the cars pass through.
+  :param seed:                                Seed of the environment and of the exploration.
+  :param start_coordinates:                   Start positions of shape (num_starts, 2) (e.g. env.start_coordinates),
+                                              found by scanning the map if None.
+  :return:                                    Visited states of shape (num_states, 4).
+  """
+
+  env_seed, explore_seed = utils.spawn_seeds(seed, 2)
+
+  if start_coordinates is None:
+    start_coordinates = np.argwhere(racetrack == constants.START_VALUE)
+
+  positions = evaluation.get_start_coordinates(racetrack, num_rollouts, start_coordinates=start_coordinates)
+
+  env = evaluation.make_batch_env(racetrack, len(positions), strict=strict,
+                                  random_displacement_probability=random_displacement_probability,
+                                  swept_path=swept_path, seed=env_seed, start_coordinates=start_coordinates)
+  env.reset(positions=positions)
+
+  visited = []
+  run_rollouts(env, policy, epsilon=epsilon, max_steps=max_steps, random=utils.RandomStream(explore_seed),
+               visited=visited)
+
+  indices = np.unique(np.concatenate(visited))
+
+  return np.stack(np.unravel_index(indices, racetrack.shape + (NUM_SPEEDS, NUM_SPEEDS)), axis=1)
+
+
+def get_all_states(racetrack):
+  """
+  Get every state of a car that is on the track and not at the finish.
+  :param racetrack:     Racetrack map.
+  :return:              States of shape (num_states, 4).
+  """
+
+  cells = np.argwhere((racetrack != constants.GRASS_VALUE) & (racetrack != constants.END_VALUE))
+  velocities = np.stack(np.unravel_index(np.arange(NUM_SPEEDS * NUM_SPEEDS), (NUM_SPEEDS, NUM_SPEEDS)), axis=1)
+
+  return np.concatenate([np.repeat(cells, len(velocities), axis=0), np.tile(velocities, (len(cells), 1))], axis=1)
+
+
+def estimate_action_values(policy, racetrack, states, num_rollouts=10, epsilon=0.0, strict=False,
+                           random_displacement_probability=0.5, max_steps=1000, swept_path=False, batch_size=65536,
+                           seed=None):
+  """
+  Estimate the action values of a policy for every action in a set of states with rollouts that take the action and
+  then follow the policy. The rollouts of all states and actions are played together in batches of cars.
+  :param policy:                              Policy of shape (rows, cols, 5, 5).
+  :param racetrack:                           Racetrack map.
+  :param states:                              States of shape (num_states, 4).
+  :param num_rollouts:                        Number of rollouts of each state-action.
+  :param epsilon:                             Probability of a random action after the first step.
+  :param strict:                              Use the strict version of the environment.
+  :param random_displacement_probability:     Probability of a random displacement in the original environment.
+  :param max_steps:                           Stop unfinished rollouts after this many steps, their returns are
+                                              cut off.
+  :param swept_path:                          Check every cell the cars pass through.
+  :param batch_size:                          Maximum number of cars played at once.
+  :param seed:                                Seed of the environment and of the exploration.
+  :return:                                    Action values of shape (num_states, 9).
+  """
+
+  states = np.asarray(states, dtype=np.int64)
+
+  # one car per state, action and rollout
+  car_states = np.repeat(states, NUM_ACTIONS * num_rollouts, axis=0)
+  car_actions = np.tile(np.repeat(np.arange(NUM_ACTIONS), num_rollouts), len(states))
+  num_cars = len(car_states)
+
+  env_seed, explore_seed = utils.spawn_seeds(seed, 2)
+
+  env = evaluation.make_batch_env(racetrack, min(batch_size, num_cars), strict=strict,
+                                  random_displacement_probability=random_displacement_probability,
+                                  swept_path=swept_path, seed=env_seed)
+  random = utils.RandomStream(explore_seed)
+
+  returns = np.zeros(num_cars, dtype=np.int64)
+
+  for start in range(0, num_cars, env.num_cars):
+
+    # the last batch is padded with the first cars, their returns are dropped
+    indices = np.arange(start, start + env.num_cars) % num_cars
+
+    env.reset(positions=car_states[indices, :2], velocities=car_states[indices, 2:])
+    batch_returns = run_rollouts(env, policy, epsilon=epsilon, first_actions=car_actions[indices],
+                                 max_steps=max_steps, random=random)
+
+    count = min(env.num_cars, num_cars - start)
+    returns[start: start + count] = batch_returns[:count]
+
+  return np.mean(returns.reshape(len(states), NUM_ACTIONS, num_rollouts), axis=-1)
+
+
+def improve_policy(policy, racetrack, states=None, num_rollouts=10, epsilon=0.1, strict=False,
+                   random_displacement_probability=0.5, max_steps=1000, swept_path=False, batch_size=65536,
+                   seed=None, start_coordinates=None):
+  """
+  Run one step of rollout policy iteration: estimate the action values of the greedy policy in a set of states and
+  make the policy greedy with respect to the estimates.
+  :param policy:                              Policy of shape (rows, cols, 5, 5), updated in place.
+  :param racetrack:                           Racetrack map.
+  :param states:                              States to improve, the states visited by the epsilon-greedy policy
+                                              from the start positions if None (see get_all_states for the rest).
+  :param num_rollouts:                        Number of rollouts from each start position and of each state-action.
+  :param epsilon:                             Probability of a random action when looking for visited states.
+  :param strict:                              Use the strict version of the environment.
+  :param random_displacement_probability:     Probability of a random displacement in the original environment.
+  :param max_steps:                           Stop unfinished rollouts after this many steps.
+  :param swept_path:                          Check every cell the cars pass through.
+  :param batch_size:                          Maximum number of cars played at once.
+  :param seed:                                Seed of the rollouts.
+  :param start_coordinates:                   Start positions of shape (num_starts, 2) to look for visited states
+                                              from, found by scanning the map if None.
+  :return:                                    Number of improved states and number of states whose action changed.
+  """
+
+  visit_seed, estimate_seed = utils.spawn_seeds(seed, 2)
+  settings = {
+    "num_rollouts": num_rollouts,
+    "strict": strict,
+    "random_displacement_probability": random_displacement_probability,
+    "max_steps": max_steps,
+    "swept_path": swept_path
+  }
+
+  if states is None:
+    states = get_visited_states(policy, racetrack, epsilon=epsilon, seed=visit_seed,
+                                start_coordinates=start_coordinates, **settings)
+
+  action_values = estimate_action_values(policy, racetrack, states, batch_size=batch_size, seed=estimate_seed,
+                                         **settings)
+
+  index = tuple(np.asarray(states).T)
+  actions = np.argmax(action_values, axis=-1)
+  num_changed = int(np.sum(policy[index] != actions))
+
+  # all improved actions are written at once
+  policy[index] = actions
+
+  return len(states), num_changed
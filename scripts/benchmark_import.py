@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules used by training workers, tests and headless jobs
+CORE_MODULES = ["agent", "checkpoint", "collisions", "curriculum", "environment", "evaluation", "kernels", "parallel",
+                "planner", "racetracks", "replay", "rollouts", "shared", "stats", "storage", "sweep", "trackfile",
+                "trajectory", "transitions", "utils"]
+# optional dependencies that are only needed for plots and the compiled rollout kernel
+HEAVY_MODULES = ["matplotlib", "numba"]
+
+BASELINE = "numpy"
+
+
+def measure_import(modules, repeats):
+  """
+  Measure the time of a fresh interpreter that imports modules.
+  :param modules:     List of module names.
+  :param repeats:     Number of measurements.
+  :return:            Median time in seconds and the heavy modules that were imported.
+  """
+
+  code = "import sys, time; start = time.perf_counter(); import {:s}; " \
+         "print(time.perf_counter() - start); print(','.join(sorted(m for m in {:s} if m in sys.modules)))" \
+         .format(", ".join(modules), repr(HEAVY_MODULES))
+
+  times = []
+  heavy = []
+
+  for _ in range(repeats):
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+    lines = output.stdout.splitlines()
+    times.append(float(lines[0]))
+    heavy = [name for name in lines[1].split(",") if name]
+
+  return float(np.median(times)), heavy
+
+
+def main(args):
+
+  baseline, _ = measure_import([BASELINE], args.repeats)
+  results = {"baseline_seconds": baseline, "modules": {}}
+  failed = False
+
+  for modules in [[module] for module in args.modules] + [args.modules]:
+
+    seconds, heavy = measure_import(modules, args.repeats)
+    results["modules"][", ".join(modules)] = {"seconds": seconds, "heavy_modules": heavy}
+
+    if len(heavy) > 0 or (args.max_seconds is not None and seconds - baseline > args.max_seconds):
+      failed = True
+
+    print("{:s}: {:.1f} ms ({:.1f} ms after {:s}){:s}".format(
+      ", ".join(modules), 1000 * seconds, 1000 * (seconds - baseline), BASELINE,
+      ", imports " + ", ".join(heavy) if len(heavy) > 0 else ""), file=sys.stderr)
+
+  json.dump(results, sys.stdout, indent=2)
+  print()
+
+  if failed:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Measure the import time of the core modules and check that they do not import "
+                                   "matplotlib or numba.")
+
+  parser.add_argument("--modules", nargs="+", default=CORE_MODULES, help="modules to import")
+  parser.add_argument("--repeats", type=int, default=5, help="number of measurements of each import")
+  parser.add_argument("--max-seconds", type=float,
+                      help="fail if importing a module takes longer than this on top of importing numpy")
+
+  parsed = parser.parse_args()
+  main(parsed)
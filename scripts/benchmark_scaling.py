@@ -0,0 +1,171 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import agent, environment, evaluation, racetracks, storage
+
+
+ENVIRONMENTS = {
+  "racetrack": environment.Racetrack,
+  "racetrack_strict": environment.RacetrackStrict
+}
+
+
+def measure_steps(env, num_steps, seed=None):
+  """
+  Measure how many steps per second the environment takes with random actions.
+  :param env:           Environment.
+  :param num_steps:     Number of steps.
+  :param seed:          Seed of the random actions.
+  :return:              Steps per second.
+  """
+
+  accelerations = np.random.default_rng(seed).integers(-1, 2, size=(num_steps, 2)).tolist()
+
+  env.reset()
+  start = time.time()
+
+  for x_change, y_change in accelerations:
+
+    env.act(x_change, y_change)
+
+    if env.done:
+      env.reset()
+
+  return num_steps / (time.time() - start)
+
+
+def measure_training(mc, strict, time_budget, target_return, evaluation_frequency, evaluation_episodes):
+  """
+  Train the agent until the greedy policy reaches the target return or the time budget runs out.
+  :param mc:                      Monte Carlo agent.
+  :param strict:                  The agent acts in the strict version of the environment.
+  :param time_budget:             Maximum training time in seconds.
+  :param target_return:           Target mean return of the greedy policy.
+  :param evaluation_frequency:    Number of episodes between evaluations.
+  :param evaluation_episodes:     Number of evaluation episodes.
+  :return:                        Dictionary of statistics.
+  """
+
+  racetrack = mc.env.racetrack
+  num_rollouts = evaluation.get_num_rollouts(racetrack, evaluation_episodes)
+
+  num_episodes = 0
+  num_steps = 0
+  training_time = 0.0
+  time_to_target = None
+  mean_return = None
+
+  while training_time < time_budget:
+
+    start = time.time()
+
+    for _ in range(evaluation_frequency):
+      _, trajectory = mc.play_episode()
+      mc.update_policy()
+      mc.env.reset()
+      num_steps += len(trajectory)
+
+    training_time += time.time() - start
+    num_episodes += evaluation_frequency
+
+    # evaluation time does not count towards the training time
+    mean_return = evaluation.evaluate(mc.policy, racetrack, num_rollouts=num_rollouts, strict=strict,
+                                      max_steps=racetrack.size)["mean_return"]
+
+    if mean_return >= target_return:
+      time_to_target = training_time
+      break
+
+  return {
+    "episodes_per_second": num_episodes / training_time,
+    "training_steps_per_second": num_steps / training_time,
+    "training_episodes": num_episodes,
+    "final_mean_return": mean_return,
+    "target_return": target_return,
+    "time_to_target": time_to_target,
+    "qtable_bytes": int(mc.storage.get_nbytes()),
+    "policy_bytes": int(mc.policy.nbytes)
+  }
+
+
+def main(args):
+
+  results = []
+
+  for size in args.sizes:
+
+    start = time.time()
+    track = racetracks.generate(size, seed=args.seed)
+    generate_time = time.time() - start
+
+    for env_name in args.environments:
+
+      env_seed, agent_seed = np.random.SeedSequence(args.seed).spawn(2)
+
+      env = ENVIRONMENTS[env_name](track, seed=env_seed)
+      mc = agent.MonteCarlo(env, args.epsilon, storage_type=args.storage, seed=agent_seed)
+
+      if args.target_return is None:
+        target_return = -float(size)
+      else:
+        target_return = args.target_return
+
+      result = {
+        "size": size,
+        "environment": env_name,
+        "storage": args.storage,
+        "generate_seconds": generate_time,
+        "env_steps_per_second": measure_steps(env, args.steps, seed=args.seed)
+      }
+      result.update(measure_training(mc, env_name == "racetrack_strict", args.time_budget, target_return,
+                                     args.evaluation_frequency, args.evaluation_episodes))
+
+      print("{:d}x{:d} {:s}: {:.0f} steps/s, {:.1f} episodes/s, {:.1f} MB".format(
+        size, size, env_name, result["env_steps_per_second"], result["episodes_per_second"],
+        result["qtable_bytes"] / 2 ** 20), file=sys.stderr)
+
+      results.append(result)
+
+  report = {
+    "python": platform.python_version(),
+    "numpy": np.__version__,
+    "machine": platform.machine(),
+    "seed": args.seed,
+    "epsilon": args.epsilon,
+    "results": results
+  }
+
+  if args.output is not None:
+    with open(args.output, "w") as file:
+      json.dump(report, file, indent=2)
+  else:
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Measure how the environments and the agent scale with the size of the racetrack.")
+
+  parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128, 256],
+                      help="number of rows and columns of the generated racetracks")
+  parser.add_argument("--environments", nargs="+", choices=list(ENVIRONMENTS.keys()),
+                      default=list(ENVIRONMENTS.keys()), help="environments to measure")
+  parser.add_argument("--storage", choices=list(storage.STORAGES.keys()), default="hash",
+                      help="action value storage of the agent")
+  parser.add_argument("--steps", type=int, default=100000, help="number of random steps to measure env speed")
+  parser.add_argument("--time-budget", type=float, default=60, help="maximum training time in seconds for each run")
+  parser.add_argument("--target-return", type=float,
+                      help="mean return of the greedy policy to reach, minus the track size if not set")
+  parser.add_argument("--evaluation-frequency", type=int, default=1000,
+                      help="number of training episodes between evaluations")
+  parser.add_argument("--evaluation-episodes", type=int, default=100, help="number of evaluation episodes")
+  parser.add_argument("--epsilon", type=float, default=0.1, help="exploration constant")
+  parser.add_argument("--seed", type=int, default=0, help="random seed")
+  parser.add_argument("-o", "--output", help="where to save the JSON report, printed if not set")
+
+  parsed = parser.parse_args()
+  main(parsed)
@@ -0,0 +1,46 @@
+import argparse
+import time
+import numpy as np
+import agent, constants, environment, racetracks, storage
+
+
+def main(args):
+
+  # validate input
+  assert args.racetrack in racetracks.TRACKS.keys()
+
+  for scale in args.scales:
+
+    # scale the racetrack up by repeating each cell
+    track = np.kron(racetracks.TRACKS[args.racetrack], np.ones((scale, scale), dtype=np.int32))
+
+    for storage_type in storage.STORAGES.keys():
+
+      env = environment.Racetrack(track)
+      mc = agent.MonteCarlo(env, args.epsilon, storage_type=storage_type)
+
+      start = time.time()
+
+      for _ in range(args.episodes):
+        mc.play_episode()
+        mc.update_policy()
+        env.reset()
+
+      print("{:s} {:d}x{:d} {:s}: {:.1f} MB, {:.2f} s".format(
+        args.racetrack, track.shape[0], track.shape[1], storage_type, mc.storage.get_nbytes() / 2 ** 20,
+        time.time() - start))
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Compare memory used by action value storages.")
+
+  parser.add_argument("racetrack", help="{}, {} or {}".format(constants.RACETRACK_1, constants.RACETRACK_2,
+                                                              constants.RACETRACK_3))
+  parser.add_argument("-s", "--scales", type=int, nargs="+", default=[1, 4, 16],
+                      help="how many times to scale the track")
+  parser.add_argument("-e", "--episodes", type=int, default=1000, help="number of training episodes")
+  parser.add_argument("--epsilon", type=float, default=0.1, help="exploration constant")
+
+  parsed = parser.parse_args()
+  main(parsed)
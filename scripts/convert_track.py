@@ -0,0 +1,36 @@
+import argparse
+import time
+import constants, racetracks, trackfile
+
+
+def main(args):
+
+  # validate input
+  assert (args.source is None) != (args.generate is None), "give either a source track or --generate"
+
+  start = time.time()
+
+  if args.generate is not None:
+    track = trackfile.Track(racetracks.generate(args.generate, seed=args.seed))
+  else:
+    track = trackfile.get(args.source, mmap_mode=None)
+
+  trackfile.save(track, args.destination)
+
+  print("{:d}x{:d} track with {:d} start cells saved to {:s} in {:.2f} s".format(
+    track.shape[0], track.shape[1], len(track.start_coordinates), args.destination, time.time() - start))
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Convert a track between the text and the binary track formats.")
+
+  parser.add_argument("destination", help="a .txt or .txt.gz file for the text format, a directory for the binary "
+                                          "format")
+  parser.add_argument("source", nargs="?", help="{}, {}, {} or a track file".format(
+    constants.RACETRACK_1, constants.RACETRACK_2, constants.RACETRACK_3))
+  parser.add_argument("--generate", type=int, help="generate a random track of this size instead")
+  parser.add_argument("--seed", type=int, help="seed of the generated track")
+
+  parsed = parser.parse_args()
+  main(parsed)
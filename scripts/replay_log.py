@@ -0,0 +1,49 @@
+import argparse
+import numpy as np
+import agent, constants, environment, evaluation, replay, trackfile
+
+
+def main(args):
+
+  track_file = trackfile.get(args.racetrack)
+  track = track_file.racetrack
+  log = replay.ReplayLog(args.log)
+
+  returns = log.get_episode_returns()
+  print("{:d} episodes, {:d} steps, mean return {:.2f}".format(len(log), int(np.sum(log.lengths)), np.mean(returns)))
+
+  # the environment is only used for the shape of the tables, it is never stepped
+  if args.strict:
+    env = environment.RacetrackStrict(track, start_coordinates=track_file.start_coordinates)
+  else:
+    env = environment.Racetrack(track, start_coordinates=track_file.start_coordinates)
+
+  if args.off_policy:
+    mc = agent.OffPolicyMonteCarlo(env, 0.0, storage_type=args.storage)
+  else:
+    mc = agent.MonteCarlo(env, 0.0, storage_type=args.storage)
+
+  replay.replay(log, mc)
+
+  num_rollouts = evaluation.get_num_rollouts(track, args.episodes, start_coordinates=track_file.start_coordinates)
+  results = evaluation.evaluate(mc.policy, track, num_rollouts=num_rollouts, strict=args.strict,
+                                start_coordinates=track_file.start_coordinates)
+  print("greedy policy: {:s}".format(evaluation.format_results(results)))
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Learn from the episodes in a replay log and evaluate the greedy policy.")
+
+  parser.add_argument("racetrack", help="{}, {}, {} or a track file (see trackfile.py)".format(
+    constants.RACETRACK_1, constants.RACETRACK_2, constants.RACETRACK_3))
+  parser.add_argument("log", help="replay log written with solve_racetrack --record")
+
+  parser.add_argument("--strict", default=False, action="store_true", help="evaluate in the strict environment")
+  parser.add_argument("--off-policy", default=False, action="store_true",
+                      help="learn the greedy policy with weighted importance sampling")
+  parser.add_argument("--storage", default="dense", help="action value storage: dense, masked or hash")
+  parser.add_argument("-e", "--episodes", type=int, default=100, help="number of evaluation episodes")
+
+  parsed = parser.parse_args()
+  main(parsed)
@@ -1,16 +1,13 @@
 import argparse
-import constants, environment, racetracks
+import constants, environment, trackfile
 
 
 def main(args):
 
-  # validate input
-  assert args.racetrack in racetracks.TRACKS.keys()
-
   # show racetrack
-  track = racetracks.TRACKS[args.racetrack]
+  track = trackfile.get(args.racetrack)
 
-  env = environment.Racetrack(track)
+  env = environment.Racetrack(track.racetrack, start_coordinates=track.start_coordinates)
   env.show_racetrack(save_path=args.save_path, show_legend=not args.disable_legend)
 
 
@@ -18,8 +15,8 @@ if __name__ == "__main__":
 
   parser = argparse.ArgumentParser("Show racetrack.")
 
-  parser.add_argument("racetrack", help="{}, {} or {}".format(constants.RACETRACK_1, constants.RACETRACK_2,
-                                                              constants.RACETRACK_3))
+  parser.add_argument("racetrack", help="{}, {}, {} or a track file (see trackfile.py)".format(
+    constants.RACETRACK_1, constants.RACETRACK_2, constants.RACETRACK_3))
   parser.add_argument("-s", "--save-path", help="where to save the figure")
   parser.add_argument("--disable-legend", default=False, action="store_true",
                       help="disable legend in the racetrack image")
@@ -1,54 +1,342 @@
 import argparse
+import cProfile
 import numpy as np
-import agent, constants, environment, racetracks
+import agent, checkpoint, constants, curriculum, environment, evaluation, parallel, planner, replay
+import rollouts, stats, trackfile, utils, visualization
 
 
 TRAINING_EPISODES = 100000
 EVALUATION_EPISODES = 100
 EVALUATION_FREQUENCY = 10000
 
+VALUE_ITERATION = "value-iteration"
+PRIORITIZED_SWEEPING = "prioritized-sweeping"
+ROLLOUT_POLICY_ITERATION = "rollout-policy-iteration"
+
+
+def evaluate(mc, episode_idx, evaluator=None, start_coordinates=None, seed=None):
+  """
+  Evaluate the agent without exploration and print the results.
+  :param mc:                  Monte Carlo agent.
+  :param episode_idx:         Number of training episodes.
+  :param evaluator:           Evaluate asynchronously with this evaluator, results are printed when ready.
+  :param start_coordinates:   Start positions of the evaluation episodes, the start positions of the agent's
+                              environment if None.
+  :param seed:                Seed of the evaluation episodes, the evaluator seeds its own evaluations.
+  :return:                    None.
+  """
+
+  if evaluator is not None:
+    evaluator.submit(mc.policy, episode_idx)
+    print_evaluations(evaluator)
+    return
+
+  print("after {:d} episodes: {:s}".format(episode_idx, evaluation.format_results(
+    evaluate_policy(mc, start_coordinates=start_coordinates, seed=seed))))
+
+
+def evaluate_policy(mc, start_coordinates=None, seed=None):
+  """
+  Evaluate the greedy policy of the agent in a batch environment like its own.
+  :param mc:                  Monte Carlo agent.
+  :param start_coordinates:   Start positions of the evaluation episodes, the start positions of the agent's
+                              environment if None.
+  :param seed:                Seed of the evaluation episodes, random if None.
+  :return:                    Dictionary of statistics.
+  """
+
+  env = mc.env
+
+  if start_coordinates is None:
+    start_coordinates = env.start_coordinates
+
+  num_rollouts = evaluation.get_num_rollouts(env.racetrack, EVALUATION_EPISODES, start_coordinates=start_coordinates)
+
+  return evaluation.evaluate(
+    mc.policy, env.racetrack, num_rollouts=num_rollouts, strict=isinstance(env, environment.RacetrackStrict),
+    random_displacement_probability=env.random_displacement_probability, swept_path=env.path_events is not None,
+    seed=seed, start_coordinates=start_coordinates
+  )
+
+
+def print_evaluations(evaluator, wait=False):
+  """
+  Print results of finished asynchronous evaluations.
+  :param evaluator:     Asynchronous evaluator.
+  :param wait:          Wait for all pending evaluations.
+  :return:              None.
+  """
+
+  for episode_idx, results in evaluator.get_results(wait=wait):
+    print("after {:d} episodes: {:s}".format(episode_idx, evaluation.format_results(results)))
+
+
+def improve_with_rollouts(mc, iterations, all_states=False, seed=None, evaluation_seed=None):
+  """
+  Improve the policy of the agent with rollout policy iteration and evaluate it after each iteration.
+  :param mc:              Monte Carlo agent.
+  :param iterations:      Maximum number of iterations, stops earlier when the policy does not change.
+  :param all_states:      Improve all states on the track instead of the states visited from the start.
+  :param seed:            Seed of the rollouts.
+  :param evaluation_seed: Seed of the evaluations, each one gets its own stream.
+  :return:                None.
+  """
+
+  env = mc.env
+  states = rollouts.get_all_states(env.racetrack) if all_states else None
+  seeds = utils.spawn_seeds(seed, iterations)
+  evaluation_seeds = utils.spawn_seeds(evaluation_seed, iterations)
+
+  for iteration in range(iterations):
+
+    num_states, num_changed = rollouts.improve_policy(
+      mc.policy, env.racetrack, states=states, strict=isinstance(env, environment.RacetrackStrict),
+      random_displacement_probability=env.random_displacement_probability, max_steps=env.racetrack.size,
+      swept_path=env.path_events is not None, seed=seeds[iteration], start_coordinates=env.start_coordinates
+    )
+
+    print("iteration {:d}, {:d} of {:d} actions changed: {:s}".format(
+      iteration + 1, num_changed, num_states, evaluation.format_results(
+        evaluate_policy(mc, seed=evaluation_seeds[iteration]))))
+
+    if num_changed == 0:
+      break
+
+
+def train(mc, training_episodes, start_episode=0, checkpoint_dir=None, checkpoint_frequency=EVALUATION_FREQUENCY,
+          evaluator=None, run_stats=None, stats_file=None, stats_frequency=EVALUATION_FREQUENCY, curriculum=None,
+          evaluation_seed=None):
+  """
+  Train the agent in this process.
+  :param mc:                      Monte Carlo agent.
+  :param training_episodes:       Number of training episodes.
+  :param start_episode:           Number of episodes finished before (when resuming).
+  :param checkpoint_dir:          Where to save checkpoints, no checkpoints are saved if None.
+  :param checkpoint_frequency:    Save a checkpoint after this many episodes.
+  :param evaluator:               Optional asynchronous evaluator.
+  :param run_stats:               Optional stats.Stats that time the phases of training.
+  :param stats_file:              Where to write the stats as JSON lines.
+  :param stats_frequency:         Write the stats after this many episodes.
+  :param curriculum:              Optional curriculum.Curriculum that selects the start positions.
+  :param evaluation_seed:         Seed of the evaluations, each one gets its own stream.
+  :return:                        None.
+  """
+
+  evaluation_seed = utils.spawn_seeds(evaluation_seed, 1)[0]
+
+  for episode_idx in range(start_episode, training_episodes):
+
+    # play episode
+    if run_stats is None:
+      mc.play_episode()
+      mc.update_policy()
+    else:
+      stats.play_episode(mc, run_stats)
+
+    # maybe save checkpoint, before the reset so that a resumed run draws the same start position
+    if checkpoint_dir is not None and (episode_idx + 1) % checkpoint_frequency == 0:
+      with stats.timer(run_stats, stats.CHECKPOINT):
+        checkpoint.save(mc, episode_idx + 1, checkpoint_dir)
+
+    if curriculum is not None and curriculum.add_episode(mc.trajectory):
+      print("curriculum level {:d} after {:d} episodes: {:d} start positions".format(
+        curriculum.level, episode_idx + 1, len(mc.env.start_coordinates)))
+
+    mc.env.reset()
+
+    # maybe evaluate without exploration
+    if episode_idx > 0 and episode_idx % EVALUATION_FREQUENCY == 0:
+      with stats.timer(run_stats, stats.EVALUATION):
+        # the curriculum moves the start positions of the environment, the agent is evaluated on the start line
+        evaluate(mc, episode_idx, evaluator=evaluator,
+                 start_coordinates=None if curriculum is None else curriculum.start_coordinates,
+                 seed=evaluation_seed.spawn(1)[0])
+
+    if stats_file is not None and (episode_idx + 1) % stats_frequency == 0:
+      run_stats.write(stats_file, episode=episode_idx + 1)
+
+
+def train_parallel(mc, training_episodes, workers, hogwild=False, actor_learner=False, start_episode=0,
+                   checkpoint_dir=None, evaluator=None, seed=None, evaluation_seed=None):
+  """
+  Train the agent with episodes played in worker processes.
+  :param mc:                    Monte Carlo agent.
+  :param training_episodes:     Number of training episodes.
+  :param workers:               Number of worker processes.
+  :param hogwild:               Workers update tables in shared memory without locks.
+  :param actor_learner:         Workers play episodes while this process learns from them.
+  :param start_episode:         Number of episodes finished before (when resuming).
+  :param checkpoint_dir:        Where to save a checkpoint after each evaluation, no checkpoints are saved if None.
+  :param evaluator:             Optional asynchronous evaluator.
+  :param seed:                  Seed for the random number generators of the workers.
+  :param evaluation_seed:       Seed of the evaluations, each one gets its own stream.
+  :return:                      None.
+  """
+
+  evaluation_seed = utils.spawn_seeds(evaluation_seed, 1)[0]
+
+  if hogwild:
+    trainer = parallel.HogwildMonteCarlo(mc, workers, seed=seed)
+  elif actor_learner:
+    trainer = parallel.AsyncMonteCarlo(mc, workers, seed=seed)
+  else:
+    trainer = parallel.ParallelMonteCarlo(mc, workers, seed=seed)
+
+  for episode_idx in range(start_episode + EVALUATION_FREQUENCY, training_episodes + 1, EVALUATION_FREQUENCY):
+
+    trainer.train(EVALUATION_FREQUENCY)
+
+    if checkpoint_dir is not None:
+      checkpoint.save(mc, episode_idx, checkpoint_dir)
+
+    episodes_per_second, steps_per_second = trainer.get_throughput()
+    print("{:.0f} episodes/s, {:.0f} steps/s with {:d} workers".format(episodes_per_second, steps_per_second, workers))
+
+    if actor_learner:
+      metrics = trainer.get_metrics()
+      print("staleness {:.1f} (max {:d}) policies, queue depth {:.1f} of {:d} batches, learner waited {:.0%}".format(
+        metrics["mean_staleness"], metrics["max_staleness"], metrics["mean_queue_depth"], metrics["max_queue_size"],
+        metrics["learner_wait_fraction"]))
+
+    evaluate(mc, episode_idx, evaluator=evaluator, seed=evaluation_seed.spawn(1)[0])
+
+  trainer.close()
+
+
 def main(args):
 
   # validate input
-  assert args.racetrack in racetracks.TRACKS.keys()
+  # workers send returns for on-policy updates
+  assert not args.off_policy or args.workers == 1
+  assert not args.resume or args.checkpoint_dir is not None, "--resume needs --checkpoint-dir"
+  # only episodes played in this process are recorded
+  assert args.record is None or args.workers == 1
+  # the rollout kernel steps the environment itself, it does not use the transition table
+  assert not args.jit or (args.workers == 1 and not args.compiled)
+  # stats are collected from the episodes played in this process
+  assert args.stats is None or args.workers == 1
+  # the curriculum moves the start positions of this process only
+  assert not args.curriculum or args.workers == 1
+  assert not (args.hogwild and args.actor_learner)
+  # the off-policy agent weights returns by importance sampling, not by a step size
+  assert not args.off_policy or args.alpha is None
+
+  # the environment, the agent, the evaluations and the rollouts of rollout policy iteration have separate random
+  # number generators (the first two seeds are the same as in sweep.play_run)
+  env_seed, agent_seed, evaluation_seed, rollout_seed = np.random.SeedSequence(args.seed).spawn(4)
 
   # create environment
-  track = racetracks.TRACKS[args.racetrack]
+  track_file = trackfile.get(args.racetrack)
+  track = track_file.racetrack
   if args.strict:
-    env = environment.RacetrackStrict(track)
+    env = environment.RacetrackStrict(track, compiled=args.compiled, swept_path=args.swept_path, seed=env_seed,
+                                      start_coordinates=track_file.start_coordinates)
   else:
-    env = environment.Racetrack(track)
+    env = environment.Racetrack(track, compiled=args.compiled, swept_path=args.swept_path, seed=env_seed,
+                                start_coordinates=track_file.start_coordinates)
 
   # create agent
-  mc = agent.MonteCarlo(env, 0.1)
+  start_episode = 0
 
-  print("training for {:d} episodes".format(TRAINING_EPISODES))
-  for episode_idx in range(TRAINING_EPISODES):
+  if args.resume and checkpoint.exists(args.checkpoint_dir):
+    # copy-on-write memory maps load instantly and leave the checkpoint files unchanged
+    loaded = checkpoint.Checkpoint(args.checkpoint_dir, mmap_mode="c")
 
-    # play episode
-    mc.play_episode()
-    mc.update_policy()
+    if agent.OffPolicyMonteCarlo.WEIGHTS in loaded.tables:
+      mc = agent.OffPolicyMonteCarlo(env, loaded.state["epsilon"], init=loaded.state["init"], tables=loaded,
+                                     gamma=loaded.state.get("gamma", 1.0))
+    else:
+      mc = agent.MonteCarlo(env, loaded.state["epsilon"], init=loaded.state["init"], tables=loaded,
+                            gamma=loaded.state.get("gamma", 1.0), alpha=loaded.state.get("alpha"))
 
+    loaded.restore_random_state(mc)
     env.reset()
 
-    # maybe evaluate without exploration
-    if episode_idx > 0 and episode_idx % EVALUATION_FREQUENCY == 0:
+    start_episode = loaded.episode_idx
+    print("resuming from {:s} after {:d} episodes".format(loaded.path, start_episode))
+  elif args.off_policy:
+    mc = agent.OffPolicyMonteCarlo(env, args.epsilon, seed=agent_seed, gamma=args.gamma)
+  else:
+    mc = agent.MonteCarlo(env, args.epsilon, seed=agent_seed, gamma=args.gamma, alpha=args.alpha)
 
-      returns = []
+  if args.record is not None:
+    mc.recorder = replay.Recorder(args.record)
 
-      for _ in range(EVALUATION_EPISODES):
+  mc.jit = args.jit
 
-        ret, _ = mc.play_episode(explore=False, learn=False)
-        returns.append(ret)
+  if args.planner == ROLLOUT_POLICY_ITERATION:
+    print("solving with {:s}".format(args.planner))
+    improve_with_rollouts(mc, args.rollout_iterations, all_states=args.rollout_all_states, seed=rollout_seed,
+                          evaluation_seed=evaluation_seed)
+    training_episodes = 0
+  elif args.planner is not None:
+    print("solving with {:s}".format(args.planner))
+    solved = planner.solve(env, prioritized=args.planner == PRIORITIZED_SWEEPING)
+    mc.policy[...] = solved.policy
+    training_episodes = 0
+  else:
+    print("training for {:d} episodes".format(TRAINING_EPISODES))
+    training_episodes = TRAINING_EPISODES
 
-        env.reset()
+  evaluator = None
 
-      mean_return = np.mean(returns)
-      print("mean return after {:d} episodes: {:.2f}".format(episode_idx, mean_return))
+  if args.async_evaluation:
+    evaluator = evaluation.AsyncEvaluator(
+      track, num_rollouts=evaluation.get_num_rollouts(track, EVALUATION_EPISODES,
+                                                      start_coordinates=track_file.start_coordinates),
+      strict=args.strict, random_displacement_probability=env.random_displacement_probability,
+      swept_path=args.swept_path, seed=evaluation_seed, start_coordinates=track_file.start_coordinates
+    )
 
+  run_stats = None
+  stats_file = None
+
+  if args.stats is not None:
+    run_stats = stats.Stats()
+    stats_file = open(args.stats, "a")
+
+  run_curriculum = None
+
+  if args.curriculum:
+    run_curriculum = curriculum.Curriculum(env)
+    env.reset()
+
+  profile = None
+
+  if args.profile is not None:
+    profile = cProfile.Profile()
+    profile.enable()
+
+  if args.workers > 1:
+    train_parallel(mc, training_episodes, args.workers, hogwild=args.hogwild, actor_learner=args.actor_learner,
+                   start_episode=start_episode, checkpoint_dir=args.checkpoint_dir, evaluator=evaluator,
+                   seed=args.seed, evaluation_seed=evaluation_seed)
+  else:
+    train(mc, training_episodes, start_episode=start_episode, checkpoint_dir=args.checkpoint_dir,
+          checkpoint_frequency=args.checkpoint_frequency, evaluator=evaluator, run_stats=run_stats,
+          stats_file=stats_file, stats_frequency=args.stats_frequency, curriculum=run_curriculum,
+          evaluation_seed=evaluation_seed)
+
+  if run_curriculum is not None:
+    # the episodes below start from the start line
+    env.start_coordinates = run_curriculum.start_coordinates
+
+  if profile is not None:
+    profile.disable()
+    profile.dump_stats(args.profile)
+
+  if evaluator is not None:
+    print_evaluations(evaluator, wait=True)
+    evaluator.close()
+
+  if mc.recorder is not None:
+    mc.recorder.close()
+    mc.recorder = None
 
   # show an episode starting from each start position
-  for i, start_coordinates in enumerate(env.start_coordinates):
+  sequences = []
+
+  for start_coordinates in env.start_coordinates:
 
     env.reset()
     env.position = start_coordinates
@@ -56,24 +344,78 @@ def main(args):
     ret, seq = mc.play_episode(explore=False, learn=False)
 
     print("episode return: {:.2f}".format(ret))
-    save_path = "{:s}_{:d}.{:s}".format(args.save_path, i + 1, args.format)
-    mc.show_sequence(seq, save_path=save_path, show_legend=not args.disable_legend)
+    sequences.append(seq)
+
+  with stats.timer(run_stats, stats.RENDER):
+
+    visualization.save_sequences(track, sequences, args.save_path, mode=args.render, file_format=args.format,
+                                 show_legend=not args.disable_legend)
+
+    if args.policy_path is not None:
+      visualization.save_policy(mc.policy, track, args.policy_path, show_legend=not args.disable_legend)
+
+  if stats_file is not None:
+    run_stats.write(stats_file, episode=training_episodes)
+    stats_file.close()
 
 
 if __name__ == "__main__":
 
   parser = argparse.ArgumentParser("Solve racetrack.")
 
-  parser.add_argument("racetrack", help="{}, {} or {}".format(constants.RACETRACK_1, constants.RACETRACK_2,
-                                                              constants.RACETRACK_3))
+  parser.add_argument("racetrack", help="{}, {}, {} or a track file (see trackfile.py)".format(
+    constants.RACETRACK_1, constants.RACETRACK_2, constants.RACETRACK_3))
   parser.add_argument("epsilon", type=float, default=0.1, help="exploration constant")
 
   parser.add_argument("-s", "--save-path", help="where to save plots of episodes")
   parser.add_argument("-f", "--format", default="svg", help="image format")
   parser.add_argument("--disable-legend", default=False, action="store_true",
                       help="disable legend in the racetrack image")
+  parser.add_argument("--render", choices=visualization.MODES, default=visualization.FILES,
+                      help="save episodes into a file each, a single grid image or a multipage PDF")
+  parser.add_argument("--policy-path", help="where to save an image of the policy for all velocities")
 
   parser.add_argument("--strict", default=False, action="store_true", help="strict version of the environment")
+  parser.add_argument("--compiled", default=False, action="store_true",
+                      help="step the environment using a precomputed (and cached) transition table")
+  parser.add_argument("--jit", default=False, action="store_true",
+                      help="play training episodes with the rollout kernel, compiled if numba is installed")
+  parser.add_argument("--off-policy", default=False, action="store_true",
+                      help="learn a greedy policy from epsilon-greedy episodes with weighted importance sampling")
+  parser.add_argument("--swept-path", default=False, action="store_true",
+                      help="check every square the car passes through, not only the one it lands on")
+  parser.add_argument("--curriculum", default=False, action="store_true",
+                      help="start training episodes close to the finish and move back as the agent learns to finish")
+  parser.add_argument("--workers", type=int, default=1, help="number of processes that play training episodes")
+  parser.add_argument("--hogwild", default=False, action="store_true",
+                      help="workers update action values in shared memory without locks instead of sending episodes")
+  parser.add_argument("--actor-learner", default=False, action="store_true",
+                      help="workers play episodes while the learner updates the action values, through a bounded "
+                           "queue")
+  parser.add_argument("--async-evaluation", default=False, action="store_true",
+                      help="evaluate snapshots of the policy in another process while training continues")
+  parser.add_argument("--record", help="append the training episodes to this replay log")
+  parser.add_argument("--gamma", type=float, default=1.0, help="discount factor of the returns")
+  parser.add_argument("--alpha", type=float,
+                      help="constant step size of the action value updates, sample averages if not set")
+  parser.add_argument("--seed", type=int, help="seed of the random number generators, random if not set")
+  parser.add_argument("--stats", help="append timers of the training phases and episode statistics to this JSON "
+                                      "lines file")
+  parser.add_argument("--stats-frequency", type=int, default=EVALUATION_FREQUENCY,
+                      help="number of episodes between lines of --stats")
+  parser.add_argument("--profile", help="write a cProfile dump of the training loop to this file")
+  parser.add_argument("--checkpoint-dir", help="where to save checkpoints of the agent")
+  parser.add_argument("--checkpoint-frequency", type=int, default=EVALUATION_FREQUENCY,
+                      help="number of episodes between checkpoints")
+  parser.add_argument("--resume", default=False, action="store_true",
+                      help="continue training from the latest checkpoint in --checkpoint-dir")
+  parser.add_argument("--planner", choices=[VALUE_ITERATION, PRIORITIZED_SWEEPING, ROLLOUT_POLICY_ITERATION],
+                      help="solve the environment with a planner over its transition model or with batched rollouts "
+                           "instead of Monte Carlo")
+  parser.add_argument("--rollout-iterations", type=int, default=20,
+                      help="maximum number of iterations of rollout policy iteration")
+  parser.add_argument("--rollout-all-states", default=False, action="store_true",
+                      help="improve every state on the track, not only those visited from the start positions")
 
   parsed = parser.parse_args()
   main(parsed)
\ No newline at end of file
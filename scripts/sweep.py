@@ -0,0 +1,66 @@
+import argparse
+import csv
+import shutil
+import sys
+import tempfile
+import constants, sweep
+
+
+def main(args):
+
+  runs = sweep.get_runs(args.tracks, args.epsilons, args.strict, args.seeds)
+  print("{:d} runs on {:d} workers".format(len(runs), args.workers), file=sys.stderr)
+
+  track_dir = tempfile.mkdtemp(prefix="racetrack_sweep_")
+
+  try:
+    track_paths = sweep.prepare_tracks(args.tracks, track_dir)
+
+    if args.compiled:
+      sweep.prepare_transitions(track_paths, args.strict, args.cache_dir, swept_path=args.swept_path)
+
+    output = sys.stdout if args.output is None else open(args.output, "w", newline="")
+    writer = csv.DictWriter(output, fieldnames=sweep.COLUMNS)
+    writer.writeheader()
+
+    # rows are written as the runs complete
+    for row in sweep.run_sweep(runs, track_paths, args.episodes, workers=args.workers, max_pending=args.max_pending,
+                               compiled=args.compiled, cache_dir=args.cache_dir, swept_path=args.swept_path,
+                               evaluation_episodes=args.evaluation_episodes):
+      writer.writerow(row)
+      output.flush()
+
+    if args.output is not None:
+      output.close()
+
+  finally:
+    shutil.rmtree(track_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser("Train agents for every combination of tracks, exploration constants, environments "
+                                   "and seeds in a pool of processes.")
+
+  parser.add_argument("--tracks", nargs="+", default=[constants.RACETRACK_1],
+                      help="{}, {}, {} or track files".format(constants.RACETRACK_1, constants.RACETRACK_2,
+                                                              constants.RACETRACK_3))
+  parser.add_argument("--epsilons", type=float, nargs="+", default=[0.1], help="exploration constants")
+  parser.add_argument("--strict", type=int, nargs="+", choices=[0, 1], default=[0],
+                      help="0 for the original environment, 1 for the strict version")
+  parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="seeds of the runs")
+
+  parser.add_argument("-e", "--episodes", type=int, default=10000, help="number of training episodes of each run")
+  parser.add_argument("--evaluation-episodes", type=int, default=100, help="number of greedy evaluation episodes")
+  parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+  parser.add_argument("--max-pending", type=int, help="maximum number of submitted runs, twice the workers by default")
+  parser.add_argument("--compiled", default=False, action="store_true",
+                      help="step the environments using precomputed transition tables shared through the cache")
+  parser.add_argument("--cache-dir", help="cache directory of the transition tables")
+  parser.add_argument("--swept-path", default=False, action="store_true",
+                      help="check every cell the car passes through")
+  parser.add_argument("-o", "--output", help="CSV file of the results, printed if not set")
+
+  parsed = parser.parse_args()
+  parsed.strict = [bool(strict) for strict in parsed.strict]
+  main(parsed)
@@ -0,0 +1,81 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedTables:
+
+  NUM_ACTIONS = 9
+  NUM_SPEEDS = 5
+
+  def __init__(self, racetrack_shape, name=None, init=-100):
+    """
+    Action values, action counts and policy of a Monte Carlo agent stored in a single shared memory block.
+    The process that creates the block (name is None) owns it: it initializes the tables and is the only one that
+    should call unlink. Other processes attach by name and only close their mapping, so the tables survive workers
+    that crash or exit without cleaning up.
+
+    Consistency model: there are no locks (Hogwild). Each worker reads and writes the tables in place, so concurrent
+    updates of the same state-action can be lost and a policy entry can lag behind the action values it was computed
+    from. Every individual element is a 4-byte aligned value, so readers see either the old or the new value.
+    :param racetrack_shape:     Shape of the racetrack map.
+    :param name:                Name of an existing block to attach to, a new block is created if None.
+    :param init:                Initial action values of a new block (as in MonteCarlo).
+    """
+
+    self.state_shape = tuple(racetrack_shape) + (self.NUM_SPEEDS, self.NUM_SPEEDS)
+    self.owner = name is None
+
+    num_states = int(np.prod(self.state_shape))
+    table_size = num_states * self.NUM_ACTIONS * 4
+    size = 2 * table_size + num_states * 4
+
+    if self.owner:
+      self.memory = shared_memory.SharedMemory(create=True, size=size)
+    else:
+      self.memory = attach_shared_memory(name)
+
+    self.name = self.memory.name
+
+    self.action_values = np.ndarray(self.state_shape + (self.NUM_ACTIONS,), dtype=np.float32, buffer=self.memory.buf)
+    self.action_counts = np.ndarray(self.state_shape + (self.NUM_ACTIONS,), dtype=np.int32, buffer=self.memory.buf,
+                                    offset=table_size)
+    self.policy = np.ndarray(self.state_shape, dtype=np.int32, buffer=self.memory.buf, offset=2 * table_size)
+
+    if self.owner:
+      self.action_values[...] = -init
+      self.action_counts[...] = 0
+      self.policy[...] = 0
+
+  def close(self):
+    """
+    Close this process' mapping of the tables. The arrays cannot be used afterwards.
+    :return:      None.
+    """
+
+    self.action_values = None
+    self.action_counts = None
+    self.policy = None
+    self.memory.close()
+
+  def unlink(self):
+    """
+    Free the shared memory block, only the owner should call this after all workers finished.
+    :return:      None.
+    """
+
+    self.memory.unlink()
+
+
+def attach_shared_memory(name):
+  """
+  Attach to an existing shared memory block without taking ownership of it.
+  :param name:    Name of the block.
+  :return:        Shared memory.
+  """
+
+  try:
+    return shared_memory.SharedMemory(name=name, track=False)
+  except TypeError:
+    # before Python 3.13, attaching registers the block with the resource tracker; processes started by
+    # multiprocessing share the tracker of their parent, so this does not unlink the block when they exit
+    return shared_memory.SharedMemory(name=name)
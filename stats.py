@@ -0,0 +1,177 @@
+import contextlib
+import json
+import time
+import numpy as np
+import environment, utils
+
+
+PLAY = "play"
+RETURNS = "returns"
+LEARN = "learn"
+POLICY = "update_policy"
+EVALUATION = "evaluation"
+CHECKPOINT = "checkpoint"
+RENDER = "render"
+
+# episode lengths are counted in power-of-two bins: [1, 2), [2, 4), [4, 8), ...
+NUM_LENGTH_BINS = 32
+
+
+class Stats:
+
+  def __init__(self, sample_frequency=10):
+    """
+    Timers of the phases of a training run, counters of steps, episodes, off-track steps and finishes, and
+    a histogram of sampled episode lengths.
+    Everything is collected once per episode from its trajectory, nothing is added to the steps of the environment,
+    and training code only calls into Stats when it is given one.
+    :param sample_frequency:    Add the length of every n-th episode to the histogram.
+    """
+
+    self.sample_frequency = sample_frequency
+
+    self.start_time = time.time()
+    self.seconds = {}
+    self.calls = {}
+
+    self.num_steps = 0
+    self.num_episodes = 0
+    self.num_off_track = 0
+    self.num_finished = 0
+    self.length_counts = np.zeros(NUM_LENGTH_BINS, dtype=np.int64)
+
+  def add_time(self, phase, seconds):
+    """
+    Add time spent in a phase.
+    :param phase:       Name of the phase.
+    :param seconds:     Time in seconds.
+    :return:            None.
+    """
+
+    self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+    self.calls[phase] = self.calls.get(phase, 0) + 1
+
+  @contextlib.contextmanager
+  def timer(self, phase):
+    """
+    Time the body of a with statement.
+    :param phase:   Name of the phase.
+    :return:        Context manager.
+    """
+
+    start = time.perf_counter()
+
+    try:
+      yield
+    finally:
+      self.add_time(phase, time.perf_counter() - start)
+
+  def add_episode(self, trajectory, strict=False):
+    """
+    Count the steps of a played episode.
+    :param trajectory:    Trajectory of the episode.
+    :param strict:        The episode was played in RacetrackStrict, where leaving the track ends the episode.
+    :return:              None.
+    """
+
+    rewards = trajectory.get_rewards()
+    num_off_track = int(np.count_nonzero(rewards == environment.Racetrack.OUT_OF_BOUNDS_REWARD))
+
+    self.num_steps += len(rewards)
+    self.num_off_track += num_off_track
+
+    # Racetrack puts cars that leave the track back, so its episodes always end at the finish
+    if not strict or num_off_track == 0:
+      self.num_finished += 1
+
+    if self.num_episodes % self.sample_frequency == 0 and len(rewards) > 0:
+      self.length_counts[min(len(rewards).bit_length() - 1, NUM_LENGTH_BINS - 1)] += 1
+
+    self.num_episodes += 1
+
+  def get_length_histogram(self):
+    """
+    Get the histogram of sampled episode lengths, without empty bins at the end.
+    :return:    List of [lowest length in the bin, number of episodes].
+    """
+
+    num_bins = np.flatnonzero(self.length_counts)[-1] + 1 if np.any(self.length_counts) else 0
+
+    return [[2 ** i, int(self.length_counts[i])] for i in range(num_bins)]
+
+  def get_summary(self):
+    """
+    Get all statistics.
+    :return:    JSON-serializable dictionary.
+    """
+
+    play_seconds = self.seconds.get(PLAY, 0.0)
+
+    return {
+      "time": time.time() - self.start_time,
+      "episodes": self.num_episodes,
+      "steps": self.num_steps,
+      "off_track": self.num_off_track,
+      "finished": self.num_finished,
+      "steps_per_second": self.num_steps / play_seconds if play_seconds > 0 else None,
+      "seconds": dict(self.seconds),
+      "calls": dict(self.calls),
+      "episode_lengths": self.get_length_histogram()
+    }
+
+  def write(self, file, **extra):
+    """
+    Write the statistics as a single JSON line.
+    :param file:      Open text file.
+    :param extra:     Additional fields (e.g. the episode index).
+    :return:          None.
+    """
+
+    summary = dict(extra)
+    summary.update(self.get_summary())
+
+    file.write(json.dumps(summary) + "\n")
+    file.flush()
+
+
+def timer(stats, phase):
+  """
+  Time a phase if stats are collected.
+  :param stats:     Stats or None.
+  :param phase:     Name of the phase.
+  :return:          Context manager.
+  """
+
+  if stats is None:
+    return contextlib.nullcontext()
+
+  return stats.timer(phase)
+
+
+def play_episode(mc, stats):
+  """
+  Play an episode, learn from it and update the policy like MonteCarlo.play_episode followed by update_policy, and
+  time each of the phases.
+  :param mc:        Monte Carlo agent.
+  :param stats:     Stats.
+  :return:          None.
+  """
+
+  start = time.perf_counter()
+  trajectory = mc.rollout()
+  play_end = time.perf_counter()
+
+  returns = utils.compute_returns(trajectory.get_rewards(), gamma=mc.gamma)
+  returns_end = time.perf_counter()
+
+  mc.learn(trajectory, returns)
+  learn_end = time.perf_counter()
+
+  mc.update_policy()
+  policy_end = time.perf_counter()
+
+  stats.add_time(PLAY, play_end - start)
+  stats.add_time(RETURNS, returns_end - play_end)
+  stats.add_time(LEARN, learn_end - returns_end)
+  stats.add_time(POLICY, policy_end - learn_end)
+  stats.add_episode(trajectory, strict=isinstance(mc.env, environment.RacetrackStrict))
@@ -0,0 +1,254 @@
+import numpy as np
+import constants
+
+
+VALUES = "values"
+COUNTS = "counts"
+
+
+class DenseStorage:
+
+  NUM_ACTIONS = 9
+  NUM_SPEEDS = 5
+
+  def __init__(self, racetrack, init=-100, tables=None):
+    """
+    Store action values and counts for all state-actions in dense arrays.
+    Every storage keeps its tables as flat arrays; locate translates flat state-action indices (into an array of shape
+    (rows, cols, 5, 5, 9)) to positions in the tables. The actions of a state are always stored next to each other.
+    :param racetrack:     Racetrack map.
+    :param init:          Initial action values (the tables start at -init, as in MonteCarlo).
+    :param tables:        Existing arrays to use for the tables (e.g. shared memory), allocated if None.
+    """
+
+    self.shape = racetrack.shape + (self.NUM_SPEEDS, self.NUM_SPEEDS, self.NUM_ACTIONS)
+    self.fill_values = {}
+    self.tables = {}
+
+    if tables is None:
+      tables = {}
+
+    for name, dtype, fill_value in [(VALUES, np.float32, -init), (COUNTS, np.int32, 0)]:
+      if name in tables:
+        self.fill_values[name] = fill_value
+        self.tables[name] = tables[name].reshape(-1)
+      else:
+        self.add_table(name, dtype, fill_value)
+
+  def add_table(self, name, dtype, fill_value):
+    """
+    Add a table with one entry per state-action.
+    :param name:          Name of the table.
+    :param dtype:         Data type.
+    :param fill_value:    Value of state-actions that were never written.
+    :return:              None.
+    """
+
+    self.fill_values[name] = fill_value
+    self.tables[name] = np.full(int(np.prod(self.shape)), fill_value, dtype=dtype)
+
+  def locate(self, indices, insert=False):
+    """
+    Find positions of state-actions in the tables.
+    :param indices:     Flat state-action indices.
+    :param insert:      Allocate entries for state-actions that are not stored yet.
+    :return:            Positions in the tables, -1 for state-actions that are not stored.
+    """
+
+    return np.asarray(indices)
+
+  def get_greedy_actions(self, states):
+    """
+    Get actions with the maximum value.
+    :param states:    Flat state indices.
+    :return:          Greedy actions, 0 for states that are not stored.
+    """
+
+    states = np.asarray(states)
+    locations = self.locate(states * self.NUM_ACTIONS)
+    stored = locations >= 0
+
+    actions = np.zeros(len(states), dtype=np.int32)
+    values = self.tables[VALUES][locations[stored, np.newaxis] + np.arange(self.NUM_ACTIONS)]
+    actions[stored] = np.argmax(values, axis=-1)
+
+    return actions
+
+  def get_greedy_policy(self):
+    """
+    Get greedy actions for all states.
+    :return:      Flat array of actions.
+    """
+
+    return np.argmax(self.tables[VALUES].reshape(-1, self.NUM_ACTIONS), axis=-1)
+
+  def get_dense(self, name):
+    """
+    Get a table as an array of shape (rows, cols, 5, 5, 9). Writes into the array change the table.
+    :param name:      Name of the table.
+    :return:          Dense table.
+    """
+
+    return self.tables[name].reshape(self.shape)
+
+  def get_nbytes(self):
+    """
+    Get memory used by the tables and indexes.
+    :return:      Number of bytes.
+    """
+
+    return sum(table.nbytes for table in self.tables.values())
+
+
+class MaskedStorage(DenseStorage):
+
+  def __init__(self, racetrack, init=-100):
+    """
+    Store action values and counts only for cells that are not grass.
+    :param racetrack:     Racetrack map.
+    :param init:          Initial action values.
+    """
+
+    cells = racetrack.reshape(-1) != constants.GRASS_VALUE
+
+    self.cell_size = self.NUM_SPEEDS * self.NUM_SPEEDS * self.NUM_ACTIONS
+    self.cells = np.flatnonzero(cells)
+    self.cell_indices = np.full(racetrack.size, -1, dtype=np.int32)
+    self.cell_indices[self.cells] = np.arange(len(self.cells))
+
+    DenseStorage.__init__(self, racetrack, init=init)
+
+  def add_table(self, name, dtype, fill_value):
+
+    self.fill_values[name] = fill_value
+    self.tables[name] = np.full(len(self.cells) * self.cell_size, fill_value, dtype=dtype)
+
+  def locate(self, indices, insert=False):
+
+    cells, offsets = np.divmod(np.asarray(indices), self.cell_size)
+    compact_cells = self.cell_indices[cells]
+
+    if np.any(compact_cells < 0):
+      raise ValueError("State-actions on grass cells are not stored.")
+
+    return compact_cells.astype(np.int64) * self.cell_size + offsets
+
+  def get_greedy_policy(self):
+
+    policy = np.zeros((len(self.cell_indices), self.cell_size // self.NUM_ACTIONS), dtype=np.int32)
+    policy[self.cells] = np.argmax(self.tables[VALUES].reshape(len(self.cells), -1, self.NUM_ACTIONS), axis=-1)
+
+    return policy.reshape(-1)
+
+  def get_dense(self, name):
+    """
+    Get a table as an array of shape (rows, cols, 5, 5, 9). The array is a copy.
+    :param name:      Name of the table.
+    :return:          Dense table.
+    """
+
+    table = self.tables[name]
+    dense = np.full((len(self.cell_indices), self.cell_size), self.fill_values[name], dtype=table.dtype)
+    dense[self.cells] = table.reshape(len(self.cells), self.cell_size)
+
+    return dense.reshape(self.shape)
+
+  def get_nbytes(self):
+
+    return DenseStorage.get_nbytes(self) + self.cells.nbytes + self.cell_indices.nbytes
+
+
+class HashStorage(DenseStorage):
+
+  def __init__(self, racetrack, init=-100, capacity=1024):
+    """
+    Store action values and counts only for visited states, in rows assigned by a hash table.
+    :param racetrack:     Racetrack map.
+    :param init:          Initial action values.
+    :param capacity:      Initial number of rows, doubled when full.
+    """
+
+    self.rows = {}
+    self.states = np.zeros(capacity, dtype=np.int64)
+    self.capacity = capacity
+
+    DenseStorage.__init__(self, racetrack, init=init)
+
+  def add_table(self, name, dtype, fill_value):
+
+    self.fill_values[name] = fill_value
+    self.tables[name] = np.full(self.capacity * self.NUM_ACTIONS, fill_value, dtype=dtype)
+
+  def grow(self):
+    """
+    Double the number of rows.
+    :return:    None.
+    """
+
+    self.capacity *= 2
+    self.states = np.resize(self.states, self.capacity)
+
+    for name, table in self.tables.items():
+      grown = np.full(self.capacity * self.NUM_ACTIONS, self.fill_values[name], dtype=table.dtype)
+      grown[:len(table)] = table
+      self.tables[name] = grown
+
+  def locate(self, indices, insert=False):
+
+    states, actions = np.divmod(np.asarray(indices), self.NUM_ACTIONS)
+    rows = np.empty(len(states), dtype=np.int64)
+
+    for i, state in enumerate(states.tolist()):
+
+      row = self.rows.get(state)
+
+      if row is None:
+        if insert:
+          row = len(self.rows)
+
+          if row == self.capacity:
+            self.grow()
+
+          self.rows[state] = row
+          self.states[row] = state
+        else:
+          row = -1
+
+      rows[i] = row
+
+    return np.where(rows >= 0, rows * self.NUM_ACTIONS + actions, -1)
+
+  def get_greedy_policy(self):
+
+    policy = np.zeros(int(np.prod(self.shape[:-1])), dtype=np.int32)
+    num_rows = len(self.rows)
+    values = self.tables[VALUES][:num_rows * self.NUM_ACTIONS].reshape(num_rows, self.NUM_ACTIONS)
+    policy[self.states[:num_rows]] = np.argmax(values, axis=-1)
+
+    return policy
+
+  def get_dense(self, name):
+    """
+    Get a table as an array of shape (rows, cols, 5, 5, 9). The array is a copy.
+    :param name:      Name of the table.
+    :return:          Dense table.
+    """
+
+    table = self.tables[name]
+    num_rows = len(self.rows)
+    dense = np.full((int(np.prod(self.shape[:-1])), self.NUM_ACTIONS), self.fill_values[name], dtype=table.dtype)
+    dense[self.states[:num_rows]] = table[:num_rows * self.NUM_ACTIONS].reshape(num_rows, self.NUM_ACTIONS)
+
+    return dense.reshape(self.shape)
+
+  def get_nbytes(self):
+
+    # a dict entry with an int key and an int value takes about 100 bytes
+    return DenseStorage.get_nbytes(self) + self.states.nbytes + 100 * len(self.rows)
+
+
+STORAGES = {
+  "dense": DenseStorage,
+  "masked": MaskedStorage,
+  "hash": HashStorage
+}
@@ -0,0 +1,227 @@
+import concurrent.futures
+import itertools
+import os
+import time
+import numpy as np
+import agent, environment, evaluation, racetracks, trackfile, transitions
+
+
+EVALUATION_COLUMNS = ["mean_return", "mean_length", "off_track_rate", "finish_rate"]
+RUN_COLUMNS = ["track", "epsilon", "strict", "seed", "episodes", "steps", "seconds", "steps_per_second"]
+COLUMNS = RUN_COLUMNS + EVALUATION_COLUMNS
+
+# tracks and environments of a worker process, kept between the runs it plays
+worker_settings = None
+worker_tracks = {}
+worker_envs = {}
+
+
+def get_runs(tracks, epsilons, strict_values, seeds):
+  """
+  Enumerate the runs of a sweep.
+  :param tracks:            Track names or track files.
+  :param epsilons:          Exploration constants.
+  :param strict_values:     Whether to use the strict environment, e.g. [False, True].
+  :param seeds:             Seeds of the runs.
+  :return:                  List of (track, epsilon, strict, seed).
+  """
+
+  return list(itertools.product(tracks, epsilons, strict_values, seeds))
+
+
+def prepare_tracks(tracks, track_dir):
+  """
+  Save each track of a sweep once as a binary track file, so that all worker processes memory-map the same pages
+  instead of receiving a copy of the map with every run.
+  :param tracks:        Track names or track files.
+  :param track_dir:     Where to save the tracks.
+  :return:              Dictionary from each track to the path of its binary track file.
+  """
+
+  paths = {}
+
+  for i, track in enumerate(tracks):
+
+    if track not in racetracks.TRACKS and os.path.isdir(track):
+      # already a binary track
+      paths[track] = track
+      continue
+
+    paths[track] = os.path.join(track_dir, "{:d}_{:s}".format(i, os.path.basename(track.rstrip("/"))))
+    trackfile.save(trackfile.get(track), paths[track])
+
+  return paths
+
+
+def prepare_transitions(track_paths, strict_values, cache_dir, swept_path=False):
+  """
+  Build the transition tables of all tracks of a sweep into the cache before the runs start, so that the workers
+  load (memory-map) them instead of building the same tables at the same time.
+  :param track_paths:     Dictionary from tracks to their binary track files.
+  :param strict_values:   Whether to use the strict environment, e.g. [False, True].
+  :param cache_dir:       Cache directory of the transition tables, transitions.DEFAULT_CACHE_DIR if None.
+  :param swept_path:      Check every cell the car passes through.
+  :return:                None.
+  """
+
+  if cache_dir is None:
+    cache_dir = transitions.DEFAULT_CACHE_DIR
+
+  for path in track_paths.values():
+    racetrack = trackfile.load(path).racetrack
+
+    for strict in strict_values:
+      transitions.TransitionModel(racetrack, strict=strict, cache_dir=cache_dir, swept_path=swept_path)
+
+
+def init_worker(track_paths, num_episodes, compiled, cache_dir, swept_path, evaluation_episodes):
+  """
+  Store the settings of a sweep in a worker process.
+  :param track_paths:             Dictionary from tracks to their binary track files.
+  :param num_episodes:            Number of training episodes of each run.
+  :param compiled:                Use the cached transition tables.
+  :param cache_dir:               Cache directory of the transition tables.
+  :param swept_path:              Check every cell the car passes through.
+  :param evaluation_episodes:     Number of greedy episodes that evaluate each run.
+  :return:                        None.
+  """
+
+  global worker_settings
+
+  worker_settings = {
+    "track_paths": track_paths,
+    "num_episodes": num_episodes,
+    "compiled": compiled,
+    "cache_dir": cache_dir,
+    "swept_path": swept_path,
+    "evaluation_episodes": evaluation_episodes
+  }
+
+
+def get_env(track, strict):
+  """
+  Get the environment of a worker process for a track, created by the first run that uses it.
+  :param track:     Track name or track file.
+  :param strict:    Use RacetrackStrict instead of Racetrack.
+  :return:          Environment.
+  """
+
+  if track not in worker_tracks:
+    worker_tracks[track] = trackfile.load(worker_settings["track_paths"][track])
+
+  if (track, strict) not in worker_envs:
+    loaded = worker_tracks[track]
+    settings = {
+      "compiled": worker_settings["compiled"],
+      "cache_dir": worker_settings["cache_dir"],
+      "swept_path": worker_settings["swept_path"],
+      "start_coordinates": loaded.start_coordinates
+    }
+
+    if strict:
+      worker_envs[(track, strict)] = environment.RacetrackStrict(loaded.racetrack, **settings)
+    else:
+      worker_envs[(track, strict)] = environment.Racetrack(loaded.racetrack, **settings)
+
+  return worker_envs[(track, strict)]
+
+
+def play_run(run):
+  """
+  Train an agent in a worker process and evaluate its greedy policy.
+  A run with the same track, epsilon, environment and seed learns the same action values as solve_racetrack with
+  --seed.
+  :param run:     Tuple (track, epsilon, strict, seed).
+  :return:        Row of the result table.
+  """
+
+  track, epsilon, strict, seed = run
+  env_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+
+  env = get_env(track, strict)
+  env.seed(env_seed)
+  env.reset()
+
+  mc = agent.MonteCarlo(env, epsilon, seed=agent_seed)
+
+  num_steps = 0
+  start = time.perf_counter()
+
+  for _ in range(worker_settings["num_episodes"]):
+
+    mc.play_episode()
+    mc.update_policy()
+    num_steps += len(mc.trajectory)
+    env.reset()
+
+  seconds = time.perf_counter() - start
+
+  start_coordinates = worker_tracks[track].start_coordinates
+  num_rollouts = evaluation.get_num_rollouts(env.racetrack, worker_settings["evaluation_episodes"],
+                                             start_coordinates=start_coordinates)
+
+  results = evaluation.evaluate(
+    mc.policy, env.racetrack, num_rollouts=num_rollouts, strict=strict,
+    random_displacement_probability=env.random_displacement_probability, swept_path=worker_settings["swept_path"],
+    seed=seed, start_coordinates=start_coordinates
+  )
+
+  row = {
+    "track": track,
+    "epsilon": epsilon,
+    "strict": strict,
+    "seed": seed,
+    "episodes": worker_settings["num_episodes"],
+    "steps": num_steps,
+    "seconds": seconds,
+    "steps_per_second": num_steps / seconds if seconds > 0 else None
+  }
+
+  row.update({column: results[column] for column in EVALUATION_COLUMNS})
+
+  return row
+
+
+def run_sweep(runs, track_paths, num_episodes, workers=1, max_pending=None, compiled=False, cache_dir=None,
+              swept_path=False, evaluation_episodes=100):
+  """
+  Play the runs of a sweep in a pool of worker processes and yield their results as they complete.
+  Each worker keeps its tracks and environments (including memory-mapped transition tables) between runs, and at most
+  max_pending runs are submitted at a time.
+  :param runs:                    List of (track, epsilon, strict, seed), see get_runs.
+  :param track_paths:             Dictionary from tracks to their binary track files, see prepare_tracks.
+  :param num_episodes:            Number of training episodes of each run.
+  :param workers:                 Number of worker processes.
+  :param max_pending:             Maximum number of submitted runs, 2 * workers if None.
+  :param compiled:                Use transition tables cached in cache_dir, see prepare_transitions.
+  :param cache_dir:               Cache directory of the transition tables, transitions.DEFAULT_CACHE_DIR if None.
+  :param swept_path:              Check every cell the car passes through.
+  :param evaluation_episodes:     Number of greedy episodes that evaluate each run.
+  :return:                        Generator of result rows in the order the runs complete.
+  """
+
+  if max_pending is None:
+    max_pending = 2 * workers
+
+  assert max_pending >= workers
+
+  runs = iter(runs)
+  pending = set()
+
+  with concurrent.futures.ProcessPoolExecutor(
+      max_workers=workers, initializer=init_worker,
+      initargs=(track_paths, num_episodes, compiled, cache_dir, swept_path, evaluation_episodes)) as executor:
+
+    while True:
+
+      # keep the queue of submitted runs bounded
+      for run in itertools.islice(runs, max_pending - len(pending)):
+        pending.add(executor.submit(play_run, run))
+
+      if len(pending) == 0:
+        break
+
+      done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+      for future in done:
+        yield future.result()
@@ -0,0 +1,229 @@
+import unittest
+import numpy as np
+import constants, evaluation, racetracks, utils
+from agent import MonteCarlo, OffPolicyMonteCarlo
+from environment import Racetrack, RacetrackStrict
+
+
+def play_episode_reference(mc, gamma=1.0, alpha=None):
+
+  sequence = []
+
+  while not mc.env.done:
+    state = mc.env.get_state()
+    action = mc.explore(mc.policy[state])
+    reward = mc.env.act(*mc.action_to_acceleration(action))
+    sequence.append((state, action, reward))
+
+  returns = np.zeros(len(sequence))
+
+  for i in reversed(range(len(sequence))):
+    for j in range(i + 1):
+      returns[j] += gamma ** (i - j) * sequence[i][2]
+
+  for i in range(len(sequence)):
+    state_action = sequence[i][0] + (sequence[i][1],)
+
+    if alpha is None:
+      mc.action_values[state_action] += utils.update_mean(returns[i], mc.action_values[state_action],
+                                                          mc.action_counts[state_action])
+    else:
+      mc.action_values[state_action] += alpha * (returns[i] - mc.action_values[state_action])
+
+    mc.action_counts[state_action] += 1
+
+  return returns[0], sequence
+
+
+def learn_off_policy_reference(mc, trajectory):
+
+  action_values = mc.action_values
+  cumulative_weights = mc.storage.get_dense(OffPolicyMonteCarlo.WEIGHTS)
+
+  ret = 0
+  weight = 1.0
+
+  for t in reversed(range(len(trajectory))):
+
+    state, action, reward = trajectory[t]
+    state_action = state + (action,)
+    ret += reward
+
+    cumulative_weights[state_action] += weight
+    value = float(action_values[state_action])
+    action_values[state_action] = value + weight / cumulative_weights[state_action] * (ret - value)
+    mc.action_counts[state_action] += 1
+
+    if action != np.argmax(action_values[state]):
+      break
+
+    weight /= trajectory.get_probabilities()[t]
+
+
+class TestMonteCarlo(unittest.TestCase):
+
+  def test_same_as_reference(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+
+    reference = MonteCarlo(Racetrack(track, seed=1), 1.0, seed=2)
+    reference_episodes = []
+
+    for _ in range(50):
+      ret, sequence = play_episode_reference(reference)
+      reference.update_policy(full=True)
+      reference.env.reset()
+      reference_episodes.append((ret, [(tuple(int(x) for x in s), int(a), r) for s, a, r in sequence]))
+
+    mc = MonteCarlo(Racetrack(track, seed=1), 1.0, seed=2)
+    episodes = []
+
+    for _ in range(50):
+      ret, trajectory = mc.play_episode()
+      mc.update_policy()
+      mc.env.reset()
+      episodes.append((ret, list(trajectory)))
+
+    self.assertEqual(reference_episodes, episodes)
+    np.testing.assert_array_equal(reference.action_values, mc.action_values)
+    np.testing.assert_array_equal(reference.action_counts, mc.action_counts)
+    np.testing.assert_array_equal(reference.policy, mc.policy)
+
+  def test_discount_and_step_size(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+
+    reference = MonteCarlo(Racetrack(track, seed=1), 0.5, seed=2, gamma=0.9, alpha=0.1)
+    mc = MonteCarlo(Racetrack(track, seed=1), 0.5, seed=2, gamma=0.9, alpha=0.1)
+
+    for _ in range(50):
+      ret, sequence = play_episode_reference(reference, gamma=0.9, alpha=0.1)
+      reference.update_policy(full=True)
+      reference.env.reset()
+
+      mc_ret, trajectory = mc.play_episode()
+      mc.update_policy()
+      mc.env.reset()
+
+      self.assertAlmostEqual(ret, mc_ret)
+      self.assertEqual([(tuple(int(x) for x in s), int(a), r) for s, a, r in sequence], list(trajectory))
+
+    np.testing.assert_allclose(reference.action_values, mc.action_values)
+    np.testing.assert_array_equal(reference.action_counts, mc.action_counts)
+
+  def test_states_do_not_repeat(self):
+
+    # cars only move up or right, also when they are put back after leaving the track
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_3], seed=0), 1.0, seed=1)
+
+    for _ in range(100):
+      _, trajectory = mc.play_episode(learn=False)
+      mc.env.reset()
+
+      states = trajectory.get_states()
+      self.assertEqual(len(np.unique(states, axis=0)), len(states))
+
+  def test_trajectory_grows(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_3]), 1.0)
+    mc.trajectory.grow()
+
+    for _ in range(10):
+      ret, trajectory = mc.play_episode()
+      mc.env.reset()
+
+      self.assertEqual(ret, np.sum(trajectory.get_rewards()))
+      self.assertGreaterEqual(len(mc.trajectory.actions), len(trajectory))
+
+  def test_incremental_policy_update(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+
+    for i in range(200):
+      mc.play_episode()
+      mc.env.reset()
+
+      if i % 3 == 0:
+        mc.update_policy()
+        np.testing.assert_array_equal(mc.policy, np.argmax(mc.action_values, axis=-1))
+
+  def test_seed(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    global_state = np.random.get_state()[1].copy()
+
+    runs = []
+
+    for seed in [0, 0, 1]:
+
+      mc = MonteCarlo(Racetrack(track, seed=seed), 0.5, seed=seed + 10)
+      episodes = []
+
+      for _ in range(20):
+        _, trajectory = mc.play_episode()
+        mc.update_policy()
+        mc.env.reset()
+        episodes.append(list(trajectory))
+
+      runs.append(episodes)
+
+    self.assertEqual(runs[0], runs[1])
+    self.assertNotEqual(runs[0], runs[2])
+    # the global random number generator is not used
+    np.testing.assert_array_equal(np.random.get_state()[1], global_state)
+
+
+class TestOffPolicyMonteCarlo(unittest.TestCase):
+
+  def test_same_as_reference(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+
+    reference = OffPolicyMonteCarlo(RacetrackStrict(track, seed=1), 0.3, seed=2)
+    mc = OffPolicyMonteCarlo(RacetrackStrict(track, seed=1), 0.3, seed=2)
+
+    for _ in range(300):
+
+      _, trajectory = reference.play_episode(learn=False)
+      learn_off_policy_reference(reference, trajectory)
+      reference.update_policy(full=True)
+      reference.env.reset()
+
+      mc.play_episode()
+      mc.update_policy()
+      mc.env.reset()
+
+    np.testing.assert_array_equal(reference.action_values, mc.action_values)
+    np.testing.assert_array_equal(reference.action_counts, mc.action_counts)
+    np.testing.assert_array_equal(reference.storage.get_dense(OffPolicyMonteCarlo.WEIGHTS),
+                                  mc.storage.get_dense(OffPolicyMonteCarlo.WEIGHTS))
+    np.testing.assert_array_equal(reference.policy, mc.policy)
+
+  def test_learns_strict_track(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    mc = OffPolicyMonteCarlo(RacetrackStrict(track, seed=0), 0.1, seed=1)
+
+    for _ in range(20000):
+      mc.play_episode()
+      mc.update_policy()
+      mc.env.reset()
+
+    results = evaluation.evaluate(mc.policy, track, num_rollouts=2, strict=True, seed=0)
+
+    self.assertEqual(results["finish_rate"], 1.0)
+
+  def test_storage_types(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    agents = [OffPolicyMonteCarlo(Racetrack(track, seed=0), 0.5, storage_type=storage_type, seed=1)
+              for storage_type in ["dense", "hash"]]
+
+    for mc in agents:
+      for _ in range(100):
+        mc.play_episode()
+        mc.update_policy()
+        mc.env.reset()
+
+    np.testing.assert_array_equal(agents[0].action_values, agents[1].action_values)
+    np.testing.assert_array_equal(agents[0].policy, agents[1].policy)
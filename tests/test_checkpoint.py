@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import checkpoint, constants, racetracks
+from agent import MonteCarlo, OffPolicyMonteCarlo
+from environment import Racetrack
+
+
+def train_episode(mc, episode_idx=None, checkpoint_dir=None):
+
+  mc.play_episode()
+  mc.update_policy()
+
+  if checkpoint_dir is not None:
+    checkpoint.save(mc, episode_idx, checkpoint_dir)
+
+  mc.env.reset()
+
+
+class TestCheckpoint(unittest.TestCase):
+
+  def setUp(self):
+
+    self.checkpoint_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.checkpoint_dir)
+
+  def test_resume(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+
+    mc = MonteCarlo(Racetrack(track, seed=0), 0.5, seed=1)
+
+    for _ in range(20):
+      train_episode(mc)
+
+    # the same run interrupted after 10 episodes
+    interrupted = MonteCarlo(Racetrack(track, seed=0), 0.5, seed=1)
+
+    for _ in range(9):
+      train_episode(interrupted)
+
+    train_episode(interrupted, episode_idx=10, checkpoint_dir=self.checkpoint_dir)
+
+    loaded = checkpoint.Checkpoint(self.checkpoint_dir, mmap_mode="c")
+    resumed = MonteCarlo(Racetrack(track), loaded.state["epsilon"], tables=loaded)
+    loaded.restore_random_state(resumed)
+    resumed.env.reset()
+
+    for _ in range(10):
+      train_episode(resumed)
+
+    self.assertEqual(loaded.episode_idx, 10)
+    np.testing.assert_array_equal(mc.action_values, resumed.action_values)
+    np.testing.assert_array_equal(mc.policy, resumed.policy)
+
+    # copy-on-write tables leave the files unchanged
+    np.testing.assert_array_equal(checkpoint.Checkpoint(self.checkpoint_dir).action_counts,
+                                  interrupted.action_counts)
+
+  def test_keep_latest(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+
+    for i in range(1, 5):
+      train_episode(mc, episode_idx=i, checkpoint_dir=self.checkpoint_dir)
+
+    loaded = checkpoint.Checkpoint(self.checkpoint_dir, mmap_mode="r")
+
+    self.assertEqual(loaded.episode_idx, 4)
+    self.assertIsInstance(loaded.action_values, np.memmap)
+    np.testing.assert_array_equal(loaded.action_values, mc.action_values)
+    self.assertEqual(len([name for name in os.listdir(self.checkpoint_dir) if name.startswith("checkpoint_")]), 2)
+
+  def test_resume_off_policy(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+
+    mc = OffPolicyMonteCarlo(Racetrack(track, seed=0), 0.5, seed=1)
+
+    for _ in range(20):
+      train_episode(mc)
+
+    interrupted = OffPolicyMonteCarlo(Racetrack(track, seed=0), 0.5, seed=1)
+
+    for _ in range(9):
+      train_episode(interrupted)
+
+    train_episode(interrupted, episode_idx=10, checkpoint_dir=self.checkpoint_dir)
+
+    # the cumulative weights are saved next to the action values
+    loaded = checkpoint.Checkpoint(self.checkpoint_dir, mmap_mode="c")
+    self.assertIn(OffPolicyMonteCarlo.WEIGHTS, loaded.tables)
+
+    resumed = OffPolicyMonteCarlo(Racetrack(track), loaded.state["epsilon"], tables=loaded)
+    loaded.restore_random_state(resumed)
+    resumed.env.reset()
+
+    for _ in range(10):
+      train_episode(resumed)
+
+    np.testing.assert_array_equal(mc.action_values, resumed.action_values)
+    np.testing.assert_array_equal(mc.storage.get_dense(OffPolicyMonteCarlo.WEIGHTS),
+                                  resumed.storage.get_dense(OffPolicyMonteCarlo.WEIGHTS))
+
+  def test_remove_temporary(self):
+
+    # left by interrupted saves
+    os.mkdir(os.path.join(self.checkpoint_dir, checkpoint.TMP_PREFIX + "table"))
+    open(os.path.join(self.checkpoint_dir, checkpoint.TMP_PREFIX + "latest"), "w").close()
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+    train_episode(mc, episode_idx=1, checkpoint_dir=self.checkpoint_dir)
+
+    self.assertEqual(sorted(os.listdir(self.checkpoint_dir)), ["checkpoint_1", checkpoint.LATEST])
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import collisions, constants, racetracks
+from environment import Racetrack, RacetrackStrict
+
+
+# a grass wall in the middle of a straight track
+WALL_TRACK = np.array([
+  [0, 0, 3],
+  [0, 0, 3],
+  [0, 0, 0],
+  [1, 1, 0],
+  [0, 0, 0],
+  [0, 0, 0],
+  [2, 2, 0]
+], dtype=np.int32)
+
+
+class TestCollisions(unittest.TestCase):
+
+  def test_path_offsets(self):
+
+    self.assertEqual(collisions.get_path_offsets(4, 0), [(-1, 0), (-2, 0), (-3, 0), (-4, 0)])
+    self.assertEqual(collisions.get_path_offsets(0, 2), [(0, 1), (0, 2)])
+    # a diagonal move does not touch the cells that share the corner it crosses
+    self.assertEqual(collisions.get_path_offsets(1, 1), [(-1, 1)])
+    self.assertEqual(collisions.get_path_offsets(2, 1), [(-1, 0), (-1, 1), (-2, 1)])
+    self.assertEqual(collisions.get_path_offsets(0, 0), [])
+
+  def test_path_events(self):
+
+    events = collisions.build_path_events(WALL_TRACK)
+
+    self.assertEqual(events[6, 0, 4, 0], collisions.CRASH)
+    self.assertEqual(events[6, 2, 4, 0], collisions.CLEAR)
+    self.assertEqual(events[2, 2, 1, 0], collisions.FINISH)
+    # leaving the map to the right next to the finish line counts as a finish
+    self.assertEqual(events[0, 0, 0, 4], collisions.FINISH)
+    self.assertEqual(events[2, 0, 0, 4], collisions.CRASH)
+    self.assertEqual(events[0, 0, 1, 0], collisions.CRASH)
+
+  def test_jump_over_grass(self):
+
+    for swept_path in [False, True]:
+
+      env = RacetrackStrict(WALL_TRACK, swept_path=swept_path)
+      env.position = (6, 0)
+      env.velocity = (4, 0)
+
+      reward = env.act(0, 0)
+
+      if swept_path:
+        self.assertEqual(reward, env.OUT_OF_BOUNDS_REWARD)
+        self.assertTrue(env.done)
+      else:
+        self.assertEqual(reward, env.STEP_REWARD)
+        self.assertEqual(env.position, (2, 0))
+
+  def test_same_landing_checks(self):
+
+    # checking the whole path never finds fewer events than checking the landing cell
+    for track in racetracks.TRACKS.values():
+
+      events = collisions.build_path_events(track)
+      env = Racetrack(track)
+
+      for x, y in zip(*np.where(track != constants.GRASS_VALUE)):
+        for x_velocity in range(5):
+          for y_velocity in range(int(x_velocity == 0), 5):
+
+            env.position = (x - x_velocity, y + y_velocity)
+
+            if env.check_finish():
+              landing = collisions.FINISH
+            elif env.check_position_out_of_bounds() or env.check_position_grass():
+              landing = collisions.CRASH
+            else:
+              landing = collisions.CLEAR
+
+            if landing != collisions.CLEAR:
+              self.assertNotEqual(events[x, y, x_velocity, y_velocity], collisions.CLEAR)
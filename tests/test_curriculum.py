@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+import constants, curriculum, racetracks
+from environment import Racetrack, RacetrackStrict
+from trajectory import Trajectory
+
+
+def make_trajectory(rewards):
+
+  trajectory = Trajectory()
+
+  for reward in rewards:
+    trajectory.append((0, 0, 0, 0), 0, reward)
+
+  return trajectory
+
+
+class TestCurriculum(unittest.TestCase):
+
+  def test_distances(self):
+
+    track = np.array([
+      [0, 0, 3],
+      [0, 1, 3],
+      [0, 1, 0],
+      [2, 1, 0]
+    ], dtype=np.int32)
+
+    distances = curriculum.compute_distances(track)
+
+    np.testing.assert_array_equal(distances, [
+      [2, 1, 0],
+      [3, -1, 0],
+      [4, -1, 1],
+      [5, -1, 2]
+    ])
+
+  def test_levels(self):
+
+    env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2], seed=1)
+    start_coordinates = list(env.start_coordinates)
+    run_curriculum = curriculum.Curriculum(env, num_levels=5)
+
+    sizes = [len(run_curriculum.get_level_coordinates(level)) for level in range(4)]
+    self.assertEqual(sizes, sorted(sizes))
+    self.assertEqual(run_curriculum.get_level_coordinates(4), start_coordinates)
+
+    # the first level starts next to the finish
+    for _ in range(20):
+      env.reset()
+      self.assertLessEqual(run_curriculum.distances[env.position], run_curriculum.max_distance / 5)
+      self.assertNotEqual(env.racetrack[env.position], constants.GRASS_VALUE)
+
+  def test_add_episode(self):
+
+    env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2], seed=1)
+    run_curriculum = curriculum.Curriculum(env, num_levels=3, target_finish_rate=0.5, window=4)
+
+    crashed = make_trajectory([-1, -50])
+    finished = make_trajectory([-1, -1])
+
+    results = [run_curriculum.add_episode(trajectory) for trajectory in [crashed, crashed, finished, finished]]
+    self.assertEqual(results, [False, False, False, True])
+    self.assertEqual(run_curriculum.level, 1)
+
+    # the window starts over on each level
+    results = [run_curriculum.add_episode(finished) for _ in range(4)]
+    self.assertEqual(results, [False, False, False, True])
+    self.assertTrue(run_curriculum.is_done())
+    self.assertFalse(run_curriculum.add_episode(finished))
+
+  def test_racetrack_off_track(self):
+
+    # Racetrack episodes always reach the finish, leaving the track on the way does not count as finished
+    env = Racetrack(racetracks.TRACKS[constants.RACETRACK_1], seed=1)
+    run_curriculum = curriculum.Curriculum(env, window=1)
+
+    self.assertFalse(run_curriculum.add_episode(make_trajectory([-50, -1])))
+    self.assertTrue(run_curriculum.add_episode(make_trajectory([-1, -1])))
@@ -1,6 +1,36 @@
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import constants, racetracks
-from environment import RacetrackStrict, Racetrack
+from environment import BatchRacetrack, BatchRacetrackStrict, RacetrackStrict, Racetrack
+
+
+def play_single(env, actions):
+
+  trajectory = []
+
+  for x_change, y_change in actions:
+    state = tuple(int(value) for value in env.get_state())
+    reward = env.act(x_change, y_change)
+    trajectory.append((state, reward, env.done))
+
+    if env.done:
+      env.reset()
+
+  return trajectory
+
+
+def play_batch(env, actions):
+
+  trajectory = []
+
+  for action in actions:
+    state = tuple(int(value) for value in env.get_states()[0])
+    rewards, finished = env.act(action[np.newaxis])
+    trajectory.append((state, int(rewards[0]), bool(finished[0])))
+
+  return trajectory
 
 
 class TestRacetrack(unittest.TestCase):
@@ -19,6 +49,26 @@ class TestRacetrack(unittest.TestCase):
       while not env.done:
         env.act(0, 0)
 
+  def test_compiled(self):
+
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_dir)
+
+    env = Racetrack(racetracks.TRACKS[constants.RACETRACK_2], compiled=True, cache_dir=cache_dir)
+
+    for i in range(20):
+      env.reset()
+
+      while not env.done:
+        reward = env.act(0, 0)
+        self.assertIn(reward, [Racetrack.STEP_REWARD, Racetrack.OUT_OF_BOUNDS_REWARD])
+
+    # the second environment loads the table from the cache
+    cached_env = Racetrack(racetracks.TRACKS[constants.RACETRACK_2], compiled=True, cache_dir=cache_dir)
+
+    self.assertIsInstance(cached_env.transitions.next_states, np.memmap)
+    np.testing.assert_array_equal(env.transitions.next_states, cached_env.transitions.next_states)
+
 class TestRacetrackStrict(unittest.TestCase):
 
   def test_load_racetrack(self):
@@ -40,6 +90,24 @@ class TestRacetrackStrict(unittest.TestCase):
     while not env.done:
       self.assertEqual(env.act(0, 1), RacetrackStrict.STEP_REWARD)
 
+  def test_correct_route_compiled(self):
+
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_dir)
+
+    env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2], compiled=True, cache_dir=cache_dir)
+    env.position = (31, 3)
+
+    self.assertEqual(env.act(1, 0), RacetrackStrict.STEP_REWARD)
+
+    for _ in range(27):
+      self.assertEqual(env.act(0, 0), RacetrackStrict.STEP_REWARD)
+
+    self.assertEqual(env.act(-1, 1), RacetrackStrict.STEP_REWARD)
+
+    while not env.done:
+      self.assertEqual(env.act(0, 1), RacetrackStrict.STEP_REWARD)
+
   def test_collision(self):
 
     env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2])
@@ -55,4 +123,72 @@ class TestRacetrackStrict(unittest.TestCase):
     for i in range(5):
       for j in range(3):
         env.position = (i, racetracks.TRACKS[constants.RACETRACK_2].shape[1] + j)
-        self.assertEqual(env.check_finish(), True)
\ No newline at end of file
+        self.assertEqual(env.check_finish(), True)
+
+class TestBatchRacetrack(unittest.TestCase):
+
+  def test_same_as_racetrack(self):
+
+    for track in racetracks.TRACKS.values():
+
+      actions = np.random.RandomState(1).randint(-1, 2, size=(2000, 2))
+
+      single = play_single(Racetrack(track, seed=2), actions)
+      batch = play_batch(BatchRacetrack(track, 1, seed=2), actions)
+
+      self.assertEqual(single, batch)
+
+  def test_same_as_racetrack_swept_path(self):
+
+    for track in racetracks.TRACKS.values():
+
+      actions = np.random.RandomState(1).randint(-1, 2, size=(2000, 2))
+
+      single = play_single(Racetrack(track, swept_path=True, seed=2), actions)
+      batch = play_batch(BatchRacetrack(track, 1, swept_path=True, seed=2), actions)
+
+      self.assertEqual(single, batch)
+
+  def test_eventual_finish(self):
+
+    env = BatchRacetrack(racetracks.TRACKS[constants.RACETRACK_2], 20, auto_reset=False)
+
+    while not np.all(env.done):
+      env.act(np.zeros((20, 2), dtype=np.int32))
+
+    # finished cars are frozen
+    rewards, finished = env.act(np.zeros((20, 2), dtype=np.int32))
+    self.assertTrue(np.all(rewards == 0))
+    self.assertFalse(np.any(finished))
+
+  def test_auto_reset(self):
+
+    env = BatchRacetrack(racetracks.TRACKS[constants.RACETRACK_1], 10)
+
+    for _ in range(50):
+      env.act(np.ones((10, 2), dtype=np.int32))
+      self.assertFalse(np.any(env.done))
+
+class TestBatchRacetrackStrict(unittest.TestCase):
+
+  def test_same_as_racetrack_strict(self):
+
+    for track in racetracks.TRACKS.values():
+
+      actions = np.random.RandomState(1).randint(-1, 2, size=(2000, 2))
+
+      single = play_single(RacetrackStrict(track, seed=2), actions)
+      batch = play_batch(BatchRacetrackStrict(track, 1, seed=2), actions)
+
+      self.assertEqual(single, batch)
+
+  def test_same_as_racetrack_strict_swept_path(self):
+
+    for track in racetracks.TRACKS.values():
+
+      actions = np.random.RandomState(1).randint(-1, 2, size=(2000, 2))
+
+      single = play_single(RacetrackStrict(track, swept_path=True, seed=2), actions)
+      batch = play_batch(BatchRacetrackStrict(track, 1, swept_path=True, seed=2), actions)
+
+      self.assertEqual(single, batch)
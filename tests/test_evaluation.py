@@ -0,0 +1,93 @@
+import unittest
+import numpy as np
+import constants, evaluation, racetracks, trackfile, transitions
+from planner import ValueIteration
+
+
+class TestEvaluation(unittest.TestCase):
+
+  def test_optimal_policy(self):
+
+    racetrack = racetracks.TRACKS[constants.RACETRACK_2]
+    model = transitions.TransitionModel(racetrack, strict=True)
+
+    planner = ValueIteration(model)
+    planner.solve()
+
+    results = evaluation.evaluate(planner.policy, racetrack, num_rollouts=2, strict=True)
+
+    # the strict environment is deterministic, so all rollouts should match the planner
+    start_values = [planner.values[model.get_state_index((x, y, 0, 0))]
+                    for x, y in np.argwhere(racetrack == constants.START_VALUE)]
+
+    self.assertEqual(results["finish_rate"], 1.0)
+    self.assertEqual(results["off_track_rate"], 0.0)
+    self.assertAlmostEqual(results["mean_return"], np.mean(start_values), places=4)
+
+  def test_crash(self):
+
+    racetrack = racetracks.TRACKS[constants.RACETRACK_1]
+
+    # always accelerate upwards
+    policy = np.full(racetrack.shape + (5, 5), 1, dtype=np.int32)
+
+    results = evaluation.evaluate(policy, racetrack, num_rollouts=1, strict=True)
+
+    self.assertEqual(results["finish_rate"], 0.0)
+    self.assertEqual(results["num_rollouts"], np.sum(racetrack == constants.START_VALUE))
+
+  def test_swept_path_finish(self):
+
+    # accelerating to the right passes through the finish and stops behind it
+    racetrack = trackfile.from_text("S...F...")
+    policy = np.full(racetrack.shape + (5, 5), 1, dtype=np.int32)
+
+    results = evaluation.evaluate(policy, racetrack, num_rollouts=1, strict=True, swept_path=True)
+
+    self.assertEqual(results["finish_rate"], 1.0)
+    self.assertEqual(results["mean_length"], 3)
+
+  def test_max_steps(self):
+
+    racetrack = racetracks.TRACKS[constants.RACETRACK_1]
+
+    # never accelerate
+    policy = np.full(racetrack.shape + (5, 5), 3, dtype=np.int32)
+
+    results = evaluation.evaluate(policy, racetrack, num_rollouts=3, max_steps=2)
+
+    self.assertLessEqual(results["length_p95"], 2)
+    self.assertEqual(results["finish_rate"], 0.0)
+
+  def test_async(self):
+
+    racetrack = racetracks.TRACKS[constants.RACETRACK_1]
+    policy = np.full(racetrack.shape + (5, 5), 3, dtype=np.int32)
+
+    evaluator = evaluation.AsyncEvaluator(racetrack, num_rollouts=2, strict=True)
+    evaluator.submit(policy, 10)
+    evaluator.submit(policy, 20)
+
+    results = evaluator.get_results(wait=True)
+    evaluator.close()
+
+    self.assertEqual([episode_idx for episode_idx, _ in results], [10, 20])
+    self.assertEqual(results[0][1].keys(), evaluation.evaluate(policy, racetrack, num_rollouts=2, strict=True).keys())
+    self.assertEqual(results[0][1]["num_rollouts"], 2 * np.sum(racetrack == constants.START_VALUE))
+
+  def test_async_seed(self):
+
+    racetrack = racetracks.TRACKS[constants.RACETRACK_1]
+    policy = np.full(racetrack.shape + (5, 5), 1, dtype=np.int32)
+
+    all_results = []
+
+    # seeded with a child sequence, like in solve_racetrack
+    for _ in range(2):
+      evaluator = evaluation.AsyncEvaluator(racetrack, num_rollouts=5, seed=np.random.SeedSequence(3).spawn(3)[2])
+      evaluator.submit(policy, 10)
+      evaluator.submit(policy, 20)
+      all_results.append(evaluator.get_results(wait=True))
+      evaluator.close()
+
+    self.assertEqual(all_results[0], all_results[1])
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestImports(unittest.TestCase):
+
+  def test_core_modules_without_plotting(self):
+
+    code = "import sys; import agent, checkpoint, curriculum, environment, evaluation, kernels, parallel, planner, " \
+           "replay, rollouts, stats, sweep, trackfile, transitions; " \
+           "print('matplotlib' in sys.modules, 'numba' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+
+    self.assertEqual(output.stdout.split(), ["False", "False"])
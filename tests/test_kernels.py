@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+import agent, constants, kernels, racetracks
+from environment import Racetrack, RacetrackStrict
+
+
+def play_reference(mc, num_episodes, explore):
+  """
+  Play episodes with MonteCarlo.play_episode without learning.
+  :param mc:              Monte Carlo agent.
+  :param num_episodes:    Number of episodes.
+  :param explore:         Use exploration policy.
+  :return:                List of trajectories.
+  """
+
+  trajectories = []
+
+  for i in range(num_episodes):
+
+    if i > 0:
+      mc.env.reset()
+
+    trajectories.append(mc.play_episode(explore=explore, learn=False)[1])
+
+  return trajectories
+
+
+class TestKernels(unittest.TestCase):
+
+  def check_parity(self, env_class, swept_path, explore, num_episodes=20):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    policy = np.random.default_rng(0).integers(0, agent.MonteCarlo.NUM_ACTIONS, size=track.shape + (5, 5))
+
+    agents = []
+
+    for _ in range(2):
+      mc = agent.MonteCarlo(env_class(track, swept_path=swept_path, seed=1), 0.3, seed=2)
+      mc.policy[...] = policy
+      agents.append(mc)
+
+    references = play_reference(agents[0], num_episodes, explore)
+    trajectory, lengths = kernels.rollout(agents[1], num_episodes=num_episodes, explore=explore)
+
+    self.assertEqual(lengths.tolist(), [len(reference) for reference in references])
+
+    for name in ["get_states", "get_actions", "get_rewards", "get_probabilities"]:
+      expected = np.concatenate([getattr(reference, name)() for reference in references])
+      np.testing.assert_array_equal(getattr(trajectory, name)(), expected)
+
+    # both leave the environment and the random number generators in the same state
+    self.assertEqual(agents[0].env.get_state(), agents[1].env.get_state())
+    self.assertTrue(agents[1].env.done)
+    self.assertEqual(agents[0].env.random.uniform(), agents[1].env.random.uniform())
+    self.assertEqual(agents[0].random.uniform(), agents[1].random.uniform())
+
+  def test_racetrack(self):
+
+    self.check_parity(Racetrack, False, True)
+    self.check_parity(Racetrack, False, False)
+
+  def test_racetrack_strict(self):
+
+    self.check_parity(RacetrackStrict, False, True)
+    self.check_parity(RacetrackStrict, False, False)
+
+  def test_swept_path(self):
+
+    self.check_parity(Racetrack, True, True)
+    self.check_parity(RacetrackStrict, True, True)
+
+  def test_agent_jit(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    agents = [agent.MonteCarlo(Racetrack(track, seed=1), 0.1, seed=2, jit=jit) for jit in [False, True]]
+
+    for mc in agents:
+      for _ in range(30):
+        mc.play_episode()
+        mc.update_policy()
+        mc.env.reset()
+
+    np.testing.assert_array_equal(agents[0].action_values, agents[1].action_values)
+    np.testing.assert_array_equal(agents[0].policy, agents[1].policy)
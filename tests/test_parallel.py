@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+import constants, parallel, racetracks, utils
+from agent import MonteCarlo
+from environment import Racetrack
+
+
+class TestParallelMonteCarlo(unittest.TestCase):
+
+  def test_deterministic(self):
+
+    action_values = []
+
+    for _ in range(2):
+
+      mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+      trainer = parallel.ParallelMonteCarlo(mc, 2, episodes_per_round=10, seed=3)
+      self.addCleanup(trainer.close)
+
+      returns = trainer.train(100)
+
+      self.assertEqual(len(returns), 100)
+      self.assertEqual(np.sum(mc.action_counts), trainer.num_steps)
+      action_values.append(mc.action_values)
+
+    np.testing.assert_array_equal(action_values[0], action_values[1])
+
+  def test_same_as_sequential_update(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    parallel.init_worker(track, False, 0.5, False, 0.5)
+    episodes = parallel.play_episodes((parallel.worker_agent.policy, 50, np.random.SeedSequence(0)))
+
+    mc = MonteCarlo(Racetrack(track), 0.5)
+    reference = MonteCarlo(Racetrack(track), 0.5)
+
+    for indices, returns in episodes:
+
+      mc.update(indices, returns)
+
+      for index, ret in zip(indices, returns):
+        state_action = np.unravel_index(index, reference.action_values.shape)
+        reference.action_values[state_action] += utils.update_mean(float(ret), reference.action_values[state_action],
+                                                                   reference.action_counts[state_action])
+        reference.action_counts[state_action] += 1
+
+    np.testing.assert_array_equal(mc.action_values, reference.action_values)
+    np.testing.assert_array_equal(mc.action_counts, reference.action_counts)
+
+
+class TestAsyncMonteCarlo(unittest.TestCase):
+
+  def test_train(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+    trainer = parallel.AsyncMonteCarlo(mc, 2, episodes_per_batch=5, max_queue_size=2, seed=3)
+    self.addCleanup(trainer.close)
+
+    returns = trainer.train(100)
+
+    self.assertEqual(len(returns), 100)
+    self.assertEqual(np.sum(mc.action_counts), trainer.num_steps)
+    np.testing.assert_array_equal(mc.policy, np.argmax(mc.action_values, axis=-1))
+
+    # actors wait for the learner, so the queue never holds more batches than its size
+    metrics = trainer.get_metrics()
+
+    self.assertEqual(metrics["batches"], 20)
+    self.assertLessEqual(metrics["mean_queue_depth"], 2)
+    self.assertGreaterEqual(metrics["mean_staleness"], 0)
+
+    # the learner publishes its policy after every batch
+    self.assertEqual(trainer.version.value, 21)
+    np.testing.assert_array_equal(trainer.published, mc.policy)
+
+  def test_actor_failure(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+    trainer = parallel.AsyncMonteCarlo(mc, 1, episodes_per_batch=5, max_queue_size=1, seed=3)
+    self.addCleanup(trainer.close)
+
+    trainer.train(10)
+
+    # the learner stops waiting for batches when an actor dies instead of hanging
+    trainer.processes[0].terminate()
+    trainer.processes[0].join()
+
+    with self.assertRaises(RuntimeError):
+      trainer.train(100)
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+import constants, racetracks, transitions
+from agent import MonteCarlo
+from environment import RacetrackStrict, Racetrack
+from planner import ValueIteration
+
+
+class TestValueIteration(unittest.TestCase):
+
+  def test_prioritized_sweeping(self):
+
+    for strict in [False, True]:
+
+      model = transitions.TransitionModel(racetracks.TRACKS[constants.RACETRACK_1], strict=strict)
+
+      planner = ValueIteration(model)
+      planner.solve()
+
+      # one state at a time and in batches
+      for batch_size in [1, None]:
+        prioritized_planner = ValueIteration(model, prioritized=True, batch_size=batch_size)
+        prioritized_planner.solve()
+
+        np.testing.assert_allclose(planner.values, prioritized_planner.values, atol=1e-4)
+
+  def test_optimal_policy(self):
+
+    env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2])
+
+    planner = ValueIteration(transitions.from_env(env))
+    planner.solve()
+
+    mc = MonteCarlo(env, 0.1)
+    mc.policy[...] = planner.policy
+
+    for start_coordinates in env.start_coordinates:
+
+      env.reset()
+      env.position = start_coordinates
+
+      ret, _ = mc.play_episode(explore=False, learn=False)
+      value = planner.values[np.ravel_multi_index(start_coordinates + (0, 0), planner.model.shape)]
+
+      self.assertEqual(ret, value)
+      self.assertGreater(ret, RacetrackStrict.OUT_OF_BOUNDS_REWARD)
+
+  def test_transition_model(self):
+
+    env = Racetrack(racetracks.TRACKS[constants.RACETRACK_1])
+    model = transitions.from_env(env)
+
+    self.assertEqual(model.next_states.shape, (model.num_states, model.NUM_ACTIONS, len(model.probabilities)))
+    self.assertAlmostEqual(np.sum(model.probabilities), 1.0)
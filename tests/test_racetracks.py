@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+import constants, evaluation, racetracks, transitions
+from planner import ValueIteration
+
+
+class TestGenerate(unittest.TestCase):
+
+  def test_valid(self):
+
+    for size in [16, 32, 100, 512]:
+      for seed in range(5):
+
+        track = racetracks.generate(size, seed=seed)
+
+        self.assertEqual(track.shape, (size, size))
+        self.assertTrue(np.any(track == constants.START_VALUE))
+        self.assertTrue(np.any(track == constants.END_VALUE))
+        self.assertTrue(racetracks.is_reachable(track))
+
+  def test_seed(self):
+
+    np.testing.assert_equal(racetracks.generate(64, seed=1), racetracks.generate(64, seed=1))
+
+  def test_not_reachable(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1].copy()
+    track[3] = constants.GRASS_VALUE
+
+    self.assertFalse(racetracks.is_reachable(track))
+
+    # the start cell on the left is cut off, the one on the right is next to the finish
+    track = np.array([
+      [1, 1, 0, 3],
+      [2, 1, 0, 2]
+    ], dtype=np.int32)
+
+    self.assertFalse(racetracks.is_reachable(track))
+    track[0, 1] = constants.TRACK_VALUE
+    self.assertTrue(racetracks.is_reachable(track))
+
+  def test_solvable(self):
+
+    track = racetracks.generate(24, seed=0)
+
+    planner = ValueIteration(transitions.TransitionModel(track, strict=True))
+    planner.solve()
+
+    results = evaluation.evaluate(planner.policy, track, num_rollouts=2, strict=True)
+
+    self.assertEqual(results["finish_rate"], 1.0)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import constants, racetracks, replay
+from agent import MonteCarlo, OffPolicyMonteCarlo
+from environment import Racetrack, RacetrackStrict
+
+
+def record(mc, path, num_episodes):
+
+  mc.recorder = replay.Recorder(path)
+  trajectories = []
+
+  for _ in range(num_episodes):
+    _, trajectory = mc.play_episode()
+    mc.update_policy()
+    mc.env.reset()
+    trajectories.append(trajectory)
+
+  mc.recorder.close()
+  mc.recorder = None
+
+  return trajectories
+
+
+class TestReplay(unittest.TestCase):
+
+  def setUp(self):
+
+    self.log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.log_dir)
+    self.path = os.path.join(self.log_dir, "episodes.log")
+
+  def test_read_back(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_2], seed=0), 0.3, seed=1)
+    trajectories = record(mc, self.path, 50)
+
+    log = replay.ReplayLog(self.path)
+
+    self.assertEqual(len(log), 50)
+    self.assertEqual(os.path.getsize(self.path),
+                     replay.ROW_SIZE * (1 + 50 * replay.HEADER_ROWS + sum(len(t) for t in trajectories)))
+    np.testing.assert_array_equal(log.get_episode_returns(), [np.sum(t.get_rewards()) for t in trajectories])
+
+    for i, trajectory in enumerate(trajectories):
+      loaded = log.get_trajectory(i)
+
+      self.assertEqual(list(loaded), list(trajectory))
+      np.testing.assert_array_equal(loaded.get_probabilities(), trajectory.get_probabilities())
+
+  def test_append_after_partial_episode(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1], seed=0), 0.3, seed=1)
+    trajectories = record(mc, self.path, 10)
+
+    # simulate a recording process that was killed in the middle of an episode
+    with open(self.path, "ab") as file:
+      file.write(b"\xff" * 22)
+
+    self.assertEqual(len(replay.ReplayLog(self.path)), 10)
+
+    trajectories += record(mc, self.path, 5)
+    log = replay.ReplayLog(self.path)
+
+    self.assertEqual(len(log), 15)
+    self.assertEqual(list(log.get_trajectory(14)), list(trajectories[14]))
+
+  def test_replay_on_policy(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    mc = MonteCarlo(Racetrack(track, seed=0), 0.5, seed=1)
+    record(mc, self.path, 300)
+
+    replayed = MonteCarlo(Racetrack(track), 0.5)
+    replay.replay(replay.ReplayLog(self.path), replayed, episodes_per_batch=70)
+
+    np.testing.assert_array_equal(mc.action_counts, replayed.action_counts)
+    np.testing.assert_allclose(mc.action_values, replayed.action_values, rtol=1e-5)
+
+  def test_replay_off_policy(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    mc = OffPolicyMonteCarlo(RacetrackStrict(track, seed=0), 0.3, seed=1)
+    record(mc, self.path, 300)
+
+    replayed = OffPolicyMonteCarlo(RacetrackStrict(track), 0.3)
+    replay.replay(replay.ReplayLog(self.path), replayed)
+
+    np.testing.assert_array_equal(mc.action_values, replayed.action_values)
+    np.testing.assert_array_equal(mc.policy, replayed.policy)
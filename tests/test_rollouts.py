@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import agent, constants, evaluation, racetracks, rollouts
+from environment import RacetrackStrict
+
+
+class TestRollouts(unittest.TestCase):
+
+  def test_all_states(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    states = rollouts.get_all_states(track)
+    num_cells = np.sum((track != constants.GRASS_VALUE) & (track != constants.END_VALUE))
+
+    self.assertEqual(states.shape, (num_cells * 25, 4))
+    self.assertEqual(len(np.unique(states, axis=0)), len(states))
+
+  def test_visited_states(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    policy = np.zeros(track.shape + (5, 5), dtype=np.int32)
+    states = rollouts.get_visited_states(policy, track, num_rollouts=2, seed=0)
+
+    visited = set(map(tuple, states.tolist()))
+
+    for x, y in np.argwhere(track == constants.START_VALUE).tolist():
+      self.assertIn((x, y, 0, 0), visited)
+
+    # rollouts start only from the given start coordinates
+    start_coordinates = np.argwhere(track == constants.START_VALUE)[:1]
+    states = rollouts.get_visited_states(policy, track, num_rollouts=2, seed=0, start_coordinates=start_coordinates)
+    starts = states[(track[states[:, 0], states[:, 1]] == constants.START_VALUE) & (states[:, 2] == 0) &
+                    (states[:, 3] == 0)]
+
+    np.testing.assert_array_equal(starts, [np.concatenate([start_coordinates[0], [0, 0]])])
+
+  def test_same_as_racetrack_strict(self):
+
+    # a car that is already moving never stops, so the strict environment is deterministic
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    policy = np.zeros(track.shape + (5, 5), dtype=np.int32)
+    states = rollouts.get_all_states(track)
+    states = states[(states[:, 2] == 2) & (states[:, 3] == 2)][:20]
+
+    action_values = rollouts.estimate_action_values(policy, track, states, num_rollouts=2, strict=True, batch_size=100,
+                                                    seed=0)
+
+    env = RacetrackStrict(track, seed=0)
+
+    for state, values in zip(states.tolist(), action_values):
+      for action in range(agent.MonteCarlo.NUM_ACTIONS):
+
+        env.reset()
+        env.position = tuple(state[:2])
+        env.velocity = tuple(state[2:])
+
+        ret = env.act(*agent.MonteCarlo.ACTION_TO_ACCELERATION[action])
+
+        while not env.done:
+          ret += env.act(*agent.MonteCarlo.ACTION_TO_ACCELERATION[policy[env.get_state()]])
+
+        self.assertEqual(values[action], ret)
+
+  def test_improve_policy(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    policy = np.zeros(track.shape + (5, 5), dtype=np.int32)
+    states = rollouts.get_all_states(track)
+
+    for iteration in range(20):
+      _, num_changed = rollouts.improve_policy(policy, track, states=states, num_rollouts=1, strict=True,
+                                               max_steps=track.size, seed=iteration)
+      if num_changed == 0:
+        break
+
+    results = evaluation.evaluate(policy, track, num_rollouts=5, strict=True, max_steps=track.size, seed=0)
+    self.assertEqual(results["finish_rate"], 1.0)
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import unittest
+import numpy as np
+import constants, parallel, racetracks, shared
+from agent import MonteCarlo
+from environment import Racetrack
+
+
+def crash_worker(name, racetrack_shape):
+
+  tables = shared.SharedTables(racetrack_shape, name=name)
+  tables.action_counts[0, 0, 0, 0, 0] = 7
+  os._exit(1)
+
+
+class TestSharedTables(unittest.TestCase):
+
+  def test_attach(self):
+
+    tables = shared.SharedTables((3, 4), init=-10)
+    self.addCleanup(tables.unlink)
+    self.addCleanup(tables.close)
+
+    attached = shared.SharedTables((3, 4), name=tables.name)
+    attached.action_values[1, 2, 3, 4, 5] = 1.5
+    attached.close()
+
+    self.assertEqual(tables.action_values[1, 2, 3, 4, 5], 1.5)
+    self.assertEqual(tables.action_values[0, 0, 0, 0, 0], 10)
+
+  def test_survives_worker_crash(self):
+
+    tables = shared.SharedTables((3, 4))
+    self.addCleanup(tables.unlink)
+    self.addCleanup(tables.close)
+
+    process = multiprocessing.Process(target=crash_worker, args=(tables.name, (3, 4)))
+    process.start()
+    process.join()
+
+    self.assertEqual(process.exitcode, 1)
+    self.assertEqual(tables.action_counts[0, 0, 0, 0, 0], 7)
+
+  def test_hogwild(self):
+
+    mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5)
+    trainer = parallel.HogwildMonteCarlo(mc, 2, seed=0)
+
+    self.assertEqual(trainer.train(50), 0)
+    self.assertGreater(np.sum(mc.action_counts), 50)
+    np.testing.assert_array_equal(mc.policy, np.argmax(mc.action_values, axis=-1))
+
+    trainer.close()
+
+    self.assertIsNone(mc.tables)
+    self.assertGreater(np.sum(mc.action_counts), 50)
+
+    # the shared tables replace only dense tables
+    with self.assertRaises(AssertionError):
+      parallel.HogwildMonteCarlo(MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_1]), 0.5,
+                                            storage_type="masked"), 2)
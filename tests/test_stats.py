@@ -0,0 +1,81 @@
+import io
+import json
+import unittest
+import numpy as np
+import agent, constants, racetracks, stats
+from environment import Racetrack, RacetrackStrict
+
+
+class TestStats(unittest.TestCase):
+
+  def test_same_training(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_1]
+    agents = [agent.MonteCarlo(Racetrack(track, seed=1), 0.1, seed=2) for _ in range(2)]
+    run_stats = stats.Stats()
+
+    for _ in range(50):
+
+      agents[0].play_episode()
+      agents[0].update_policy()
+      agents[0].env.reset()
+
+      stats.play_episode(agents[1], run_stats)
+      agents[1].env.reset()
+
+    np.testing.assert_array_equal(agents[0].action_values, agents[1].action_values)
+    np.testing.assert_array_equal(agents[0].policy, agents[1].policy)
+
+    for phase in [stats.PLAY, stats.RETURNS, stats.LEARN, stats.POLICY]:
+      self.assertEqual(run_stats.calls[phase], 50)
+
+  def test_counters(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+    mc = agent.MonteCarlo(RacetrackStrict(track, seed=1), 0.1, seed=2)
+    run_stats = stats.Stats(sample_frequency=2)
+
+    num_steps = 0
+    num_finished = 0
+    lengths = []
+
+    for i in range(20):
+
+      stats.play_episode(mc, run_stats)
+
+      rewards = mc.trajectory.get_rewards()
+      num_steps += len(rewards)
+      num_finished += rewards[-1] == Racetrack.STEP_REWARD
+
+      if i % 2 == 0:
+        lengths.append(len(rewards))
+
+      mc.env.reset()
+
+    summary = run_stats.get_summary()
+
+    self.assertEqual(summary["episodes"], 20)
+    self.assertEqual(summary["steps"], num_steps)
+    self.assertEqual(summary["finished"], num_finished)
+    self.assertEqual(summary["off_track"], 20 - num_finished)
+    self.assertEqual(sum(count for _, count in summary["episode_lengths"]), len(lengths))
+
+  def test_write(self):
+
+    run_stats = stats.Stats()
+
+    with run_stats.timer(stats.EVALUATION):
+      pass
+
+    with stats.timer(None, stats.EVALUATION):
+      pass
+
+    file = io.StringIO()
+    run_stats.write(file, episode=10)
+    run_stats.write(file, episode=20)
+
+    lines = [json.loads(line) for line in file.getvalue().splitlines()]
+
+    self.assertEqual([line["episode"] for line in lines], [10, 20])
+    self.assertEqual(lines[0]["calls"], {stats.EVALUATION: 1})
+    self.assertEqual(lines[0]["episode_lengths"], [])
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import constants, racetracks, storage
+from agent import MonteCarlo
+from environment import Racetrack
+
+
+def train(storage_type, num_episodes):
+
+  mc = MonteCarlo(Racetrack(racetracks.TRACKS[constants.RACETRACK_2], seed=0), 0.5, storage_type=storage_type,
+                  seed=1)
+
+  for _ in range(num_episodes):
+    mc.play_episode()
+    mc.update_policy()
+    mc.env.reset()
+
+  return mc
+
+
+class TestStorage(unittest.TestCase):
+
+  def test_same_as_dense(self):
+
+    dense = train("dense", 100)
+
+    for storage_type in ["masked", "hash"]:
+
+      mc = train(storage_type, 100)
+
+      np.testing.assert_array_equal(dense.action_values, mc.action_values)
+      np.testing.assert_array_equal(dense.action_counts, mc.action_counts)
+      np.testing.assert_array_equal(dense.policy, mc.policy)
+
+      policy = mc.policy.copy()
+      mc.update_policy(full=True)
+      np.testing.assert_array_equal(policy, mc.policy)
+
+  def test_hash_storage_grows(self):
+
+    hash_storage = storage.HashStorage(racetracks.TRACKS[constants.RACETRACK_1], capacity=1)
+    indices = np.arange(0, 50 * hash_storage.NUM_ACTIONS, hash_storage.NUM_ACTIONS)
+
+    locations = hash_storage.locate(indices, insert=True)
+
+    np.testing.assert_array_equal(locations, indices)
+    self.assertEqual(hash_storage.capacity, 64)
+    self.assertEqual(hash_storage.locate([50 * hash_storage.NUM_ACTIONS])[0], -1)
@@ -0,0 +1,53 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import agent, constants, evaluation, racetracks, sweep
+from environment import RacetrackStrict
+
+
+class TestSweep(unittest.TestCase):
+
+  def setUp(self):
+
+    self.track_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.track_dir)
+
+  def test_sweep(self):
+
+    tracks = [constants.RACETRACK_1, constants.RACETRACK_2]
+    runs = sweep.get_runs(tracks, [0.1, 0.3], [False, True], [0, 1])
+    track_paths = sweep.prepare_tracks(tracks, self.track_dir)
+
+    self.assertEqual(len(runs), 16)
+
+    def get_results(rows):
+      return sorted((row["track"], row["epsilon"], row["strict"], row["seed"], row["steps"], row["mean_return"])
+                    for row in rows)
+
+    # the results do not depend on the number of workers or on the runs a worker played before
+    results = get_results(sweep.run_sweep(runs, track_paths, 20, workers=2, evaluation_episodes=10))
+    reversed_results = get_results(sweep.run_sweep(runs[::-1], track_paths, 20, workers=1, evaluation_episodes=10))
+
+    self.assertEqual(results, reversed_results)
+
+    # and match a run trained on its own
+    env_seed, agent_seed = np.random.SeedSequence(1).spawn(2)
+    env = RacetrackStrict(racetracks.TRACKS[constants.RACETRACK_2], seed=env_seed)
+    mc = agent.MonteCarlo(env, 0.3, seed=agent_seed)
+    num_steps = 0
+
+    for _ in range(20):
+      mc.play_episode()
+      mc.update_policy()
+      num_steps += len(mc.trajectory)
+      env.reset()
+
+    mean_return = evaluation.evaluate(mc.policy, env.racetrack, num_rollouts=evaluation.get_num_rollouts(
+      env.racetrack, 10), strict=True, seed=1)["mean_return"]
+
+    self.assertIn((constants.RACETRACK_2, 0.3, True, 1, num_steps, mean_return), results)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import constants, evaluation, racetracks, trackfile
+from environment import Racetrack, BatchRacetrackStrict
+
+
+class TestTrackfile(unittest.TestCase):
+
+  def setUp(self):
+
+    self.track_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.track_dir)
+
+  def test_text(self):
+
+    track = racetracks.TRACKS[constants.RACETRACK_2]
+
+    for name in ["track.txt", "track.txt.gz"]:
+      path = os.path.join(self.track_dir, name)
+      trackfile.save(track, path)
+
+      loaded = trackfile.load(path)
+
+      np.testing.assert_array_equal(loaded.racetrack, track)
+      np.testing.assert_array_equal(loaded.start_coordinates, np.argwhere(track == constants.START_VALUE))
+
+  def test_binary(self):
+
+    track = racetracks.generate(64, seed=0)
+    path = os.path.join(self.track_dir, "track")
+
+    trackfile.save(track, path)
+    # saving again replaces the track
+    trackfile.save(track, path)
+
+    loaded = trackfile.get(path)
+
+    self.assertIsInstance(loaded.racetrack, np.memmap)
+    np.testing.assert_array_equal(loaded.racetrack, track)
+    np.testing.assert_array_equal(loaded.start_coordinates, np.argwhere(track == constants.START_VALUE))
+
+    # the environments take the saved start coordinates instead of scanning the map
+    env = Racetrack(loaded.racetrack, start_coordinates=loaded.start_coordinates, seed=0)
+    self.assertEqual(env.start_coordinates, Racetrack(track, seed=0).start_coordinates)
+
+    batch_env = BatchRacetrackStrict(loaded.racetrack, 4, start_coordinates=loaded.start_coordinates, seed=0)
+    self.assertEqual(batch_env.start_coordinates, env.start_coordinates)
+
+    # and so does the evaluation
+    start_coordinates = loaded.start_coordinates[:1]
+    positions = evaluation.get_start_coordinates(loaded.racetrack, 3, start_coordinates=start_coordinates)
+    np.testing.assert_array_equal(positions, np.repeat(start_coordinates, 3, axis=0))
+    self.assertEqual(evaluation.get_num_rollouts(loaded.racetrack, 5, start_coordinates=start_coordinates), 5)
+
+  def test_validate(self):
+
+    with self.assertRaises(AssertionError):
+      trackfile.from_text("S.F\nS.\n")
+
+    with self.assertRaises(AssertionError):
+      trackfile.from_text("S.X\n")
+
+    # no finish cells
+    with self.assertRaises(AssertionError):
+      trackfile.save(trackfile.from_text("..\nSS\n"), os.path.join(self.track_dir, "track.txt"))
+
+    # the finish is cut off by grass
+    path = os.path.join(self.track_dir, "track.txt")
+
+    with open(path, "w") as file:
+      file.write("..F\n###\nSS.\n")
+
+    with self.assertRaises(AssertionError):
+      trackfile.load(path)
+
+
+if __name__ == "__main__":
+  unittest.main()
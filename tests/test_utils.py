@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+import utils
+
+
+def compute_returns_reference(rewards, gamma):
+
+  returns = np.zeros(len(rewards))
+  ret = 0.0
+
+  for i in reversed(range(len(rewards))):
+    ret = rewards[i] + gamma * ret
+    returns[i] = ret
+
+  return returns
+
+
+class TestReturns(unittest.TestCase):
+
+  def test_discounted_returns(self):
+
+    rewards = np.random.default_rng(0).choice([-1, -50], size=3000, p=[0.9, 0.1])
+
+    # long episodes with a small discount take the path that does not scale the rewards
+    for length in [0, 1, 2, 17, 3000]:
+      for gamma in [1.0, 0.99, 0.5, 0.0]:
+        np.testing.assert_allclose(utils.compute_returns(rewards[:length], gamma=gamma),
+                                   compute_returns_reference(rewards[:length], gamma))
+
+  def test_episode_returns(self):
+
+    lengths = [3, 0, 1, 40, 7]
+    rewards = np.random.default_rng(0).normal(size=sum(lengths))
+    episodes = np.split(rewards, np.cumsum(lengths)[:-1])
+
+    for gamma in [1.0, 0.9]:
+      np.testing.assert_allclose(utils.compute_episode_returns(rewards, lengths, gamma=gamma),
+                                 np.concatenate([compute_returns_reference(episode, gamma) for episode in episodes]))
+
+
+if __name__ == "__main__":
+  unittest.main()
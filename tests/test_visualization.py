@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import agent, constants, racetracks, visualization
+from environment import Racetrack
+
+
+class TestVisualization(unittest.TestCase):
+
+  def setUp(self):
+
+    self.track = racetracks.TRACKS[constants.RACETRACK_1]
+    self.mc = agent.MonteCarlo(Racetrack(self.track, seed=1), 0.1, seed=2)
+    self.sequences = []
+
+    for _ in range(3):
+      self.sequences.append(self.mc.play_episode(learn=False)[1])
+      self.mc.env.reset()
+
+  def test_tile(self):
+
+    images = [np.full((2, 3), i, dtype=np.float64) for i in range(3)]
+    grid = visualization.tile(images, 2)
+
+    self.assertEqual(grid.shape, (5, 7))
+    self.assertTrue(np.all(grid[:2, :3] == 0))
+    self.assertTrue(np.all(grid[:2, 4:] == 1))
+    self.assertTrue(np.all(grid[3:, :3] == 2))
+    self.assertTrue(np.all(np.isnan(grid[2])))
+    self.assertTrue(np.all(np.isnan(grid[3:, 4:])))
+
+  def test_sequence_image(self):
+
+    image = visualization.get_sequence_image(self.track, self.sequences[0])
+
+    for state, _, _ in self.sequences[0]:
+      self.assertEqual(image[state[0], state[1]], constants.AGENT_VALUE)
+
+  def test_save(self):
+
+    with tempfile.TemporaryDirectory() as directory:
+
+      save_path = os.path.join(directory, "episode")
+
+      paths = visualization.save_sequences(self.track, self.sequences, save_path, file_format="png")
+      self.assertEqual(paths, [save_path + "_{:d}.png".format(i) for i in [1, 2, 3]])
+
+      paths += visualization.save_sequences(self.track, self.sequences, save_path, mode=visualization.GRID,
+                                            file_format="png")
+      paths += visualization.save_sequences(self.track, self.sequences, save_path, mode=visualization.PAGES)
+
+      policy_path = os.path.join(directory, "policy.png")
+      visualization.save_policy(self.mc.policy, self.track, policy_path)
+
+      for path in paths + [policy_path]:
+        self.assertGreater(os.path.getsize(path), 0)
@@ -0,0 +1,206 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import constants, racetracks
+
+
+VERSION = 1
+
+# text tracks are ASCII art with one character per cell, the first line is the top row
+CHARACTERS = {
+  constants.TRACK_VALUE: ".",
+  constants.GRASS_VALUE: "#",
+  constants.START_VALUE: "S",
+  constants.END_VALUE: "F"
+}
+VALUES = {character: value for value, character in CHARACTERS.items()}
+
+TEXT_EXTENSIONS = (".txt", ".txt.gz")
+
+# a binary track is a directory of uncompressed .npy files that can be memory-mapped
+META = "track.json"
+RACETRACK = "racetrack"
+START_COORDINATES = "start_coordinates"
+ARRAYS = [RACETRACK, START_COORDINATES]
+
+
+class Track:
+
+  def __init__(self, racetrack, start_coordinates=None):
+    """
+    A racetrack map with its start positions, which the environments, their worker processes and the evaluation
+    take instead of scanning the map.
+    :param racetrack:             Racetrack map.
+    :param start_coordinates:     Start positions of shape (num_starts, 2), found by scanning the map if None.
+    """
+
+    self.racetrack = racetrack
+    self.start_coordinates = start_coordinates
+
+    if start_coordinates is None:
+      self.start_coordinates = np.argwhere(racetrack == constants.START_VALUE)
+
+  @property
+  def shape(self):
+
+    return self.racetrack.shape
+
+
+def validate(racetrack):
+  """
+  Check that a map only contains known cell values, has start and finish cells and that the finish can be reached
+  from every start cell.
+  :param racetrack:     Racetrack map.
+  :return:              None.
+  """
+
+  assert racetrack.ndim == 2, "a racetrack is a 2D array"
+  assert np.all(np.isin(racetrack, list(CHARACTERS.keys()))), "unknown cell values"
+  assert np.any(racetrack == constants.START_VALUE), "no start cells"
+  assert np.any(racetrack == constants.END_VALUE), "no finish cells"
+  assert racetracks.is_reachable(racetrack), "the finish cannot be reached from every start cell"
+
+
+def to_text(racetrack):
+  """
+  Draw a map as ASCII art.
+  :param racetrack:     Racetrack map.
+  :return:              String with a line per row.
+  """
+
+  lookup = np.array([CHARACTERS[value] for value in range(len(CHARACTERS))])
+
+  return "\n".join("".join(row) for row in lookup[racetrack].tolist()) + "\n"
+
+
+def from_text(text):
+  """
+  Read a map drawn as ASCII art.
+  :param text:    String with a line per row, blank lines are ignored.
+  :return:        Racetrack map.
+  """
+
+  lines = [line.strip() for line in text.splitlines() if len(line.strip()) > 0]
+
+  assert len(lines) > 0, "empty racetrack"
+  assert all(len(line) == len(lines[0]) for line in lines), "all rows of a racetrack must have the same length"
+
+  unknown = set("".join(lines)) - set(VALUES.keys())
+  assert len(unknown) == 0, "unknown characters {:s}".format(", ".join(sorted(unknown)))
+
+  return np.array([[VALUES[character] for character in line] for line in lines], dtype=np.int32)
+
+
+def is_text_path(path):
+  """
+  Check if a path names a text track.
+  :param path:    Path.
+  :return:        True for .txt and .txt.gz files, otherwise False.
+  """
+
+  return path.endswith(TEXT_EXTENSIONS)
+
+
+def save(racetrack, path):
+  """
+  Save a track as ASCII art (.txt, or .txt.gz to compress it) or as a binary track directory (any other path).
+  A binary track stores the map with one byte per cell next to its start coordinates as uncompressed .npy files.
+  It is written into a temporary directory that is renamed when complete.
+  :param racetrack:     Racetrack map or Track.
+  :param path:          Where to save the track.
+  :return:              None.
+  """
+
+  track = racetrack if isinstance(racetrack, Track) else Track(racetrack)
+  validate(track.racetrack)
+
+  if is_text_path(path):
+
+    text = to_text(np.asarray(track.racetrack))
+
+    if path.endswith(".gz"):
+      with gzip.open(path, "wt") as file:
+        file.write(text)
+    else:
+      with open(path, "w") as file:
+        file.write(text)
+
+    return
+
+  parent = os.path.dirname(os.path.abspath(path))
+  tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+
+  arrays = {
+    RACETRACK: np.asarray(track.racetrack, dtype=np.uint8),
+    START_COORDINATES: np.asarray(track.start_coordinates, dtype=np.int64)
+  }
+
+  for name, array in arrays.items():
+    np.save(os.path.join(tmp_path, name + ".npy"), array)
+
+  # only validated tracks are saved, loading them does not need to scan the map again
+  with open(os.path.join(tmp_path, META), "w") as file:
+    json.dump({"version": VERSION, "shape": list(track.shape)}, file)
+
+  if os.path.isdir(path):
+    shutil.rmtree(path)
+
+  os.rename(tmp_path, path)
+
+
+def load(path, mmap_mode="r", check=None):
+  """
+  Load a track saved by save.
+  The arrays of a binary track are memory-mapped by default, so loading it takes the same time for any map size and
+  processes that load the same track share its pages.
+  :param path:          Path to a text track or a binary track directory.
+  :param mmap_mode:     Memory-map mode of binary tracks (see numpy.load), loaded into memory if None.
+  :param check:         Validate the map; by default text tracks are validated and binary tracks are not, because
+                        they were validated when saved.
+  :return:              Track.
+  """
+
+  if is_text_path(path):
+
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rt") as file:
+      racetrack = from_text(file.read())
+
+    if check is None or check:
+      validate(racetrack)
+
+    return Track(racetrack)
+
+  with open(os.path.join(path, META), "r") as file:
+    meta = json.load(file)
+
+  assert meta["version"] == VERSION, "unsupported track version {:d}".format(meta["version"])
+
+  arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+
+  assert list(arrays[RACETRACK].shape) == meta["shape"], "{:s} is incomplete".format(path)
+
+  if check:
+    validate(arrays[RACETRACK])
+
+  return Track(arrays[RACETRACK], start_coordinates=arrays[START_COORDINATES])
+
+
+def get(name, mmap_mode="r"):
+  """
+  Get one of the tracks in racetracks.TRACKS or load a track file.
+  :param name:          Name of a track or path to a track file.
+  :param mmap_mode:     Memory-map mode of binary tracks.
+  :return:              Track.
+  """
+
+  if name in racetracks.TRACKS:
+    return Track(racetracks.TRACKS[name])
+
+  assert os.path.exists(name), "{:s} is neither a track name nor a track file".format(name)
+
+  return load(name, mmap_mode=mmap_mode)
@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class Trajectory:
+
+  STATE_SIZE = 4
+
+  def __init__(self, capacity=128):
+    """
+    Array-backed buffer of (state, action, reward) steps of an episode, with the probability of each action under
+    the policy that played it (for off-policy learning).
+    The buffer is preallocated and doubles its capacity when it fills up, so it can be reused across episodes.
+    :param capacity:    Initial capacity.
+    """
+
+    self.states = np.zeros((capacity, self.STATE_SIZE), dtype=np.int32)
+    self.actions = np.zeros(capacity, dtype=np.int32)
+    self.rewards = np.zeros(capacity, dtype=np.int32)
+    self.probabilities = np.zeros(capacity, dtype=np.float64)
+    self.length = 0
+
+  def append(self, state, action, reward, probability=1.0):
+    """
+    Append a step.
+    :param state:         State (position and velocity).
+    :param action:        Action index.
+    :param reward:        Reward.
+    :param probability:   Probability of the action under the behavior policy.
+    :return:              None.
+    """
+
+    if self.length == len(self.actions):
+      self.grow()
+
+    self.states[self.length] = state
+    self.actions[self.length] = action
+    self.rewards[self.length] = reward
+    self.probabilities[self.length] = probability
+    self.length += 1
+
+  def grow(self):
+    """
+    Double the capacity of the buffer.
+    :return:    None.
+    """
+
+    capacity = max(2 * len(self.actions), 1)
+
+    self.states = np.resize(self.states, (capacity, self.STATE_SIZE))
+    self.actions = np.resize(self.actions, capacity)
+    self.rewards = np.resize(self.rewards, capacity)
+    self.probabilities = np.resize(self.probabilities, capacity)
+
+  def clear(self):
+    """
+    Remove all steps, the memory is kept.
+    :return:    None.
+    """
+
+    self.length = 0
+
+  def get_states(self):
+    """
+    Get visited states.
+    :return:    Array of shape (length, 4).
+    """
+
+    return self.states[:self.length]
+
+  def get_actions(self):
+    """
+    Get played actions.
+    :return:    Array of shape (length,).
+    """
+
+    return self.actions[:self.length]
+
+  def get_rewards(self):
+    """
+    Get received rewards.
+    :return:    Array of shape (length,).
+    """
+
+    return self.rewards[:self.length]
+
+  def get_probabilities(self):
+    """
+    Get probabilities of the played actions under the behavior policy.
+    :return:    Array of shape (length,).
+    """
+
+    return self.probabilities[:self.length]
+
+  def copy(self):
+    """
+    Copy the trajectory into a new buffer of the exact size.
+    :return:    New trajectory.
+    """
+
+    trajectory = Trajectory(capacity=self.length)
+    trajectory.states[:] = self.get_states()
+    trajectory.actions[:] = self.get_actions()
+    trajectory.rewards[:] = self.get_rewards()
+    trajectory.probabilities[:] = self.get_probabilities()
+    trajectory.length = self.length
+
+    return trajectory
+
+  def __len__(self):
+
+    return self.length
+
+  def __getitem__(self, index):
+
+    if not -self.length <= index < self.length:
+      raise IndexError("step index out of range")
+
+    index %= self.length
+
+    return tuple(self.states[index].tolist()), int(self.actions[index]), int(self.rewards[index])
+
+  def __iter__(self):
+
+    for index in range(self.length):
+      yield self[index]
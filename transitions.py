@@ -0,0 +1,238 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+import environment
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "racetrack", "transitions")
+CACHE_VERSION = 1
+
+
+class TransitionModel:
+
+  NUM_ACTIONS = 9
+  NUM_SPEEDS = 5
+  ACTION_TO_ACCELERATION = np.array([[1, 1], [0, 1], [1, 0], [0, 0], [-1, 0], [0, -1], [1, -1], [-1, 1], [-1, -1]])
+  # indexed by x and y acceleration + 1
+  ACCELERATION_TO_ACTION = [[8, 4, 7], [5, 3, 1], [6, 2, 0]]
+
+  TABLES = ["probabilities", "next_states", "rewards", "done"]
+
+  def __init__(self, racetrack, strict=False, random_displacement_probability=0.5, cache_dir=None, mmap_mode="r",
+               swept_path=False):
+    """
+    Enumerate the dynamics of the racetrack environment into a table.
+    For each state (x, y, vx, vy), action and outcome of the random draws, the table stores the next state index,
+    the reward and whether the episode terminates. An outcome is a combination of the zero velocity correction
+    (to (1, 0) or (0, 1)) and of the random displacement (none, up or right).
+    Transitions to positions outside of the map (other than the finish) are treated as terminal, since such states
+    have no entry in the tables. This only happens on tracks where a cell has neither a track nor a finish cell above
+    it or to its right.
+    :param racetrack:                           Racetrack map.
+    :param strict:                              Model RacetrackStrict instead of Racetrack.
+    :param random_displacement_probability:     Probability of a random displacement by one square up or right.
+    :param cache_dir:                           Load the tables from (or save them to) this directory. The tables are
+                                                keyed on a hash of the track and of the environment parameters.
+    :param mmap_mode:                           Memory-map mode for tables loaded from the cache.
+    :param swept_path:                          Model environments that check every cell the car passes through.
+    """
+
+    self.racetrack = racetrack
+    self.strict = strict
+    self.random_displacement_probability = random_displacement_probability
+    self.swept_path = swept_path
+
+    self.shape = (racetrack.shape[0], racetrack.shape[1], self.NUM_SPEEDS, self.NUM_SPEEDS)
+    self.num_states = int(np.prod(self.shape))
+
+    self.outcomes = None
+    self.probabilities = None
+    self.next_states = None
+    self.rewards = None
+    self.done = None
+
+    if cache_dir is None:
+      self.build()
+    elif not self.load(cache_dir, mmap_mode=mmap_mode):
+      self.build()
+      self.save(cache_dir)
+
+  def get_key(self):
+    """
+    Get a hash of the track and of the environment parameters.
+    :return:      Hex digest.
+    """
+
+    racetrack = np.ascontiguousarray(self.racetrack, dtype=np.int32)
+
+    digest = hashlib.sha1()
+    digest.update(str((CACHE_VERSION, racetrack.shape, self.strict, self.random_displacement_probability,
+                       self.swept_path)).encode())
+    digest.update(racetrack.tobytes())
+
+    return digest.hexdigest()
+
+  def save(self, cache_dir):
+    """
+    Save the tables as .npy files. The files are written into a temporary directory that is renamed at the end,
+    so concurrent runs never see a partially written cache entry.
+    :param cache_dir:     Cache directory.
+    :return:              None.
+    """
+
+    path = os.path.join(cache_dir, self.get_key())
+
+    if os.path.isdir(path):
+      return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir)
+
+    for name in self.TABLES:
+      np.save(os.path.join(tmp_path, name + ".npy"), getattr(self, name))
+
+    try:
+      os.rename(tmp_path, path)
+    except OSError:
+      # another process saved the same tables first
+      shutil.rmtree(tmp_path, ignore_errors=True)
+
+  def load(self, cache_dir, mmap_mode="r"):
+    """
+    Load the tables from the cache.
+    :param cache_dir:     Cache directory.
+    :param mmap_mode:     Memory-map mode passed to np.load.
+    :return:              True if the tables were found in the cache, otherwise False.
+    """
+
+    path = os.path.join(cache_dir, self.get_key())
+
+    if not os.path.isdir(path):
+      return False
+
+    for name in self.TABLES:
+      setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode))
+
+    return True
+
+  def build(self):
+    """
+    Build the transition table.
+    :return:      None.
+    """
+
+    if self.strict:
+      env = environment.BatchRacetrackStrict(self.racetrack, 0, swept_path=self.swept_path)
+      displacements = [(False, False)]
+      displacement_probabilities = [1.0]
+    else:
+      env = environment.BatchRacetrack(self.racetrack, 0,
+                                       random_displacement_probability=self.random_displacement_probability,
+                                       swept_path=self.swept_path)
+      displacements = [(False, False), (True, True), (True, False)]
+      displacement_probabilities = [1.0 - self.random_displacement_probability,
+                                    self.random_displacement_probability / 2,
+                                    self.random_displacement_probability / 2]
+
+    self.outcomes = []
+    self.probabilities = []
+
+    for zero_velocity_x in [True, False]:
+      for displacement, probability in zip(displacements, displacement_probabilities):
+        self.outcomes.append((zero_velocity_x,) + displacement)
+        self.probabilities.append(0.5 * probability)
+
+    self.probabilities = np.array(self.probabilities, dtype=np.float64)
+
+    num_outcomes = len(self.outcomes)
+    self.next_states = np.zeros((self.num_states, self.NUM_ACTIONS, num_outcomes), dtype=np.int32)
+    self.rewards = np.zeros((self.num_states, self.NUM_ACTIONS, num_outcomes), dtype=np.int8)
+    self.done = np.zeros((self.num_states, self.NUM_ACTIONS, num_outcomes), dtype=np.bool_)
+
+    states = np.stack(np.unravel_index(np.arange(self.num_states), self.shape), axis=1)
+    positions = states[:, :2]
+    ones = np.ones(self.num_states, dtype=np.bool_)
+
+    for action in range(self.NUM_ACTIONS):
+
+      velocities = np.clip(states[:, 2:] + self.ACTION_TO_ACCELERATION[action], 0, 4)
+
+      for outcome_idx, (zero_velocity_x, displaced, displacement_x) in enumerate(self.outcomes):
+
+        next_positions, next_velocities, rewards, done = \
+          env.transition(positions, velocities, ones * zero_velocity_x, ones * displaced, ones * displacement_x)
+
+        self.next_states[:, action, outcome_idx] = self.get_state_indices(next_positions, next_velocities)
+        self.rewards[:, action, outcome_idx] = rewards
+        self.done[:, action, outcome_idx] = done | env.check_position_out_of_bounds(next_positions)
+
+  def get_state_indices(self, positions, velocities):
+    """
+    Get flat indices of states, positions outside of the map are clipped to it (e.g. a car behind the finish line).
+    :param positions:     Positions of shape (N, 2).
+    :param velocities:    Velocities of shape (N, 2).
+    :return:              State indices of shape (N,).
+    """
+
+    x_coordinates = np.clip(positions[:, 0], 0, self.shape[0] - 1)
+    y_coordinates = np.clip(positions[:, 1], 0, self.shape[1] - 1)
+
+    return np.ravel_multi_index((x_coordinates, y_coordinates, velocities[:, 0], velocities[:, 1]), self.shape)
+
+  def get_state_index(self, state):
+    """
+    Get the flat index of a single state.
+    :param state:     State (position and velocity).
+    :return:          State index.
+    """
+
+    return ((state[0] * self.shape[1] + state[1]) * self.NUM_SPEEDS + state[2]) * self.NUM_SPEEDS + state[3]
+
+  def get_state(self, index):
+    """
+    Get the state for a flat state index.
+    :param index:     State index.
+    :return:          State (position and velocity).
+    """
+
+    index, y_velocity = divmod(int(index), self.NUM_SPEEDS)
+    index, x_velocity = divmod(index, self.NUM_SPEEDS)
+    x, y = divmod(index, self.shape[1])
+
+    return x, y, x_velocity, y_velocity
+
+  def expected_action_values(self, values, states=None):
+    """
+    Compute one-step expected action values.
+    :param values:    Value of each state.
+    :param states:    Indices of states to compute the action values for, all states if None.
+    :return:          Action values of shape (len(states), NUM_ACTIONS).
+    """
+
+    if states is None:
+      next_states, rewards, done = self.next_states, self.rewards, self.done
+    else:
+      next_states, rewards, done = self.next_states[states], self.rewards[states], self.done[states]
+
+    next_values = np.where(done, 0.0, values[next_states])
+
+    return np.sum(self.probabilities * (rewards + next_values), axis=-1)
+
+
+def from_env(env, cache_dir=None):
+  """
+  Build a transition model for an environment.
+  :param env:           Racetrack or RacetrackStrict.
+  :param cache_dir:     Optional cache directory.
+  :return:              Transition model.
+  """
+
+  swept_path = env.path_events is not None
+
+  if isinstance(env, environment.RacetrackStrict):
+    return TransitionModel(env.racetrack, strict=True, cache_dir=cache_dir, swept_path=swept_path)
+  else:
+    return TransitionModel(env.racetrack, random_displacement_probability=env.random_displacement_probability,
+                           cache_dir=cache_dir, swept_path=swept_path)
@@ -1,3 +1,10 @@
+import numpy as np
+
+
+# compute_returns scales rewards by powers of the discount down to exp(-MAX_LOG_SCALE)
+MAX_LOG_SCALE = 600.0
+
+
 def update_mean(value, mean, count):
   """
   Update value of a streaming mean.
@@ -7,4 +14,217 @@ def update_mean(value, mean, count):
   :return:
   """
 
-  return (value - mean) / (count + 1)
\ No newline at end of file
+  return (value - mean) / (count + 1)
+
+def compute_returns(rewards, gamma=1.0):
+  """
+  Compute returns for each step of an episode as a reverse (discounted) cumulative sum.
+  :param rewards:   Rewards of the episode.
+  :param gamma:     Discount factor.
+  :return:          Returns of shape (len(rewards),).
+  """
+
+  rewards = np.asarray(rewards, dtype=np.float64)
+
+  if gamma == 1.0:
+    return np.cumsum(rewards[::-1])[::-1]
+
+  if gamma > 0.0 and len(rewards) * -np.log(gamma) < MAX_LOG_SCALE:
+    # G_t = sum_k>=t gamma^k r_k / gamma^t, as long as gamma^t does not underflow
+    scales = gamma ** np.arange(len(rewards))
+    return np.cumsum((rewards * scales)[::-1])[::-1] / scales
+
+  return compute_episode_returns(rewards, [len(rewards)], gamma=gamma)
+
+
+def compute_episode_returns(rewards, lengths, gamma=1.0):
+  """
+  Compute returns for each step of several episodes stored back to back.
+  Discounted returns G_t = r_t + gamma * G_t+1 are computed by doubling the span of each partial sum in every pass,
+  so an episode of length n takes log2(n) passes over arrays instead of n Python steps, and the discounts never
+  underflow because no power of gamma is divided by.
+  :param rewards:   Rewards of all episodes.
+  :param lengths:   Length of each episode.
+  :param gamma:     Discount factor.
+  :return:          Returns of shape (len(rewards),).
+  """
+
+  rewards = np.asarray(rewards, dtype=np.float64)
+  ends = np.cumsum(lengths)
+
+  if gamma == 1.0:
+    # reverse cumulative sum over all episodes minus the part that belongs to the following episodes
+    totals = np.concatenate([np.cumsum(rewards[::-1])[::-1], [0.0]])
+
+    return totals[:-1] - np.repeat(totals[ends], lengths)
+
+  # returns[i] sums the rewards of steps i to i + span - 1 of its episode, discounts[i] is gamma ** span or zero if
+  # the span reaches the end of the episode
+  returns = rewards.copy()
+  discounts = np.full(len(rewards), gamma)
+  discounts[ends[ends > 0] - 1] = 0.0
+
+  span = 1
+  max_length = np.max(lengths, initial=0)
+
+  while span < max_length:
+    returns[:-span] += discounts[:-span] * returns[span:]
+    discounts[:-span] *= discounts[span:]
+    span *= 2
+
+  return returns
+
+
+class RandomStream:
+
+  def __init__(self, seed=None, block_size=1024):
+    """
+    Uniform random numbers from a numpy.random.Generator, pre-generated in blocks so that drawing a single number
+    does not cost a NumPy call. All other draws (coin flips, choices) are made from a single uniform number, so the
+    stream advances by the same amount regardless of whether the numbers are drawn one by one or in arrays.
+    :param seed:          Seed: None, an integer or a numpy.random.SeedSequence.
+    :param block_size:    Number of pre-generated numbers.
+    """
+
+    self.generator = np.random.default_rng(seed)
+    self.block_size = block_size
+
+    self.block = None
+    self.block_list = None
+    self.block_state = None
+    self.index = None
+    self.fill()
+
+  def fill(self, size=None):
+    """
+    Generate the next block of numbers.
+    :param size:    Number of numbers, block_size if None.
+    :return:        None.
+    """
+
+    self.block_state = self.generator.bit_generator.state
+    self.block = self.generator.random(self.block_size if size is None else size)
+    self.block_list = self.block.tolist()
+    self.index = 0
+
+  def uniform(self):
+    """
+    Draw a number from U(0, 1).
+    :return:      Float.
+    """
+
+    if self.index == len(self.block_list):
+      self.fill()
+
+    value = self.block_list[self.index]
+    self.index += 1
+
+    return value
+
+  def uniforms(self, size):
+    """
+    Draw an array of numbers from U(0, 1).
+    :param size:    Number of numbers.
+    :return:        Array of shape (size,).
+    """
+
+    values = np.empty(size, dtype=np.float64)
+    filled = 0
+
+    while filled < size:
+
+      if self.index == len(self.block):
+        self.fill()
+
+      count = min(size - filled, len(self.block) - self.index)
+      values[filled: filled + count] = self.block[self.index: self.index + count]
+
+      filled += count
+      self.index += count
+
+    return values
+
+  def reserve(self, size):
+    """
+    Get at least size upcoming numbers without drawing them (e.g. to pass them to a compiled kernel), the numbers
+    that were used must be drawn with skip afterwards.
+    :param size:    Minimum number of numbers.
+    :return:        Array of shape (>= size,).
+    """
+
+    if len(self.block) - self.index < size:
+
+      # restart the block at the current number, the generator state is moved to it from the start of the block
+      bit_generator = type(self.generator.bit_generator)()
+      bit_generator.state = self.block_state
+      bit_generator.advance(self.index)
+
+      self.block_state = bit_generator.state
+      self.block = np.concatenate([self.block[self.index:],
+                                   self.generator.random(max(size, self.block_size) - (len(self.block) - self.index))])
+      self.block_list = self.block.tolist()
+      self.index = 0
+
+    return self.block[self.index:]
+
+  def skip(self, count):
+    """
+    Draw numbers returned by reserve.
+    :param count:   Number of numbers.
+    :return:        None.
+    """
+
+    assert self.index + count <= len(self.block)
+
+    self.index += count
+
+  def integer(self, high):
+    """
+    Draw an integer from [0, high).
+    :param high:    Upper bound.
+    :return:        Integer.
+    """
+
+    return int(self.uniform() * high)
+
+  def choice(self, options):
+    """
+    Draw an element of a list.
+    :param options:     List.
+    :return:            Element.
+    """
+
+    return options[self.integer(len(options))]
+
+  def get_state(self):
+    """
+    Get a JSON-serializable state of the stream.
+    :return:      Dictionary.
+    """
+
+    return {"bit_generator": self.block_state, "index": self.index}
+
+  def set_state(self, state):
+    """
+    Restore a state returned by get_state.
+    :param state:     Dictionary.
+    :return:          None.
+    """
+
+    self.generator.bit_generator.state = state["bit_generator"]
+    self.fill(max(self.block_size, state["index"]))
+    self.index = state["index"]
+
+
+def spawn_seeds(seed, count):
+  """
+  Split a seed into independent seeds (e.g. for an environment and an agent).
+  :param seed:    None, an integer or a numpy.random.SeedSequence.
+  :param count:   Number of seeds.
+  :return:        List of numpy.random.SeedSequence.
+  """
+
+  if not isinstance(seed, np.random.SeedSequence):
+    seed = np.random.SeedSequence(seed)
+
+  return seed.spawn(count)
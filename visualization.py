@@ -0,0 +1,313 @@
+import numpy as np
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+import matplotlib.patches as mpatches
+import agent, constants
+
+
+FILES = "files"
+GRID = "grid"
+PAGES = "pages"
+MODES = [FILES, GRID, PAGES]
+
+TRACK_LABELS = {
+  constants.START_VALUE: "start",
+  constants.END_VALUE: "end",
+  constants.TRACK_VALUE: "track",
+  constants.GRASS_VALUE: "grass",
+  constants.AGENT_VALUE: "agent"
+}
+
+ACTION_LABELS = {action: "({:d}, {:d})".format(*acceleration)
+                 for action, acceleration in enumerate(agent.MonteCarlo.ACTION_TO_ACCELERATION.tolist())}
+
+
+class Renderer:
+
+  def __init__(self, shape, labels=None, cmap="viridis", vmin=None, vmax=None, show_legend=True, legend_outside=False,
+               title=None):
+    """
+    Render images of a fixed shape with the Agg backend, without pyplot and windows.
+    The figure, the image artist and the legend are created once; each render only replaces the image data.
+    NaN pixels are left blank (e.g. borders between the tiles of a grid).
+    :param shape:             Shape of the images.
+    :param labels:            Dictionary from values to legend labels, the values also set the color range.
+    :param cmap:              Colormap.
+    :param vmin:              Lowest value of the color range, the lowest label if None.
+    :param vmax:              Highest value of the color range, the highest label if None.
+    :param show_legend:       Show legend.
+    :param legend_outside:    Place the legend to the right of the image instead of its bottom right corner.
+    :param title:             Optional title.
+    """
+
+    if vmin is None:
+      vmin = min(labels.keys())
+
+    if vmax is None:
+      vmax = max(labels.keys())
+
+    self.figure = Figure()
+    FigureCanvasAgg(self.figure)
+
+    self.axes = self.figure.add_subplot()
+    self.axes.axis("off")
+
+    if title is not None:
+      self.axes.set_title(title)
+
+    # NaN pixels are transparent
+    cmap = matplotlib.colormaps[cmap].with_extremes(bad=(0.0, 0.0, 0.0, 0.0))
+    self.image = self.axes.imshow(np.full(shape, np.nan), cmap=cmap, vmin=vmin, vmax=vmax)
+
+    if show_legend and labels is not None:
+      patches = [mpatches.Patch(color=self.image.cmap(self.image.norm(value)), label=label)
+                 for value, label in sorted(labels.items())]
+
+      if legend_outside:
+        self.axes.legend(handles=patches, loc="center left", bbox_to_anchor=(1.0, 0.5))
+      else:
+        self.axes.legend(handles=patches, loc=4)
+
+  def draw(self, image):
+    """
+    Replace the image data.
+    :param image:     Image of the shape given to the constructor.
+    :return:          None.
+    """
+
+    assert image.shape == self.image.get_array().shape
+
+    self.image.set_data(image)
+
+  def save(self, image, save_path):
+    """
+    Render an image into a file.
+    :param image:         Image.
+    :param save_path:     Where to save it, the format is given by the extension.
+    :return:              None.
+    """
+
+    self.draw(image)
+    self.figure.savefig(save_path, bbox_inches="tight")
+
+  def save_each(self, images, save_paths):
+    """
+    Render images into separate files.
+    :param images:        List of images.
+    :param save_paths:    Path for each image.
+    :return:              None.
+    """
+
+    for image, save_path in zip(images, save_paths):
+      self.save(image, save_path)
+
+  def save_pages(self, images, save_path):
+    """
+    Render images into a multipage PDF, one image per page.
+    :param images:        List of images.
+    :param save_path:     Where to save the PDF.
+    :return:              None.
+    """
+
+    with PdfPages(save_path) as pdf:
+      for image in images:
+        self.draw(image)
+        pdf.savefig(self.figure, bbox_inches="tight")
+
+
+def get_sequence_image(racetrack, sequence):
+  """
+  Mark the positions visited in an episode on the racetrack.
+  :param racetrack:     Racetrack map.
+  :param sequence:      Trajectory or a sequence of tuples: (state, action, reward).
+  :return:              Image.
+  """
+
+  track = racetrack.astype(np.float64)
+
+  for item in sequence:
+    state = item[0]
+    track[state[0], state[1]] = constants.AGENT_VALUE
+
+  return track
+
+
+def tile(images, columns):
+  """
+  Arrange images of the same shape in a grid, separated by blank (NaN) pixels.
+  :param images:      List of images.
+  :param columns:     Number of columns.
+  :return:            Image.
+  """
+
+  rows = (len(images) + columns - 1) // columns
+  height, width = images[0].shape
+
+  grid = np.full((rows * (height + 1) - 1, columns * (width + 1) - 1), np.nan)
+
+  for i, image in enumerate(images):
+    row, column = divmod(i, columns)
+    grid[row * (height + 1): row * (height + 1) + height, column * (width + 1): column * (width + 1) + width] = image
+
+  return grid
+
+
+def save_sequences(racetrack, sequences, save_path, mode=FILES, file_format="svg", columns=None, show_legend=True):
+  """
+  Plot the positions visited in episodes.
+  :param racetrack:     Racetrack map.
+  :param sequences:     List of trajectories.
+  :param save_path:     Path without the extension. Files are numbered from 1 in the FILES mode.
+  :param mode:          FILES (a file per episode), GRID (a single image) or PAGES (a multipage PDF).
+  :param file_format:   Image format of the FILES and GRID modes.
+  :param columns:       Number of columns of the GRID mode, close to a square if None.
+  :param show_legend:   Show legend.
+  :return:              List of written files.
+  """
+
+  assert mode in MODES
+
+  images = [get_sequence_image(racetrack, sequence) for sequence in sequences]
+
+  if mode == GRID:
+
+    if columns is None:
+      columns = int(np.ceil(np.sqrt(len(images))))
+
+    grid = tile(images, columns)
+    save_paths = ["{:s}.{:s}".format(save_path, file_format)]
+
+    Renderer(grid.shape, labels=TRACK_LABELS, show_legend=show_legend, legend_outside=True).save(grid, save_paths[0])
+
+  elif mode == PAGES:
+
+    save_paths = ["{:s}.pdf".format(save_path)]
+    Renderer(racetrack.shape, labels=TRACK_LABELS, show_legend=show_legend).save_pages(images, save_paths[0])
+
+  else:
+
+    save_paths = ["{:s}_{:d}.{:s}".format(save_path, i + 1, file_format) for i in range(len(images))]
+    Renderer(racetrack.shape, labels=TRACK_LABELS, show_legend=show_legend).save_each(images, save_paths)
+
+  return save_paths
+
+
+def get_policy_grid(policy, racetrack):
+  """
+  Arrange the policies for all velocities in a grid, x velocity grows downwards and y velocity to the right.
+  :param policy:        Policy of shape (rows, cols, 5, 5).
+  :param racetrack:     Racetrack map, grass is left blank.
+  :return:              Image.
+  """
+
+  num_speeds = policy.shape[2]
+  grass = racetrack == constants.GRASS_VALUE
+
+  images = [np.where(grass, np.nan, policy[:, :, i, j]) for i in range(num_speeds) for j in range(num_speeds)]
+
+  return tile(images, num_speeds)
+
+
+def save_policy(policy, racetrack, save_path, show_legend=True):
+  """
+  Plot the greedy actions for all velocities into a single image.
+  :param policy:        Policy of shape (rows, cols, 5, 5).
+  :param racetrack:     Racetrack map.
+  :param save_path:     Where to save the image.
+  :param show_legend:   Show legend of the accelerations.
+  :return:              None.
+  """
+
+  grid = get_policy_grid(policy, racetrack)
+
+  renderer = Renderer(grid.shape, labels=ACTION_LABELS, cmap="tab10", vmin=0, vmax=9, show_legend=show_legend,
+                      legend_outside=True, title="rows: x velocity 0-4, columns: y velocity 0-4")
+  renderer.save(grid, save_path)
+
+
+def show_labeled_image(image, labels, save_path=None, show_legend=True):
+  """
+  Show an image with pyplot, with a legend of the values it contains.
+  https://stackoverflow.com/questions/25482876/how-to-add-legend-to-imshow-in-matplotlib
+  :param image:         Image.
+  :param labels:        Dictionary from values to legend labels.
+  :param save_path:     Where to save the figure.
+  :param show_legend:   Show legend.
+  :return:              None.
+  """
+
+  # pyplot picks a backend when it is imported, so it is only imported for interactive plots
+  import matplotlib.pyplot as plt
+
+  im = plt.imshow(image)
+
+  plt.axis("off")
+
+  if show_legend:
+    values = np.unique(image.ravel())
+    colors = [im.cmap(im.norm(value)) for value in values]
+    patches = [mpatches.Patch(color=colors[i], label=labels[values[i]]) for i in range(len(values))]
+    plt.legend(handles=patches, loc=4)
+
+  if save_path is not None:
+    plt.savefig(save_path, bbox_inches="tight")
+
+  plt.show()
+
+
+def show_racetrack(racetrack, save_path=None, show_legend=True):
+  """
+  Show the racetrack with labels.
+  :param racetrack:     Racetrack map.
+  :param save_path:     Where to save the figure.
+  :param show_legend:   Show legend.
+  :return:              None.
+  """
+
+  show_labeled_image(racetrack, TRACK_LABELS, save_path=save_path, show_legend=show_legend)
+
+
+def show_sequence(racetrack, sequence, save_path=None, show_legend=True):
+  """
+  Show positions visited in a sequence.
+  :param racetrack:     Racetrack map.
+  :param sequence:      Trajectory or a sequence of tuples: (state, action, reward).
+  :param save_path:     Where to save the plot.
+  :param show_legend:   Show legend.
+  :return:              None.
+  """
+
+  show_labeled_image(get_sequence_image(racetrack, sequence), TRACK_LABELS, save_path=save_path,
+                     show_legend=show_legend)
+
+
+def show_image(image, title=None):
+  """
+  Show an image with a colorbar.
+  :param image:     Image.
+  :param title:     Optional title.
+  :return:          None.
+  """
+
+  import matplotlib.pyplot as plt
+
+  if title is not None:
+    plt.title(title)
+
+  plt.imshow(image)
+  plt.colorbar()
+  plt.show()
+
+
+def show_policy(policy):
+  """
+  Plot policies for each velocity.
+  :param policy:    Policy of shape (rows, cols, 5, 5).
+  :return:          None.
+  """
+
+  for i in range(policy.shape[2]):
+    for j in range(policy.shape[3]):
+      show_image(policy[:, :, i, j], title="policies for velocity {:d} {:d}".format(i, j))